@@ -10,4 +10,6 @@ crypto_analyzer
 入口脚本仍然位于仓库根目录：
 - scripts/fetch_klines.py
 - scripts/fetch_snapshot.py
+- scripts/scan.py
+- scripts/backtest.py
 """
@@ -4,6 +4,12 @@ crypto_analyzer.analysis
 
 数据分析模块：
 - indicators: 技术指标计算（MA、RSI、MACD、VWAP 等）
+- indicator_state: 可序列化的增量指标状态（逐根 O(1) 更新，随 K 线仓库持久化）
 - volatility: 波动率分析与信号检测
+- rolling: 滑动窗口顺序统计（分块有序列表，rolling_percentile / rolling_mean）
+- context: 单份数据的惰性派生特征（AnalysisContext），供各分析器共用
 - summary: 数据汇总与摘要生成
+- signal_series: 每根 K 线的信号列（波动率状态、均线/MACD 穿越、量比、布林收口），一次遍历
+- sidecar: 写出数据时预计算的摘要（_summary.json），按内容哈希失效
+- backtest: 基于信号列的回测（ATR 止损/止盈、手续费与资金费、胜率/期望/回撤统计）
 """
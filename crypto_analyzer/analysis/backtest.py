@@ -0,0 +1,284 @@
+"""
+向量化回测
+
+在本地 K 线仓库的完整序列上回放信号，检验 analyze_signals / 波动率信号 / 策略中的规则是否赚钱：
+
+1. K 线计算指标（KlineFrame.with_indicators）与每根的信号列（signal_series）
+2. 入场规则把信号列映射为方向列：1 做多、-1 做空、0 无信号（见 ENTRY_RULES）
+3. 信号出现后在下一根开盘入场；止损、止盈按入场前一根的 atr14 设定
+   （entry ∓ stop_atr × ATR / entry ± target_atr × ATR）。同一根 K 线内同时触及止损与止盈时
+   按止损处理（保守）；开盘已越过止损（跳空）时按开盘价成交，不按止损价；
+   持仓超过 max_bars 根按收盘价离场。同一时间只持有一个仓位
+4. 每笔扣除双边手续费与持仓期间的资金费（按 8 小时结算一次的费率折算到持仓时长）
+
+统计胜率、期望（每笔平均收益与平均 R 倍数）、盈亏比、最大回撤等。
+指标与信号都是整列计算，逐笔模拟只从入场扫描到离场，全程 O(n)。
+指标与信号列可用 prepare 算一次后在多条规则、多组参数间复用：一年 15m K 线（约 3.5 万根）
+在已有信号列上每次回测约 10 毫秒。
+"""
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from crypto_analyzer.core.config import OUTPUT_DIR
+from crypto_analyzer.core.kline_frame import KlineFrame
+from crypto_analyzer.core.kline_store import KlineStore
+
+from .signal_series import signal_series
+
+FUNDING_INTERVAL_MS = 8 * 3600 * 1000
+
+Rule = Callable[[KlineFrame, Dict[str, array]], Sequence[int]]
+
+
+def _cross_rule(column: str) -> Rule:
+    def rule(frame: KlineFrame, signals: Dict[str, array]) -> Sequence[int]:
+        return signals[column]
+
+    return rule
+
+
+def _squeeze_breakout(frame: KlineFrame, signals: Dict[str, array]) -> Sequence[int]:
+    """布林带收口期间价格穿越 MA20，且成交量放大到 1.5 倍以上。"""
+    boll, cross, ratio = signals["boll_regime"], signals["ma20_cross"], signals["volume_ratio"]
+    return array(
+        "b",
+        [
+            cross[i] if i and boll[i - 1] == 1 and ratio[i] > 1.5 else 0
+            for i in range(len(frame))
+        ],
+    )
+
+
+def _volatility_expansion(frame: KlineFrame, signals: Dict[str, array]) -> Sequence[int]:
+    """低波动状态下波动率开始上升，方向取当根 MACD 柱的符号。"""
+    regime, trend = signals["vol_regime"], signals["vol_trend"]
+    hist = frame.column("macd_hist") if "macd_hist" in frame else array("d", [0.0]) * len(frame)
+    return array(
+        "b",
+        [
+            (1 if hist[i] > 0 else -1 if hist[i] < 0 else 0)
+            if regime[i] == 0 and trend[i] == 1
+            else 0
+            for i in range(len(frame))
+        ],
+    )
+
+
+# 规则名 -> 方向列
+ENTRY_RULES: Dict[str, Rule] = {
+    "macd_cross": _cross_rule("macd_cross"),
+    "ma20_cross": _cross_rule("ma20_cross"),
+    "squeeze_breakout": _squeeze_breakout,
+    "volatility_expansion": _volatility_expansion,
+}
+
+
+class BacktestConfig:
+    """回测参数。费率均为小数（0.0004 = 0.04%）。"""
+
+    def __init__(
+        self,
+        stop_atr: float = 1.5,
+        target_atr: float = 3.0,
+        max_bars: int = 48,
+        fee_rate: float = 0.0004,
+        funding_rate: float = 0.0001,
+        direction: str = "both",
+    ) -> None:
+        if stop_atr <= 0 or target_atr <= 0:
+            raise ValueError("stop_atr 与 target_atr 必须为正数")
+        if max_bars < 1:
+            raise ValueError(f"max_bars 必须 >= 1：{max_bars}")
+        if direction not in ("both", "long", "short"):
+            raise ValueError(f"direction 只能是 both / long / short：{direction}")
+        self.stop_atr = stop_atr
+        self.target_atr = target_atr
+        self.max_bars = max_bars
+        self.fee_rate = fee_rate
+        self.funding_rate = funding_rate
+        self.direction = direction
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def simulate(
+    frame: KlineFrame, directions: Sequence[int], config: Optional[BacktestConfig] = None
+) -> List[Dict[str, Any]]:
+    """
+    按方向列逐笔模拟，返回成交记录。frame 需包含 open/high/low/close/open_time 与 atr14。
+
+    第 i 根出现信号 → 第 i+1 根开盘入场，止损/止盈距离取第 i 根的 atr14（入场时已知）。
+    """
+    config = config or BacktestConfig()
+    n = len(frame)
+    opens, highs, lows, closes = (frame.column(name) for name in ("open", "high", "low", "close"))
+    times = frame.column("open_time")
+    atr = frame.column("atr14")
+    allowed = {"both": (1, -1), "long": (1,), "short": (-1,)}[config.direction]
+
+    trades: List[Dict[str, Any]] = []
+    i = 0
+    while i < n - 1:
+        side = directions[i]
+        risk = atr[i]
+        if side not in allowed or risk != risk or risk <= 0:
+            i += 1
+            continue
+        entry_index = i + 1
+        entry = opens[entry_index]
+        stop = entry - side * config.stop_atr * risk
+        target = entry + side * config.target_atr * risk
+        last_index = min(n - 1, entry_index + config.max_bars - 1)
+
+        exit_index, exit_price, reason = last_index, closes[last_index], "timeout"
+        for j in range(entry_index, last_index + 1):
+            high, low = highs[j], lows[j]
+            hit_stop = low <= stop if side > 0 else high >= stop
+            hit_target = high >= target if side > 0 else low <= target
+            if hit_stop:
+                # 跳空越过止损时只能按开盘价成交
+                fill = min(opens[j], stop) if side > 0 else max(opens[j], stop)
+                exit_index, exit_price, reason = j, fill, "stop"
+                break
+            if hit_target:
+                exit_index, exit_price, reason = j, target, "target"
+                break
+        if reason == "timeout" and last_index == n - 1 and last_index - entry_index + 1 < config.max_bars:
+            reason = "open"  # 数据末尾仍未离场，按最后收盘价计
+
+        gross = side * (exit_price - entry) / entry
+        held_ms = times[exit_index] - times[entry_index] + (times[1] - times[0] if n > 1 else 0)
+        funding = side * config.funding_rate * held_ms / FUNDING_INTERVAL_MS
+        net = gross - 2 * config.fee_rate - funding
+        trades.append(
+            {
+                "side": "long" if side > 0 else "short",
+                "entry_time": times[entry_index],
+                "exit_time": times[exit_index],
+                "entry": entry,
+                "exit": exit_price,
+                "stop": stop,
+                "target": target,
+                "bars": exit_index - entry_index + 1,
+                "reason": reason,
+                "gross_return": gross,
+                "return": net,
+                "r_multiple": net * entry / (config.stop_atr * risk),
+            }
+        )
+        i = exit_index + 1
+    return trades
+
+
+def trade_stats(trades: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    胜率、期望、盈亏比、按复利权益曲线计算的总收益与最大回撤。
+
+    数据末尾仍未离场的仓位（reason == "open"）只是按最后收盘价估值，不计入统计，
+    单独以 open_trades / open_return_pct 给出。
+    """
+    open_trades = [trade for trade in trades if trade["reason"] == "open"]
+    trades = [trade for trade in trades if trade["reason"] != "open"]
+    extra: Dict[str, Any] = {"open_trades": len(open_trades)}
+    if open_trades:
+        extra["open_return_pct"] = round(sum(trade["return"] for trade in open_trades) * 100, 4)
+    count = len(trades)
+    if not count:
+        return {"trades": 0, **extra}
+    returns = [trade["return"] for trade in trades]
+    wins = [r for r in returns if r > 0]
+    losses = [r for r in returns if r <= 0]
+    equity = peak = 1.0
+    max_drawdown = 0.0
+    for r in returns:
+        equity *= 1 + r
+        peak = max(peak, equity)
+        max_drawdown = max(max_drawdown, 1 - equity / peak)
+    gross_loss = -sum(losses)
+    return {
+        "trades": count,
+        "win_rate": round(len(wins) / count, 4),
+        "expectancy_pct": round(sum(returns) / count * 100, 4),
+        "expectancy_r": round(sum(trade["r_multiple"] for trade in trades) / count, 4),
+        "avg_win_pct": round(sum(wins) / len(wins) * 100, 4) if wins else 0.0,
+        "avg_loss_pct": round(sum(losses) / len(losses) * 100, 4) if losses else 0.0,
+        "profit_factor": round(sum(wins) / gross_loss, 4) if gross_loss > 0 else None,
+        "total_return_pct": round((equity - 1) * 100, 4),
+        "max_drawdown_pct": round(max_drawdown * 100, 4),
+        "avg_bars": round(sum(trade["bars"] for trade in trades) / count, 2),
+        "exits": {
+            reason: sum(1 for trade in trades if trade["reason"] == reason)
+            for reason in ("target", "stop", "timeout")
+        },
+        **extra,
+    }
+
+
+def prepare(klines: Any, lookback: int = 20) -> Tuple[KlineFrame, Dict[str, array]]:
+    """
+    计算指标与信号列，返回 (frame, signals)。多条规则或多组参数共用同一份数据时
+    只需准备一次，再逐个传给 run_backtest（指标计算是整个流程中最耗时的部分）。
+    """
+    frame = KlineFrame.coerce(klines)
+    if len(frame) < 2:
+        raise ValueError("K 线数量不足，无法回测")
+    if "atr14" not in frame or "macd_dif" not in frame:
+        frame = frame.with_indicators()
+    return frame, signal_series(frame, lookback)
+
+
+def run_backtest(
+    klines: Any,
+    rule: str = "macd_cross",
+    config: Optional[BacktestConfig] = None,
+    lookback: int = 20,
+    signals: Optional[Dict[str, array]] = None,
+) -> Dict[str, Any]:
+    """
+    对一段 K 线（KlineFrame 或 list-of-dicts，含不含指标均可）运行入场规则，返回统计与成交明细。
+    signals 为 prepare 的结果时，klines 须是同时返回的 frame。
+    """
+    if rule not in ENTRY_RULES:
+        raise ValueError(f"未知的入场规则：{rule}（可选：{', '.join(ENTRY_RULES)}）")
+    if signals is None:
+        frame, signals = prepare(klines, lookback)
+    else:
+        frame = KlineFrame.coerce(klines)
+    config = config or BacktestConfig()
+    trades = simulate(frame, ENTRY_RULES[rule](frame, signals), config)
+    return {
+        "rule": rule,
+        "bars": len(frame),
+        "start": frame.value("open_time", 0),
+        "end": frame.value("open_time", -1),
+        "config": config.to_dict(),
+        "stats": trade_stats(trades),
+        "trades": trades,
+    }
+
+
+def backtest_store(
+    exchange: str,
+    symbol: str,
+    interval: str,
+    rules: Sequence[str] = ("macd_cross",),
+    config: Optional[BacktestConfig] = None,
+    lookback: int = 20,
+    root: Path = OUTPUT_DIR,
+) -> List[Dict[str, Any]]:
+    """对本地 K 线仓库（KlineStore）中的完整序列逐条规则回测，指标与信号只计算一次。"""
+    records = KlineStore(exchange, symbol, interval, root).load()
+    if not records:
+        raise ValueError(f"本地没有 {exchange} {symbol} {interval} 的 K 线，请先运行 fetch_klines")
+    frame, signals = prepare(records, lookback)
+    return [
+        {
+            "exchange": exchange,
+            "symbol": symbol.upper(),
+            "interval": interval,
+            **run_backtest(frame, rule, config, lookback, signals),
+        }
+        for rule in rules
+    ]
@@ -0,0 +1,152 @@
+"""
+单份数据的分析上下文
+
+summarize、analyze_signals 与 detect_volatility_expansion_signals 用到许多相同的派生量
+（最新/前一根 K 线、订单簿前 N 档金额、成交量均值、波动率状态、MA20 穿越……）。
+AnalysisContext 把它们做成惰性、带缓存的属性：第一次访问时计算，之后直接复用，
+同一份数据无论跑多少个分析器，每个派生量最多只算一次。
+
+    context = AnalysisContext(payload)
+    summary = summarize(context)
+    volatility = detect_volatility_expansion_signals(context=context)
+"""
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple, Union
+
+from crypto_analyzer.core.kline_frame import KlineFrame
+
+
+class AnalysisContext:
+    """fetch_klines 输出（或同结构的 dict）的惰性派生特征。"""
+
+    def __init__(self, payload: Dict[str, Any]) -> None:
+        self.payload = payload
+        self._memo: Dict[Tuple[Any, ...], Any] = {}
+
+    @classmethod
+    def of(cls, payload: Union["AnalysisContext", Dict[str, Any]]) -> "AnalysisContext":
+        """已是 AnalysisContext 时原样返回，否则包装。"""
+        return payload if isinstance(payload, AnalysisContext) else cls(payload)
+
+    def _cached(self, key: Tuple[Any, ...], compute: Any) -> Any:
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    # ---------- 原始字段 ----------
+
+    @cached_property
+    def klines(self) -> KlineFrame:
+        """按时间正序的 K 线（KlineFrame 本身即正序视图，不复制数据）。"""
+        return KlineFrame.coerce(self.payload.get("klines", []))
+
+    @property
+    def exchange(self) -> Optional[str]:
+        return self.payload.get("exchange")
+
+    @property
+    def ticker_24hr(self) -> Dict[str, Any]:
+        return self.payload.get("ticker_24hr") or {}
+
+    @property
+    def funding_rate(self) -> Dict[str, Any]:
+        return self.payload.get("funding_rate") or {}
+
+    @property
+    def open_interest(self) -> Dict[str, Any]:
+        return self.payload.get("open_interest") or {}
+
+    @property
+    def order_book(self) -> Dict[str, Any]:
+        return self.payload.get("order_book") or {}
+
+    @property
+    def current_price(self) -> Dict[str, Any]:
+        return self.payload.get("current_price") or {}
+
+    # ---------- K 线 ----------
+
+    @cached_property
+    def last(self) -> Dict[str, Any]:
+        """最新一根 K 线（没有 K 线时抛出 ValueError）。"""
+        return self.klines.last()
+
+    @cached_property
+    def prev(self) -> Optional[Dict[str, Any]]:
+        """倒数第二根 K 线，不足两根时为 None。"""
+        return self.klines[-2] if len(self.klines) >= 2 else None
+
+    def value(self, name: str, index: int = -1) -> Optional[Any]:
+        return self.klines.value(name, index)
+
+    # ---------- 订单簿 ----------
+
+    def depth_sums(self, depth: int = 10) -> Tuple[float, float]:
+        """前 depth 档买盘、卖盘的挂单金额（价格 × 数量）。"""
+
+        def compute() -> Tuple[float, float]:
+            bids = self.order_book.get("bids") or []
+            asks = self.order_book.get("asks") or []
+            bid_value = sum(float(price) * float(qty) for price, qty in bids[:depth])
+            ask_value = sum(float(price) * float(qty) for price, qty in asks[:depth])
+            return bid_value, ask_value
+
+        return self._cached(("depth_sums", depth), compute)
+
+    def order_book_imbalance(self, depth: int = 10) -> float:
+        """(买盘 - 卖盘) / (买盘 + 卖盘)，没有挂单时为 0。"""
+        bid_value, ask_value = self.depth_sums(depth)
+        total = bid_value + ask_value
+        return (bid_value - ask_value) / total if total else 0.0
+
+    # ---------- 成交量 ----------
+
+    def volume_mean(self, count: int, include_last: bool = True) -> Optional[float]:
+        """
+        最近 count 根 K 线的平均成交量；include_last 为 False 时不含最新一根。
+        没有成交量列或 K 线不足时返回 None。
+        """
+
+        def compute() -> Optional[float]:
+            if "volume" not in self.klines:
+                return None
+            volumes = self.klines.column("volume")
+            window = volumes[-count:] if include_last else volumes[-count - 1 : -1]
+            return sum(window) / len(window) if len(window) else None
+
+        return self._cached(("volume_mean", count, include_last), compute)
+
+    def volume_ratio(self, lookback: int = 20) -> float:
+        """最新成交量相对之前 lookback 根平均值的倍数（数据不足时为 0）。"""
+        if len(self.klines) < lookback + 1 or "volume" not in self.klines:
+            return 0.0
+        avg_vol = self.volume_mean(lookback, include_last=False) or 0
+        last_vol = float(self.klines.column("volume")[-1])
+        return last_vol / avg_vol if avg_vol > 0 else 0.0
+
+    # ---------- 波动率与均线 ----------
+
+    def regime(self, lookback: int = 20) -> Dict[str, Any]:
+        """calculate_volatility_regime 的结果（按 lookback 缓存）。"""
+        # 延迟导入，避免与 volatility 模块循环依赖
+        from .volatility import calculate_volatility_regime
+
+        return self._cached(("regime", lookback), lambda: calculate_volatility_regime(self.klines, lookback))
+
+    @cached_property
+    def ma20_cross(self) -> Optional[str]:
+        """
+        最新一根收盘价相对 MA20 的穿越：上穿为 "breakout"，下穿为 "breakdown"，否则 None。
+        以前一根收盘价与最新 MA20 比较。
+        """
+        prev = self.prev
+        ma20 = self.last.get("ma20")
+        close = self.last.get("close")
+        if not (ma20 and close and prev):
+            return None
+        prev_close = prev.get("close")
+        if prev_close < ma20 and close > ma20:
+            return "breakout"
+        if prev_close > ma20 and close < ma20:
+            return "breakdown"
+        return None
@@ -0,0 +1,422 @@
+"""
+增量指标状态
+
+IndicatorState 保存 calculate_indicators 递推所需的全部中间量
+（EMA/MACD 递推值、各滚动窗口的环形缓冲与窗口和、日内 VWAP 累计量），
+新 K 线收盘时调用 update() 以 O(1) 追加，未收盘的 K 线用 peek() 预览。
+窗口和随缓冲进出增减，每 20 根按缓冲精确重算一次，避免浮点误差累积。
+状态可通过 to_dict()/from_dict() 序列化。
+
+sync_store_state 以本地 K 线仓库（KlineStore）的全部历史为种子，把状态保存在仓库旁的
+_indicator_state.json，之后每次只回放新收盘的 K 线；fetch_klines 每次写入仓库后都会同步。
+（fetch_klines 输出的指标只覆盖最近 limit 根，EMA/MACD 以窗口首根为种子，
+与这里从全量历史延续的结果并不相同。）
+
+逐根更新得到的指标与对全量历史调用 calculate_indicators 的结果在取整精度内一致。
+"""
+import json
+import math
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+from crypto_analyzer.core.intervals import interval_to_ms
+from crypto_analyzer.core.kline_frame import KlineFrame
+from crypto_analyzer.core.kline_store import KlineStore
+from crypto_analyzer.core.resample import next_bucket_start, resample_frame
+from crypto_analyzer.core.storage import file_lock, write_json_atomic
+
+from .indicators import DAY_MS
+
+STATE_VERSION = 2
+STATE_FILENAME = "_indicator_state.json"
+_RESYNC_EVERY = 20
+
+_EMA20_ALPHA = 2 / 21
+_EMA50_ALPHA = 2 / 51
+_SHORT_ALPHA = 2 / 13
+_LONG_ALPHA = 2 / 27
+_SIGNAL_ALPHA = 2 / 10
+
+
+class IndicatorState:
+    """可恢复的逐根指标状态，K 线按时间正序逐根喂入。"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.last_open_time: Optional[int] = None
+        self.prev_close: Optional[float] = None
+        self.closes20: deque = deque(maxlen=20)
+        self.closes50: deque = deque(maxlen=50)
+        self.gains: deque = deque(maxlen=14)
+        self.losses: deque = deque(maxlen=14)
+        self.true_ranges: deque = deque(maxlen=14)
+        self.ema20: Optional[float] = None
+        self.ema50: Optional[float] = None
+        self.ema_short: Optional[float] = None
+        self.ema_long: Optional[float] = None
+        self.dif = 0.0
+        self.dea = 0.0
+        self.vwap_day: Optional[int] = None
+        self.vwap_price_volume = 0.0
+        self.vwap_volume = 0.0
+        # 窗口和；收盘价的平方和以 shift 为基准，减小方差计算中的抵消误差
+        self.sum20 = 0.0
+        self.sum50 = 0.0
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.tr_sum = 0.0
+        self.shift = 0.0
+        self.dev_sum20 = 0.0
+        self.dev_sq_sum20 = 0.0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "IndicatorState":
+        """由历史 K 线（任意顺序）构建状态，等价于按 open_time 逐根 update()。"""
+        return cls.from_frame(KlineFrame.coerce(records))
+
+    @classmethod
+    def from_frame(cls, frame: KlineFrame) -> "IndicatorState":
+        """
+        由 KlineFrame 构建状态，等价于逐根 update()。
+
+        只有 EMA/MACD 递推需要遍历全量收盘价，窗口缓冲与 VWAP 累计量
+        只从尾部重建，比逐根回放快一个数量级。
+        """
+        state = cls()
+        n = len(frame)
+        if not n:
+            return state
+
+        closes = frame.column("close").tolist()
+        highs = frame.column("high").tolist() if "high" in frame else closes
+        lows = frame.column("low").tolist() if "low" in frame else closes
+        volumes = frame.column("volume").tolist() if "volume" in frame else [0.0] * n
+        open_times = frame.column("open_time").tolist()
+
+        ema20 = ema50 = ema_short = ema_long = closes[0]
+        dif = dea = 0.0
+        for close_price in closes[1:]:
+            ema20 = ema20 + _EMA20_ALPHA * (close_price - ema20)
+            ema50 = ema50 + _EMA50_ALPHA * (close_price - ema50)
+            ema_short = ema_short + _SHORT_ALPHA * (close_price - ema_short)
+            ema_long = ema_long + _LONG_ALPHA * (close_price - ema_long)
+            dif = ema_short - ema_long
+            dea = dea + _SIGNAL_ALPHA * (dif - dea)
+        state.ema20, state.ema50 = ema20, ema50
+        state.ema_short, state.ema_long = ema_short, ema_long
+        state.dif, state.dea = dif, dea
+
+        state.closes20.extend(closes[-20:])
+        state.closes50.extend(closes[-50:])
+        for idx in range(max(1, n - 14), n):
+            close_price = closes[idx]
+            prev_close = closes[idx - 1]
+            high = highs[idx]
+            low = lows[idx]
+            change = close_price - prev_close
+            state.gains.append(change if change > 0 else 0.0)
+            state.losses.append(0.0 if change > 0 else -change)
+            state.true_ranges.append(
+                max(high - low, abs(high - prev_close), abs(low - prev_close))
+            )
+
+        # 日内 VWAP 只需回放最后一个 UTC 自然日内的 K 线
+        last_day = int(open_times[-1]) // DAY_MS
+        start = n - 1
+        while start > 0 and int(open_times[start - 1]) // DAY_MS == last_day:
+            start -= 1
+        state.vwap_day = last_day
+        for idx in range(start, n):
+            volume = volumes[idx]
+            if volume > 0:
+                typical_price = (highs[idx] + lows[idx] + closes[idx]) / 3
+                state.vwap_price_volume += typical_price * volume
+                state.vwap_volume += volume
+
+        state.count = n
+        state.last_open_time = int(open_times[-1])
+        state.prev_close = closes[-1]
+        state._resync()
+        return state
+
+    def copy(self) -> "IndicatorState":
+        return IndicatorState.from_dict(self.to_dict())
+
+    def _resync(self) -> None:
+        """按缓冲精确重算全部窗口和。"""
+        self.sum20 = sum(self.closes20)
+        self.sum50 = sum(self.closes50)
+        self.gain_sum = sum(self.gains)
+        self.loss_sum = sum(self.losses)
+        self.tr_sum = sum(self.true_ranges)
+        self.shift = self.sum20 / len(self.closes20) if self.closes20 else 0.0
+        self.dev_sum20 = sum(value - self.shift for value in self.closes20)
+        self.dev_sq_sum20 = sum((value - self.shift) ** 2 for value in self.closes20)
+
+    def update(self, candle: Dict[str, Any]) -> Dict[str, Any]:
+        """追加一根已收盘的 K 线，返回带指标的记录。"""
+        open_time = int(candle.get("open_time", 0))
+        if self.last_open_time is not None and open_time <= self.last_open_time:
+            raise ValueError(
+                f"K线时间 {open_time} 不晚于状态中最后一根 {self.last_open_time}，"
+                "未收盘 K 线请使用 peek()"
+            )
+        return self._advance(candle, open_time)
+
+    def peek(self, candle: Dict[str, Any]) -> Dict[str, Any]:
+        """预览尚未收盘的 K 线指标，不修改当前状态。"""
+        return self.copy()._advance(candle, int(candle.get("open_time", 0)))
+
+    def _advance(self, candle: Dict[str, Any], open_time: int) -> Dict[str, Any]:
+        enriched = candle.copy()
+        i = self.count
+        close_price = candle["close"]
+        high = candle.get("high", close_price)
+        low = candle.get("low", close_price)
+        volume = candle.get("volume", 0)
+
+        if len(self.closes20) == 20:
+            dropped = self.closes20[0] - self.shift
+            self.sum20 -= self.closes20[0]
+            self.dev_sum20 -= dropped
+            self.dev_sq_sum20 -= dropped * dropped
+        deviation = close_price - self.shift
+        self.sum20 += close_price
+        self.dev_sum20 += deviation
+        self.dev_sq_sum20 += deviation * deviation
+        self.closes20.append(close_price)
+        self.sum50 = _slide(self.closes50, self.sum50, close_price)
+        if i == 0:
+            self.ema20 = self.ema50 = self.ema_short = self.ema_long = close_price
+        else:
+            self.ema20 = self.ema20 + _EMA20_ALPHA * (close_price - self.ema20)
+            self.ema50 = self.ema50 + _EMA50_ALPHA * (close_price - self.ema50)
+            self.ema_short = self.ema_short + _SHORT_ALPHA * (close_price - self.ema_short)
+            self.ema_long = self.ema_long + _LONG_ALPHA * (close_price - self.ema_long)
+            self.dif = self.ema_short - self.ema_long
+            self.dea = self.dea + _SIGNAL_ALPHA * (self.dif - self.dea)
+
+        if i >= 19:
+            enriched["ma20"] = round(self.sum20 / 20, 8)
+        if i >= 49:
+            enriched["ma50"] = round(self.sum50 / 50, 8)
+        if i >= 19:
+            enriched["ema20"] = round(self.ema20, 8)
+        if i >= 49:
+            enriched["ema50"] = round(self.ema50, 8)
+
+        day = open_time // DAY_MS
+        if day != self.vwap_day:
+            self.vwap_day = day
+            self.vwap_price_volume = 0.0
+            self.vwap_volume = 0.0
+        if volume > 0:
+            self.vwap_price_volume += (high + low + close_price) / 3 * volume
+            self.vwap_volume += volume
+            enriched["vwap"] = round(self.vwap_price_volume / self.vwap_volume, 8)
+
+        if i > 0:
+            prev_close = self.prev_close
+            change = close_price - prev_close
+            self.gain_sum = _slide(self.gains, self.gain_sum, change if change > 0 else 0.0)
+            self.loss_sum = _slide(self.losses, self.loss_sum, 0.0 if change > 0 else -change)
+            self.tr_sum = _slide(
+                self.true_ranges,
+                self.tr_sum,
+                max(high - low, abs(high - prev_close), abs(low - prev_close)),
+            )
+        if i >= 14:
+            avg_loss = self.loss_sum / 14
+            if avg_loss == 0:
+                enriched["rsi14"] = 100.0
+            else:
+                rs = (self.gain_sum / 14) / avg_loss
+                enriched["rsi14"] = round(100 - (100 / (1 + rs)), 2)
+        if i > 0:
+            enriched["price_change"] = round(change, 8)
+            enriched["price_change_pct"] = round((change / prev_close) * 100, 4)
+
+        if i >= 14:
+            atr = round(self.tr_sum / 14, 8)
+            enriched["atr14"] = atr
+            if close_price > 0:
+                enriched["atr14_pct"] = round((atr / close_price) * 100, 4)
+
+        if i >= 19:
+            mean = self.sum20 / 20
+            mean_deviation = self.dev_sum20 / 20
+            std_dev = math.sqrt(max(self.dev_sq_sum20 / 20 - mean_deviation * mean_deviation, 0.0))
+            enriched["volatility_20"] = round(std_dev, 8)
+            if mean > 0:
+                enriched["volatility_20_pct"] = round((std_dev / mean) * 100, 4)
+                upper = mean + 2 * std_dev
+                lower = mean - 2 * std_dev
+                width = upper - lower
+                enriched["boll_upper_20"] = round(upper, 8)
+                enriched["boll_lower_20"] = round(lower, 8)
+                enriched["boll_width_20"] = round(width, 8)
+                enriched["boll_width_20_pct"] = round((width / mean) * 100, 4)
+                if width > 0:
+                    enriched["boll_pct_b_20"] = round((close_price - lower) / width, 4)
+
+        if i >= 26:
+            enriched["macd_dif"] = round(self.dif, 8)
+            enriched["macd_dea"] = round(self.dea, 8)
+            enriched["macd_hist"] = round((self.dif - self.dea) * 2, 8)
+
+        self.count = i + 1
+        self.last_open_time = open_time
+        self.prev_close = close_price
+        if self.count % _RESYNC_EVERY == 0:
+            self._resync()
+        return enriched
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为可 JSON 序列化的字典。"""
+        return {
+            "version": STATE_VERSION,
+            "count": self.count,
+            "last_open_time": self.last_open_time,
+            "prev_close": self.prev_close,
+            "closes": list(self.closes50),
+            "gains": list(self.gains),
+            "losses": list(self.losses),
+            "true_ranges": list(self.true_ranges),
+            "ema20": self.ema20,
+            "ema50": self.ema50,
+            "ema_short": self.ema_short,
+            "ema_long": self.ema_long,
+            "dif": self.dif,
+            "dea": self.dea,
+            "vwap_day": self.vwap_day,
+            "vwap_price_volume": self.vwap_price_volume,
+            "vwap_volume": self.vwap_volume,
+            "sums": [
+                self.sum20,
+                self.sum50,
+                self.gain_sum,
+                self.loss_sum,
+                self.tr_sum,
+                self.shift,
+                self.dev_sum20,
+                self.dev_sq_sum20,
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndicatorState":
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"不支持的指标状态版本：{data.get('version')}")
+        state = cls()
+        state.count = data["count"]
+        state.last_open_time = data["last_open_time"]
+        state.prev_close = data["prev_close"]
+        state.closes50.extend(data["closes"])
+        state.closes20.extend(data["closes"][-20:])
+        state.gains.extend(data["gains"])
+        state.losses.extend(data["losses"])
+        state.true_ranges.extend(data["true_ranges"])
+        state.ema20 = data["ema20"]
+        state.ema50 = data["ema50"]
+        state.ema_short = data["ema_short"]
+        state.ema_long = data["ema_long"]
+        state.dif = data["dif"]
+        state.dea = data["dea"]
+        state.vwap_day = data["vwap_day"]
+        state.vwap_price_volume = data["vwap_price_volume"]
+        state.vwap_volume = data["vwap_volume"]
+        (
+            state.sum20,
+            state.sum50,
+            state.gain_sum,
+            state.loss_sum,
+            state.tr_sum,
+            state.shift,
+            state.dev_sum20,
+            state.dev_sq_sum20,
+        ) = data["sums"]
+        return state
+
+
+def _slide(window: deque, total: float, value: float) -> float:
+    """向定长缓冲追加 value，返回更新后的窗口和。"""
+    if len(window) == window.maxlen:
+        total -= window[0]
+    window.append(value)
+    return total + value
+
+
+def sync_store_state(store: KlineStore, now_ms: Optional[int] = None) -> Optional[IndicatorState]:
+    """
+    把仓库旁保存的指标状态推进到仓库中最后一根已收盘的 K 线，写回并返回。
+
+    仓库只追加时只回放新收盘的几根；仓库被整体重写（回填历史、补缺口会替换文件，
+    inode 随之改变）或状态缺失、无法解析时从全量历史重建。仓库中还没有已收盘的
+    K 线时返回 None。
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    state_path = store.path.with_name(STATE_FILENAME)
+
+    def closed(record: Dict[str, Any]) -> bool:
+        return next_bucket_start(int(record["open_time"]), store.interval, 0) <= now_ms
+
+    with file_lock(store.lock_path):
+        if not store.path.exists():
+            return None
+        inode = store.path.stat().st_ino
+        state: Optional[IndicatorState] = None
+        try:
+            saved = json.loads(state_path.read_text(encoding="utf-8"))
+            if saved.get("store_inode") == inode:
+                state = IndicatorState.from_dict(saved["state"])
+        except (OSError, ValueError, KeyError, TypeError):
+            state = None
+
+        records = None
+        if state is not None:
+            last_open_time = store.last_open_time()
+            interval_ms = interval_to_ms(store.interval)
+            if last_open_time is not None and interval_ms:
+                # 时间跨度对应的根数不少于实际行数，读到的尾部一定包含状态的最后一根
+                records = store.tail((last_open_time - state.last_open_time) // interval_ms + 1)
+                if not records or int(records[0]["open_time"]) > state.last_open_time:
+                    records = None
+        if records is None:
+            history = [record for record in store.load() if closed(record)]
+            state = IndicatorState.from_records(history) if history else None
+            advanced = state is not None
+        else:
+            fresh = [
+                record
+                for record in records
+                if int(record["open_time"]) > state.last_open_time and closed(record)
+            ]
+            for record in fresh:
+                state.update(record)
+            advanced = bool(fresh)
+        if advanced:
+            write_json_atomic({"store_inode": inode, "state": state.to_dict()}, state_path)
+        return state
+
+
+def build_indicator_frame(
+    records: Iterable[Dict[str, Any]],
+    base_interval: Optional[str] = None,
+    interval: Optional[str] = None,
+    limit: Optional[int] = None,
+    tz_offset_ms: int = 0,
+) -> KlineFrame:
+    """
+    由原始 K 线构建带指标的 KlineFrame。
+
+    给出 base_interval/interval 时先把 base_interval 的记录重采样为 interval，
+    limit 截取最近的若干根后再计算指标。
+    纯 CPU 计算、参数与返回值均可 pickle，供进程池执行。
+    """
+    frame = KlineFrame.coerce(records)
+    if base_interval and interval and base_interval != interval:
+        frame = resample_frame(frame, base_interval, interval, tz_offset_ms)
+    if limit is not None:
+        frame = frame.tail(limit).materialize()
+    return frame.with_indicators()
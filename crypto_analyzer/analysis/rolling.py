@@ -0,0 +1,223 @@
+"""
+滑动窗口顺序统计
+
+计算“当前值在最近 N 根中的分位数”时，逐根复制窗口再排序是 O(N log N)；
+对 500~2000 根的长窗口、每根 K 线、每个交易对都这样算代价太高。
+
+SortedBlockList 是分块的有序列表：元素按值分布在若干个有序小块中，
+块的最大值用于二分定位，块长度记在树状数组（Fenwick）里，因此
+插入、删除与秩查询（有多少个元素 <= x）都是 O(log n)（块内移动为 C 层 memmove）。
+块分裂/合并时才重建树状数组，摊还代价很小。
+
+rolling_percentile / rolling_mean 在此基础上逐根滑动窗口：新值进、旧值出，各 O(log n)。
+NaN 视为缺失：占用窗口位置，但不参与排名与均值。
+"""
+import math
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, List, Optional, Sequence
+
+NAN = float("nan")
+
+
+class SortedBlockList:
+    """支持重复值的有序多重集合。"""
+
+    def __init__(self, values: Iterable[float] = (), load: int = 64) -> None:
+        self._load = load
+        self._blocks: List[List[float]] = []
+        self._maxes: List[float] = []
+        self._tree: List[int] = []
+        self._size = 0
+        ordered = sorted(values)
+        if ordered:
+            self._blocks = [ordered[i : i + load] for i in range(0, len(ordered), load)]
+            self._maxes = [block[-1] for block in self._blocks]
+            self._size = len(ordered)
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
+
+    # ---------- 树状数组（块长度前缀和） ----------
+
+    def _rebuild(self) -> None:
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, position: int, delta: int) -> None:
+        i = position + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, position: int) -> int:
+        """前 position 个块的元素总数。"""
+        total = 0
+        i = position
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    # ---------- 修改 ----------
+
+    def add(self, value: float) -> None:
+        if not self._blocks:
+            self._blocks.append([value])
+            self._maxes.append(value)
+            self._size = 1
+            self._rebuild()
+            return
+        position = bisect_left(self._maxes, value)
+        if position == len(self._maxes):
+            position -= 1
+            self._maxes[position] = value
+        block = self._blocks[position]
+        insort(block, value)
+        self._size += 1
+        if len(block) > self._load * 2:
+            half = len(block) // 2
+            self._blocks[position : position + 1] = [block[:half], block[half:]]
+            self._maxes[position : position + 1] = [block[half - 1], block[-1]]
+            self._rebuild()
+        else:
+            self._tree_add(position, 1)
+
+    def remove(self, value: float) -> None:
+        """删除一个等于 value 的元素，不存在时抛出 ValueError。"""
+        position = bisect_left(self._maxes, value)
+        if position == len(self._maxes):
+            raise ValueError(f"{value} 不在集合中")
+        block = self._blocks[position]
+        index = bisect_left(block, value)
+        if index == len(block) or block[index] != value:
+            raise ValueError(f"{value} 不在集合中")
+        del block[index]
+        self._size -= 1
+        if not block:
+            del self._blocks[position]
+            del self._maxes[position]
+            self._rebuild()
+            return
+        self._maxes[position] = block[-1]
+        if len(block) < self._load // 4 and len(self._blocks) > 1:
+            # 过小的块并入相邻块，保持块数为 O(n / load)
+            neighbor = position - 1 if position > 0 else position + 1
+            low, high = sorted((position, neighbor))
+            merged = self._blocks[low] + self._blocks[high]
+            self._blocks[low : high + 1] = [merged]
+            self._maxes[low : high + 1] = [merged[-1]]
+            self._rebuild()
+        else:
+            self._tree_add(position, -1)
+
+    # ---------- 查询 ----------
+
+    def count_le(self, value: float) -> int:
+        """<= value 的元素个数。"""
+        position = bisect_right(self._maxes, value)
+        if position == len(self._maxes):
+            return self._size
+        return self._prefix(position) + bisect_right(self._blocks[position], value)
+
+    def count_lt(self, value: float) -> int:
+        """< value 的元素个数。"""
+        position = bisect_left(self._maxes, value)
+        if position == len(self._maxes):
+            return self._size
+        return self._prefix(position) + bisect_left(self._blocks[position], value)
+
+    def __getitem__(self, rank: int) -> float:
+        """第 rank 小的元素（0 起，支持负数）。"""
+        if rank < 0:
+            rank += self._size
+        if not 0 <= rank < self._size:
+            raise IndexError("rank 超出范围")
+        # 在树状数组上二分定位块
+        position = 0
+        step = 1 << (len(self._tree).bit_length())
+        tree = self._tree
+        while step:
+            nxt = position + step
+            if nxt < len(tree) and tree[nxt] <= rank:
+                position = nxt
+                rank -= tree[nxt]
+            step >>= 1
+        return self._blocks[position][rank]
+
+
+def rolling_percentile(
+    values: Sequence[float], window: int, min_periods: int = 1
+) -> array:
+    """
+    每个位置的当前值在最近 window 个值（含自身）中的分位数：<= 当前值的个数 / 有效个数 × 100。
+
+    与 calculate_volatility_regime 的分位数口径一致。当前值为 NaN，或窗口内有效值
+    少于 min_periods 时结果为 NaN。
+    """
+    if window < 1:
+        raise ValueError("window 必须 >= 1")
+    n = len(values)
+    out = array("d", [NAN]) * n
+    ranks = SortedBlockList()
+    for i in range(n):
+        value = values[i]
+        if value == value:
+            ranks.add(value)
+        if i >= window:
+            old = values[i - window]
+            if old == old:
+                ranks.remove(old)
+        count = len(ranks)
+        if value == value and count >= min_periods:
+            out[i] = ranks.count_le(value) / count * 100
+    return out
+
+
+def rolling_mean(values: Sequence[float], window: int, min_periods: int = 1) -> array:
+    """
+    最近 window 个值（含自身）中有效值的均值，滑动累计 O(1)/根。
+    定期整窗重算，避免长序列上累计误差漂移。
+    """
+    if window < 1:
+        raise ValueError("window 必须 >= 1")
+    n = len(values)
+    out = array("d", [NAN]) * n
+    total = 0.0
+    count = 0
+    for i in range(n):
+        value = values[i]
+        if value == value:
+            total += value
+            count += 1
+        if i >= window:
+            old = values[i - window]
+            if old == old:
+                total -= old
+                count -= 1
+        if i % window == window - 1:
+            valid = [v for v in values[i - window + 1 : i + 1] if v == v]
+            total = math.fsum(valid)
+        if count >= min_periods and count:
+            out[i] = total / count
+    return out
+
+
+def rank_of(values: Sequence[float], current: float) -> Optional[float]:
+    """单个窗口的分位数（values 中 <= current 的比例 × 100），不排序；没有有效值时为 None。"""
+    valid = [v for v in values if v == v]
+    if not valid:
+        return None
+    return sum(1 for v in valid if v <= current) / len(valid) * 100
@@ -0,0 +1,120 @@
+"""
+预计算的分析结果（summary sidecar）
+
+fetch_klines 写出数据文件时顺带计算一次 summarize（含 analyze_signals）与
+detect_volatility_expansion_signals，保存在同目录的 _summary.json：
+
+    {"version": 1, "entries": {数据文件名: {"digest", "size", "mtime_ns", "summary", "volatility_analysis"}}}
+
+analyze_file 读取时先比对文件大小与 mtime（不读数据文件），一致则直接返回；
+不一致时再计算内容哈希，哈希也变了才重新分析并回写。
+分析逻辑变化时提升 SIDECAR_VERSION，旧的结果会被整体忽略。
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from crypto_analyzer.core.storage import file_lock, load_payload, write_json_atomic
+
+from .context import AnalysisContext
+from .summary import summarize
+from .volatility import detect_volatility_expansion_signals
+
+SIDECAR_FILENAME = "_summary.json"
+SIDECAR_LOCK_FILENAME = "_summary.lock"
+SIDECAR_VERSION = 1
+
+_HASH_CHUNK = 1 << 20
+
+
+def sidecar_path(data_path: Path) -> Path:
+    return data_path.parent / SIDECAR_FILENAME
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as fp:
+        for chunk in iter(lambda: fp.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_analysis(payload: Dict[str, Any], volatility: bool = True) -> Dict[str, Any]:
+    """
+    对一份 fetch_klines 输出计算摘要与波动率扩张分析（共用一个 AnalysisContext）。
+    volatility 为 False 时只计算摘要。纯 CPU 计算、参数与返回值均可 pickle，供进程池执行。
+    """
+    context = AnalysisContext(payload)
+    analysis: Dict[str, Any] = {"summary": summarize(context)}
+    if volatility:
+        analysis["volatility_analysis"] = detect_volatility_expansion_signals(context=context)
+    return analysis
+
+
+def _read_entries(path: Path) -> Dict[str, Any]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != SIDECAR_VERSION:
+        return {}
+    return data.get("entries") or {}
+
+
+def write_sidecar(data_path: Path, analysis: Dict[str, Any], digest: Optional[str] = None) -> None:
+    """
+    记录 data_path 的分析结果。同目录中已不存在的数据文件的条目会一并清理
+    （数据文件每次拉取都会换名，旧文件由 cleanup_old_files 删除）。
+
+    读取—合并—写回在文件锁内完成，多个进程同时写同一目录时不会互相覆盖条目。
+    """
+    path = sidecar_path(data_path)
+    stat = data_path.stat()
+    entry = {
+        "digest": digest or file_digest(data_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        **analysis,
+    }
+    with file_lock(data_path.parent / SIDECAR_LOCK_FILENAME):
+        entries = {
+            name: existing
+            for name, existing in _read_entries(path).items()
+            if name != data_path.name and (data_path.parent / name).exists()
+        }
+        entries[data_path.name] = entry
+        write_json_atomic({"version": SIDECAR_VERSION, "entries": entries}, path)
+
+
+def load_sidecar(data_path: Path) -> Optional[Dict[str, Any]]:
+    """返回与 data_path 当前内容一致的分析结果；没有记录或内容已变化时返回 None。"""
+    entry = _read_entries(sidecar_path(data_path)).get(data_path.name)
+    if entry is None:
+        return None
+    try:
+        stat = data_path.stat()
+    except OSError:
+        return None
+    if (stat.st_size, stat.st_mtime_ns) != (entry.get("size"), entry.get("mtime_ns")):
+        # 文件被改写过（或只是 touch），按内容哈希确认
+        if stat.st_size != entry.get("size") or file_digest(data_path) != entry.get("digest"):
+            return None
+    return {"summary": entry["summary"], "volatility_analysis": entry["volatility_analysis"]}
+
+
+def analyze_file_cached(data_path: Path, refresh: bool = False) -> Dict[str, Any]:
+    """
+    优先返回 sidecar 中的分析结果；不存在或已过期（或 refresh=True）时
+    读取数据文件重新计算，并回写 sidecar 供下次使用。
+    """
+    if not refresh:
+        cached = load_sidecar(data_path)
+        if cached is not None:
+            return cached
+    analysis = compute_analysis(load_payload(data_path))
+    try:
+        write_sidecar(data_path, analysis)
+    except OSError:
+        pass  # sidecar 只是加速手段，只读目录等情况下不影响结果
+    return analysis
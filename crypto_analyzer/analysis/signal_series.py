@@ -0,0 +1,175 @@
+"""
+全历史信号序列
+
+analyze_signals 与 detect_volatility_expansion_signals 只评估最新一根 K 线；
+要统计某个信号最近触发了多少次、历史上是否可靠，逐根调用它们是 O(n²)。
+这里对带指标的 KlineFrame 一次遍历算出每根 K 线的信号列（array，长度与 frame 相同）：
+
+- vol_regime      波动率状态（与 calculate_volatility_regime 相同的判定）
+- vol_percentile  当前波动率在最近 lookback 根中的分位数（%）
+- vol_trend       最近 5 根波动率是否上升
+- ma20_cross      收盘价上穿 / 下穿 MA20（与 AnalysisContext.ma20_cross 相同）
+- macd_cross      MACD 金叉 / 死叉
+- volume_ratio    成交量相对之前 20 根平均值的倍数（与 volume_spike 相同）
+- boll_regime     布林带宽度状态：收口 / 正常 / 扩张
+
+分类信号用小整数编码（见各 *_LABELS，-1 表示该根数据不足），可用 decode() 还原为字符串。
+每根 K 线只看固定长度的窗口（长窗口的分位数用 rolling 中的有序结构维护），总耗时与 K 线数量近似线性；
+最后一根的结果与对应的单根函数逐项一致。
+"""
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from crypto_analyzer.core.kline_frame import KlineFrame
+
+from .rolling import rolling_mean, rolling_percentile
+
+NAN = float("nan")
+
+VOL_REGIME_LABELS: Tuple[str, ...] = ("low_volatility", "normal_volatility", "high_volatility")
+VOL_TREND_LABELS: Tuple[str, ...] = ("decreasing", "increasing")
+BOLL_REGIME_LABELS: Tuple[str, ...] = ("normal", "squeeze", "expansion")
+# 穿越类信号：1 为上穿（金叉），-1 为下穿（死叉），0 为无
+CROSS_LABELS = {1: "bullish", -1: "bearish", 0: None}
+
+SERIES_COLUMNS = (
+    "vol_regime",
+    "vol_percentile",
+    "vol_trend",
+    "ma20_cross",
+    "macd_cross",
+    "volume_ratio",
+    "boll_regime",
+)
+
+
+def decode(codes: Sequence[int], labels: Sequence[str]) -> List[Optional[str]]:
+    """把分类信号的编码还原为字符串，-1 为 None。"""
+    return [labels[code] if code >= 0 else None for code in codes]
+
+
+def _float_column(frame: KlineFrame, name: str) -> Sequence[float]:
+    if name in frame:
+        return frame.column(name)
+    return array("d", [NAN]) * len(frame)
+
+
+def volatility_key(frame: KlineFrame) -> str:
+    """与 calculate_volatility_regime 相同：最新一根有 atr14_pct 时用它，否则用 volatility_20_pct。"""
+    return "atr14_pct" if frame.value("atr14_pct") is not None else "volatility_20_pct"
+
+
+def volatility_regime_series(
+    frame: KlineFrame, lookback: int = 20
+) -> Tuple[array, array, array]:
+    """
+    每根 K 线的 (波动率状态, 分位数, 波动率趋势)。
+
+    与 calculate_volatility_regime 对前 i+1 根调用的结果一致：窗口为最近 lookback 根中
+    非 NaN 的值；K 线不足 lookback 根或当前值缺失时状态为 -1、分位数为 NaN。
+    分位数与均值都按滑动窗口维护（见 rolling），lookback 取 500~2000 也不会变慢。
+    """
+    n = len(frame)
+    vols = _float_column(frame, volatility_key(frame))
+    regimes = array("b", [-1]) * n
+    percentiles = array("d", [NAN]) * n
+    trends = array("b", [-1]) * n
+    ranks = rolling_percentile(vols, lookback)
+    means = rolling_mean(vols, lookback)
+    for i in range(lookback - 1, n):
+        current = vols[i]
+        if current != current:
+            continue
+        avg = means[i]
+        percentiles[i] = ranks[i]
+        if current < avg * 0.7:
+            regimes[i] = 0
+        elif current > avg * 1.3:
+            regimes[i] = 2
+        else:
+            regimes[i] = 1
+        recent = [v for v in vols[max(0, i - 4) : i + 1] if v == v]
+        trends[i] = 1 if len(recent) >= 2 and recent[-1] > recent[0] else 0
+    return regimes, percentiles, trends
+
+
+def ma20_cross_series(frame: KlineFrame) -> array:
+    """前一根收盘价与当根 MA20 比较：上穿 1，下穿 -1。"""
+    n = len(frame)
+    out = array("b", [0]) * n
+    closes = _float_column(frame, "close")
+    ma20 = _float_column(frame, "ma20")
+    for i in range(1, n):
+        ma, close, prev_close = ma20[i], closes[i], closes[i - 1]
+        # NaN 视为缺失；0 也按“无数据”处理，与单根判定的真值检查一致
+        if not (ma == ma and ma and close == close and close) or prev_close != prev_close:
+            continue
+        if prev_close < ma < close:
+            out[i] = 1
+        elif prev_close > ma > close:
+            out[i] = -1
+    return out
+
+
+def macd_cross_series(frame: KlineFrame) -> array:
+    """DIF 上穿 DEA 为 1（金叉），下穿为 -1（死叉）。"""
+    n = len(frame)
+    out = array("b", [0]) * n
+    dif = _float_column(frame, "macd_dif")
+    dea = _float_column(frame, "macd_dea")
+    for i in range(1, n):
+        d0, e0, d1, e1 = dif[i - 1], dea[i - 1], dif[i], dea[i]
+        if d0 != d0 or e0 != e0 or d1 != d1 or e1 != e1:
+            continue
+        if d0 <= e0 and d1 > e1:
+            out[i] = 1
+        elif d0 >= e0 and d1 < e1:
+            out[i] = -1
+    return out
+
+
+def volume_ratio_series(frame: KlineFrame, lookback: int = 20) -> array:
+    """当根成交量 / 之前 lookback 根的平均成交量；不足 lookback+1 根时为 0。"""
+    n = len(frame)
+    out = array("d", [0.0]) * n
+    if "volume" not in frame:
+        return out
+    volumes = frame.column("volume")
+    for i in range(lookback, n):
+        avg = sum(volumes[i - lookback : i]) / lookback
+        out[i] = volumes[i] / avg if avg > 0 else 0.0
+    return out
+
+
+def boll_regime_series(frame: KlineFrame) -> array:
+    """布林带宽度百分比 < 5 为收口，> 15 为扩张，其余为正常；缺失为 -1。"""
+    widths = _float_column(frame, "boll_width_20_pct")
+    return array(
+        "b",
+        [-1 if w != w else 1 if w < 5 else 2 if w > 15 else 0 for w in widths],
+    )
+
+
+def signal_series(frame: KlineFrame, lookback: int = 20) -> Dict[str, array]:
+    """计算全部信号列（SERIES_COLUMNS），frame 需已包含指标列（见 KlineFrame.with_indicators）。"""
+    frame = KlineFrame.coerce(frame)
+    regimes, percentiles, trends = volatility_regime_series(frame, lookback)
+    return {
+        "vol_regime": regimes,
+        "vol_percentile": percentiles,
+        "vol_trend": trends,
+        "ma20_cross": ma20_cross_series(frame),
+        "macd_cross": macd_cross_series(frame),
+        "volume_ratio": volume_ratio_series(frame),
+        "boll_regime": boll_regime_series(frame),
+    }
+
+
+def with_signal_series(frame: KlineFrame, lookback: int = 20) -> KlineFrame:
+    """返回附带信号列的新 frame。"""
+    return frame.with_columns(signal_series(frame, lookback))
+
+
+def recent_count(series: Sequence[int], value: int, window: int) -> int:
+    """最近 window 根中信号等于 value 的次数（如最近 50 根里的金叉次数）。"""
+    return sum(1 for code in series[-window:] if code == value)
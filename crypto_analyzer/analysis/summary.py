@@ -1,46 +1,33 @@
-from typing import Any, Dict, Iterable
+from typing import Any, Dict, Iterable, Optional, Union
 
-def latest_kline(klines: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
-    data = list(klines)
-    if not data:
-        raise ValueError("No kline data found in JSON")
-    
-    # 自动判断顺序：取 open_time 最大的那个
-    first = data[0]
-    last = data[-1]
-    
-    t1 = first.get('open_time', 0)
-    t2 = last.get('open_time', 0)
-    
-    if t1 > t2:
-        return first  # 倒序，第一个是最新的
-    else:
-        return last   # 正序，最后一个是最新的
+from crypto_analyzer.core.kline_frame import KlineFrame
+
+from .context import AnalysisContext
+
+Klines = Union[KlineFrame, Iterable[Dict[str, Any]]]
+
+
+def latest_kline(klines: Klines) -> Dict[str, Any]:
+    # KlineFrame 固定为时间正序，最后一行即最新 K 线
+    return KlineFrame.coerce(klines).last()
 
 
 def order_book_imbalance(order_book: Dict[str, Any], depth: int = 10) -> float:
-    bids = order_book.get("bids") or []
-    asks = order_book.get("asks") or []
-    bid_value = sum(float(price) * float(qty) for price, qty in bids[:depth])
-    ask_value = sum(float(price) * float(qty) for price, qty in asks[:depth])
-    total = bid_value + ask_value
-    return (bid_value - ask_value) / total if total else 0.0
+    return AnalysisContext({"order_book": order_book}).order_book_imbalance(depth)
 
 
-def volume_spike(klines: Iterable[Dict[str, Any]], lookback: int = 20) -> float:
+def volume_spike(klines: Klines, lookback: int = 20) -> float:
     """计算最后一根K线的成交量相对于过去平均值的倍数"""
-    data = list(klines)
-    if len(data) < lookback + 1:
-        return 0.0
-    last_vol = float(data[-1].get('volume', 0))
-    # 取前 n 根（不含当前）计算平均
-    prev_vols = [float(k.get('volume', 0)) for k in data[-lookback-1:-1]]
-    avg_vol = sum(prev_vols) / len(prev_vols) if prev_vols else 0
-    return last_vol / avg_vol if avg_vol > 0 else 0.0
+    return AnalysisContext({"klines": klines}).volume_ratio(lookback)
 
 
-def analyze_signals(summary: Dict[str, Any], klines: list) -> Dict[str, Any]:
-    """客观识别技术信号，不含主观判断"""
+def analyze_signals(
+    summary: Dict[str, Any], klines: Klines, context: Optional[AnalysisContext] = None
+) -> Dict[str, Any]:
+    """客观识别技术信号，不含主观判断（传入 context 时复用其中已算好的派生量）"""
+    if context is None:
+        context = AnalysisContext({"klines": klines})
+    klines = context.klines
     signals = {}
     
     # 1. RSI 状态
@@ -118,7 +105,7 @@ def analyze_signals(summary: Dict[str, Any], klines: list) -> Dict[str, Any]:
             signals['vwap_position'] = 'below_vwap'  # 价格低于平均成本，可能偏弱
 
     # 3. 成交量比率
-    vol_ratio = volume_spike(klines)
+    vol_ratio = context.volume_ratio()
     signals['volume_ratio'] = round(vol_ratio, 2)
     if vol_ratio > 3.0:
         signals['volume_status'] = 'extreme_spike'
@@ -172,21 +159,19 @@ def analyze_signals(summary: Dict[str, Any], klines: list) -> Dict[str, Any]:
                 signals['macd_momentum_side'] = 'bearish'
             else:
                 signals['macd_momentum_side'] = 'neutral'
-    if klines and len(klines) >= 2:
-        ordered = sorted(klines, key=lambda k: k.get('open_time', 0))
-        prev = ordered[-2]
-        last_k = ordered[-1]
-        d0 = prev.get('macd_dif')
-        e0 = prev.get('macd_dea')
-        d1 = last_k.get('macd_dif')
-        e1 = last_k.get('macd_dea')
+    if len(klines) >= 2:
+        # KlineFrame 已按时间正序排列，无需再排序
+        d0 = klines.value('macd_dif', -2)
+        e0 = klines.value('macd_dea', -2)
+        d1 = klines.value('macd_dif', -1)
+        e1 = klines.value('macd_dea', -1)
         if d0 is not None and e0 is not None and d1 is not None and e1 is not None:
             if d0 <= e0 and d1 > e1:
                 signals['macd_cross'] = 'bullish_cross'
             elif d0 >= e0 and d1 < e1:
                 signals['macd_cross'] = 'bearish_cross'
-        h0 = prev.get('macd_hist')
-        h1 = last_k.get('macd_hist')
+        h0 = klines.value('macd_hist', -2)
+        h1 = klines.value('macd_hist', -1)
         if h0 is not None and h1 is not None:
             hist_change = h1 - h0
             signals['macd_hist_change'] = round(hist_change, 8)
@@ -203,23 +188,24 @@ def analyze_signals(summary: Dict[str, Any], klines: list) -> Dict[str, Any]:
     return summary
 
 
-def summarize(payload: Dict[str, Any]) -> Dict[str, Any]:
-    """提取客观技术指标和市场数据"""
-    klines = payload.get("klines", [])
-    last = latest_kline(klines)
-    ticker = payload.get("ticker_24hr", {})
-    funding = payload.get("funding_rate", {})
-    open_interest = payload.get("open_interest", {})
-    order_book = payload.get("order_book", {})
-    current_price_data = payload.get("current_price", {})
+def summarize(payload: Union[AnalysisContext, Dict[str, Any]]) -> Dict[str, Any]:
+    """提取客观技术指标和市场数据（payload 可以是原始数据或 AnalysisContext）"""
+    context = AnalysisContext.of(payload)
+    last = context.last
+    ticker = context.ticker_24hr
+    funding = context.funding_rate
+    open_interest = context.open_interest
+    current_price_data = context.current_price
 
     # 优先使用实时价格，如果没有则使用最后一根K线的收盘价
     price = current_price_data.get("price")
-    if price is None:
-        price = float(last.get("close", 0))
+    if price in (None, ""):
+        price = last.get("close", 0)
+    # 全市场批量接口返回的价格为字符串
+    price = float(price)
 
     summary = {
-        "symbol": last.get("symbol") or ticker.get("symbol") or current_price_data.get("symbol") or payload.get("exchange", "unknown"),
+        "symbol": last.get("symbol") or ticker.get("symbol") or current_price_data.get("symbol") or context.payload.get("exchange", "unknown"),
         "current_price": price,
         "kline_close": float(last.get("close", 0)),
         "open": float(last.get("open", 0)),
@@ -250,11 +236,11 @@ def summarize(payload: Dict[str, Any]) -> Dict[str, Any]:
         "funding_rate": funding.get("lastFundingRate") or funding.get("fundingRate"),
         "next_funding_time": funding.get("nextFundingTime"),
         "open_interest": open_interest.get("openInterest"),
-        "order_book_imbalance": order_book_imbalance(order_book),
+        "order_book_imbalance": context.order_book_imbalance(),
     }
     
     # 添加客观信号分析
-    summary = analyze_signals(summary, klines)
+    summary = analyze_signals(summary, context.klines, context)
     
     return summary
 
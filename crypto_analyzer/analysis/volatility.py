@@ -4,44 +4,47 @@
 用于判断币种是否可能从低波动率转换到高波动率。
 基于历史数据和技术指标，不依赖未来信息（无提前量）。
 """
-from typing import Any, Dict, List, Optional, Tuple
+from array import array
+from typing import Any, Dict, Iterable, Optional, Sequence, Union
 import json
 
-def calculate_volatility_regime(klines: List[Dict[str, Any]], lookback: int = 20) -> Dict[str, Any]:
+from crypto_analyzer.core.kline_frame import KlineFrame
+
+from .context import AnalysisContext
+from .rolling import rank_of, rolling_percentile
+
+Klines = Union[KlineFrame, Iterable[Dict[str, Any]]]
+
+
+def calculate_volatility_regime(klines: Klines, lookback: int = 20) -> Dict[str, Any]:
     """
     计算当前波动率状态和趋势。
     
     Args:
-        klines: K线数据列表（需包含atr14_pct或volatility_20_pct）
+        klines: K线数据（KlineFrame 或字典列表，需包含atr14_pct或volatility_20_pct）
         lookback: 回看周期数，用于计算历史波动率分位数
     
     Returns:
         包含波动率状态、趋势、转换信号等的字典
     """
-    if not klines or len(klines) < lookback:
+    klines = KlineFrame.coerce(klines)
+    if len(klines) < lookback:
         return {
             "status": "insufficient_data",
             "message": f"数据不足，需要至少{lookback}根K线"
         }
     
-    # 获取最近的K线数据
-    recent = klines[-lookback:]
-    latest = klines[-1]
-    
     # 提取波动率指标（优先使用ATR百分比，其次使用标准差）
-    volatility_key = "atr14_pct" if "atr14_pct" in latest else "volatility_20_pct"
-    if volatility_key not in latest:
+    volatility_key = "atr14_pct" if klines.value("atr14_pct") is not None else "volatility_20_pct"
+    if klines.value(volatility_key) is None:
         return {
             "status": "no_volatility_data",
             "message": "K线数据中缺少波动率指标，请先运行calculate_indicators"
         }
     
-    # 收集历史波动率值
-    historical_vol = [
-        k.get(volatility_key, 0) 
-        for k in recent 
-        if k.get(volatility_key) is not None
-    ]
+    # 收集历史波动率值（列视图切片，NaN 表示该根缺少指标）
+    vol_column = klines.column(volatility_key)
+    historical_vol = [v for v in vol_column[-lookback:] if v == v]
     
     if not historical_vol:
         return {
@@ -49,14 +52,13 @@ def calculate_volatility_regime(klines: List[Dict[str, Any]], lookback: int = 20
             "message": "无法提取历史波动率数据"
         }
     
-    current_vol = latest.get(volatility_key, 0)
+    current_vol = klines.value(volatility_key)
     avg_vol = sum(historical_vol) / len(historical_vol)
     max_vol = max(historical_vol)
     min_vol = min(historical_vol)
     
-    # 计算波动率分位数（当前波动率在历史中的位置）
-    sorted_vol = sorted(historical_vol)
-    percentile = (sum(1 for v in sorted_vol if v <= current_vol) / len(sorted_vol)) * 100
+    # 计算波动率分位数（当前波动率在历史中的位置），只需计数，无需排序
+    percentile = rank_of(historical_vol, current_vol)
     
     # 判断波动率状态
     if current_vol < avg_vol * 0.7:
@@ -67,11 +69,7 @@ def calculate_volatility_regime(klines: List[Dict[str, Any]], lookback: int = 20
         regime = "normal_volatility"
     
     # 计算短期趋势（最近5根K线的波动率变化）
-    short_term_vol = [
-        k.get(volatility_key, 0) 
-        for k in klines[-5:] 
-        if k.get(volatility_key) is not None
-    ]
+    short_term_vol = [v for v in vol_column[-5:] if v == v]
     vol_trend = "increasing" if len(short_term_vol) >= 2 and short_term_vol[-1] > short_term_vol[0] else "decreasing"
     
     return {
@@ -87,12 +85,30 @@ def calculate_volatility_regime(klines: List[Dict[str, Any]], lookback: int = 20
     }
 
 
+def volatility_percentile_series(klines: Klines, lookback: int = 500) -> Sequence[float]:
+    """
+    每根 K 线的波动率在最近 lookback 根中的分位数（%），口径与 calculate_volatility_regime 相同。
+
+    基于滑动窗口的有序结构（见 rolling.rolling_percentile），每根 O(log lookback)，
+    适合 500~2000 根的长窗口；K 线不足 lookback 根的位置为 NaN。
+    """
+    klines = KlineFrame.coerce(klines)
+    volatility_key = "atr14_pct" if klines.value("atr14_pct") is not None else "volatility_20_pct"
+    if volatility_key not in klines:
+        return array("d", [float("nan")]) * len(klines)
+    percentiles = rolling_percentile(klines.column(volatility_key), lookback)
+    for i in range(min(lookback - 1, len(percentiles))):
+        percentiles[i] = float("nan")
+    return percentiles
+
+
 def detect_volatility_expansion_signals(
-    klines: List[Dict[str, Any]], 
+    klines: Optional[Klines] = None, 
     ticker_24hr: Optional[Dict[str, Any]] = None,
     funding_rate: Optional[Dict[str, Any]] = None,
     open_interest: Optional[Dict[str, Any]] = None,
-    order_book: Optional[Dict[str, Any]] = None
+    order_book: Optional[Dict[str, Any]] = None,
+    context: Optional[AnalysisContext] = None,
 ) -> Dict[str, Any]:
     """
     检测可能从低波动转换到高波动的信号。
@@ -105,10 +121,27 @@ def detect_volatility_expansion_signals(
     5. 订单簿失衡
     6. RSI极端值后的反转
     
+    传入 context 时忽略其余参数，直接使用其中的数据与已算好的派生量
+    （与 summarize 共用同一个 AnalysisContext 时，波动率状态、订单簿金额等只算一次）。
+
     Returns:
         包含信号强度、具体信号列表、综合判断的字典
     """
-    if not klines or len(klines) < 20:
+    if context is None:
+        context = AnalysisContext(
+            {
+                "klines": klines if klines is not None else [],
+                "ticker_24hr": ticker_24hr,
+                "funding_rate": funding_rate,
+                "open_interest": open_interest,
+                "order_book": order_book,
+            }
+        )
+    klines = context.klines
+    ticker_24hr = context.ticker_24hr
+    funding_rate = context.funding_rate
+    open_interest = context.open_interest
+    if len(klines) < 20:
         return {
             "status": "insufficient_data",
             "signals": [],
@@ -119,7 +152,7 @@ def detect_volatility_expansion_signals(
     signal_strength = 0
     
     # 1. 波动率状态分析
-    vol_analysis = calculate_volatility_regime(klines)
+    vol_analysis = context.regime()
     if vol_analysis.get("status") != "ok":
         return {
             "status": vol_analysis.get("status"),
@@ -142,8 +175,8 @@ def detect_volatility_expansion_signals(
     
     # 信号2: 波动率压缩（当前波动率处于历史低位，但价格开始突破）
     if vol_percentile < 30:  # 波动率处于历史30%分位以下
-        latest = klines[-1]
-        prev = klines[-2] if len(klines) >= 2 else None
+        latest = context.last
+        prev = context.prev
         
         # 检查价格是否开始突破（涨幅或跌幅增大）
         if prev:
@@ -159,9 +192,8 @@ def detect_volatility_expansion_signals(
     
     # 信号3: 成交量放大（需要至少2根K线对比）
     if len(klines) >= 2:
-        recent_volumes = [k.get("volume", 0) for k in klines[-5:]]
-        avg_volume = sum(recent_volumes) / len(recent_volumes)
-        latest_volume = klines[-1].get("volume", 0)
+        avg_volume = context.volume_mean(5) or 0.0
+        latest_volume = klines.value("volume") or 0
         
         if latest_volume > avg_volume * 1.5:  # 最新成交量比近期平均高50%以上
             signals.append({
@@ -172,8 +204,7 @@ def detect_volatility_expansion_signals(
             signal_strength += 2
     
     # 信号4: RSI极端值后的反转信号
-    latest = klines[-1]
-    rsi = latest.get("rsi14")
+    rsi = context.last.get("rsi14")
     if rsi is not None:
         if rsi < 30:  # 超卖
             signals.append({
@@ -191,35 +222,28 @@ def detect_volatility_expansion_signals(
             signal_strength += 1
     
     # 信号5: 价格突破移动平均线
-    if len(klines) >= 20:
-        latest = klines[-1]
-        prev = klines[-2] if len(klines) >= 2 else None
-        ma20 = latest.get("ma20")
-        ma50 = latest.get("ma50")
-        close = latest.get("close")
-        
-        if ma20 and close and prev:
-            prev_close = prev.get("close")
-            # 价格从MA20下方突破到上方，或反之
-            if prev_close < ma20 and close > ma20:
-                signals.append({
-                    "type": "price_breakout_ma20",
-                    "description": "价格突破MA20，可能引发波动",
-                    "strength": 2
-                })
-                signal_strength += 2
-            elif prev_close > ma20 and close < ma20:
-                signals.append({
-                    "type": "price_breakdown_ma20",
-                    "description": "价格跌破MA20，可能引发波动",
-                    "strength": 2
-                })
-                signal_strength += 2
+    ma20_cross = context.ma20_cross
+    if ma20_cross == "breakout":
+        signals.append({
+            "type": "price_breakout_ma20",
+            "description": "价格突破MA20，可能引发波动",
+            "strength": 2
+        })
+        signal_strength += 2
+    elif ma20_cross == "breakdown":
+        signals.append({
+            "type": "price_breakdown_ma20",
+            "description": "价格跌破MA20，可能引发波动",
+            "strength": 2
+        })
+        signal_strength += 2
     
     # 信号6: 市场情绪变化（资金费率）
     if funding_rate:
         funding = funding_rate.get("lastFundingRate") or funding_rate.get("fundingRate")
-        if funding is not None:
+        if funding not in (None, ""):
+            # 交易所原始数据中数值为字符串
+            funding = float(funding)
             # 资金费率绝对值较大，说明市场情绪极端
             if abs(funding) > 0.05:  # 0.05%以上
                 signals.append({
@@ -243,26 +267,21 @@ def detect_volatility_expansion_signals(
             signal_strength += 1
     
     # 信号8: 订单簿失衡
-    if order_book:
-        bids = order_book.get("bids", [])
-        asks = order_book.get("asks", [])
-        if bids and asks:
-            bid_value = sum(float(price) * float(qty) for price, qty in bids[:10])
-            ask_value = sum(float(price) * float(qty) for price, qty in asks[:10])
-            total = bid_value + ask_value
-            if total > 0:
-                imbalance = (bid_value - ask_value) / total
-                if abs(imbalance) > 0.3:  # 买卖盘失衡超过30%
-                    signals.append({
-                        "type": "order_book_imbalance",
-                        "description": f"订单簿失衡（{'买盘' if imbalance > 0 else '卖盘'}压力{abs(imbalance)*100:.1f}%）",
-                        "strength": 2
-                    })
-                    signal_strength += 2
+    if context.order_book.get("bids") and context.order_book.get("asks"):
+        bid_value, ask_value = context.depth_sums(10)
+        if bid_value + ask_value > 0:
+            imbalance = context.order_book_imbalance(10)
+            if abs(imbalance) > 0.3:  # 买卖盘失衡超过30%
+                signals.append({
+                    "type": "order_book_imbalance",
+                    "description": f"订单簿失衡（{'买盘' if imbalance > 0 else '卖盘'}压力{abs(imbalance)*100:.1f}%）",
+                    "strength": 2
+                })
+                signal_strength += 2
     
     # 信号9: 24小时涨跌幅较大（市场已经活跃）
     if ticker_24hr:
-        change_24h = ticker_24hr.get("priceChangePercent", 0)
+        change_24h = float(ticker_24hr.get("priceChangePercent") or 0)
         if abs(change_24h) > 5:  # 24小时涨跌幅超过5%
             signals.append({
                 "type": "high_24h_volatility",
@@ -5,5 +5,15 @@ crypto_analyzer.core
 核心基础设施：
 - config: 全局配置（交易所 URL、输出路径等）
 - storage: 文件存储与路径管理
-- rate_limiter: API 请求频率限制
+- rate_limiter: API 请求频率限制（按权重的令牌桶，预算可跨进程共享）
+- kline_frame: 列式 K 线容器（KlineFrame）
+- intervals: K 线周期解析
+- kline_store: append-only 本地 K 线仓库
+- column_file: mmap 读取的二进制列文件（.klb）
+- scheduler: 有界 worker 池与批量进度统计
+- backfill: 历史回填的窗口规划与断点续传
+- resample: 细周期 K 线重采样为粗周期
+- freshness: 按 K 线收盘时间决定跳过 / 补最后一根 / 完整拉取
+- response_cache: 交易所 REST 响应的两级 TTL 缓存（内存 LRU + 磁盘）
+- snapshot_history: 市场快照的列式历史与变化榜单
 """
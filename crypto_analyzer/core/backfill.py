@@ -0,0 +1,97 @@
+"""
+历史回填的时间窗口规划与断点续传。
+
+回填把 [start, end] 切成若干个“一次请求能取完”的时间窗口，并发拉取，
+按时间顺序依次写入 KlineStore。每提交一个窗口就更新检查点文件
+（与仓库同目录的 _backfill.json），中断后重新运行同样的命令会从
+最后一个已提交窗口之后继续。检查点只按 (周期, 起点) 匹配：未指定 --end 时
+终点是每次运行的当前时间，续传时沿用新的终点（历史数据不会变化）。
+"""
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .intervals import interval_to_ms
+from .storage import write_json_atomic
+
+CHECKPOINT_FILENAME = "_backfill.json"
+
+Window = Tuple[int, int]
+
+
+def parse_time(text: str) -> int:
+    """
+    解析命令行时间参数为毫秒时间戳（UTC）。
+
+    支持毫秒/秒时间戳、YYYY-MM-DD、YYYY-MM-DD HH:MM[:SS] 以及带时区的 ISO 8601。
+    """
+    text = text.strip()
+    if re.fullmatch(r"\d{13}", text):
+        return int(text)
+    if re.fullmatch(r"\d{10}", text):
+        return int(text) * 1000
+    try:
+        moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"无法识别的时间：{text}（示例：2024-01-01 或 2024-01-01T08:00）") from None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def plan_windows(start_ms: int, end_ms: int, interval: str, page_size: int) -> List[Window]:
+    """把 [start_ms, end_ms] 切成每段最多 page_size 根 K 线的闭区间窗口（按时间正序）。"""
+    interval_ms = interval_to_ms(interval)
+    if not interval_ms:
+        raise ValueError(f"回填不支持非固定长度的周期：{interval}")
+    if end_ms < start_ms:
+        raise ValueError("回填结束时间早于开始时间")
+    span = interval_ms * page_size
+    windows: List[Window] = []
+    cursor = start_ms
+    while cursor <= end_ms:
+        windows.append((cursor, min(end_ms, cursor + span - 1)))
+        cursor += span
+    return windows
+
+
+class BackfillCheckpoint:
+    """记录某次回填（同一 interval/start）已连续提交到哪个时间点。"""
+
+    def __init__(self, folder: Path, interval: str, start_ms: int, end_ms: int) -> None:
+        self.path = folder / CHECKPOINT_FILENAME
+        self.interval = interval
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    def resume_from(self) -> Optional[int]:
+        """
+        上次中断时下一个待提交窗口的起点；周期或起点不一致、或没有检查点时返回 None。
+        终点不参与匹配，续传到本次的 end_ms。
+        """
+        if not self.path.exists():
+            return None
+        try:
+            data: Dict[str, Any] = json.loads(self.path.read_text(encoding="utf-8"))
+        except ValueError:
+            return None
+        if (data.get("interval"), data.get("start")) != (self.interval, self.start_ms):
+            return None
+        return int(data["next_start"])
+
+    def commit(self, next_start: int, fetched: int) -> None:
+        write_json_atomic(
+            {
+                "interval": self.interval,
+                "start": self.start_ms,
+                "end": self.end_ms,
+                "next_start": next_start,
+                "fetched": fetched,
+            },
+            self.path,
+        )
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
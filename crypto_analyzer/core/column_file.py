@@ -0,0 +1,156 @@
+"""
+定宽二进制列文件（.klb），用于 K 线与指标的快速读取。
+
+文件布局（小端）：
+
+    header : b"CAKL" | u16 版本 | u16 保留 | u32 头部长度 | 头部 JSON（补齐到 8 字节）
+    data   : 按列连续存放，每列 rows 个 8 字节值（int64 或 float64，NaN 表示缺失）
+    footer : 尾部 JSON（行数、数据区偏移、每 256 行一个 open_time 的稀疏索引）
+    trailer: u32 尾部长度 | b"CAKL"
+
+头部 JSON 保存列名/类型以及 payload 中除 K 线以外的字段（ticker、资金费率、订单簿等）。
+读取时通过 mmap 映射整个文件，每列是一个零拷贝的 memoryview，
+因此只读最后 N 根或某个时间段时只会触及对应的页面，不需要解析整个文件。
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .kline_frame import KlineFrame
+
+MAGIC = b"CAKL"
+VERSION = 1
+SUFFIX = ".klb"
+INDEX_STRIDE = 256
+
+_PREFIX = struct.Struct("<4sHHI")
+_TRAILER = struct.Struct("<I4s")
+
+
+def write_column_file(path: Path, frame: KlineFrame, meta: Optional[Dict[str, Any]] = None) -> None:
+    """把 KlineFrame（及附带的 meta）写为 .klb 文件，先写临时文件再原子替换。"""
+    frame = frame.materialize()
+    rows = len(frame)
+    columns: List[Dict[str, str]] = []
+    blocks: List[bytes] = []
+    object_columns: Dict[str, List[Any]] = {}
+    for name in frame.columns:
+        col = frame.column(name)
+        if isinstance(col, memoryview):
+            typecode = "q" if col.format == "q" else "d"
+            columns.append({"name": name, "type": typecode})
+            blocks.append(array(typecode, col).tobytes())
+        else:
+            object_columns[name] = list(col)
+
+    header = {
+        "columns": columns,
+        "order": frame.field_order,
+        "constants": frame.constants,
+        "object_columns": object_columns,
+        "meta": meta or {},
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(_PREFIX.size + len(header_bytes)) % 8)
+    data_offset = _PREFIX.size + len(header_bytes)
+
+    open_times = frame.column("open_time").tolist() if "open_time" in frame else []
+    footer = {
+        "rows": rows,
+        "data_offset": data_offset,
+        "index_stride": INDEX_STRIDE,
+        "time_index": open_times[::INDEX_STRIDE],
+        "first_time": open_times[0] if open_times else None,
+        "last_time": open_times[-1] if open_times else None,
+    }
+    footer_bytes = json.dumps(footer, separators=(",", ":")).encode("utf-8")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fp:
+        fp.write(_PREFIX.pack(MAGIC, VERSION, 0, len(header_bytes)))
+        fp.write(header_bytes)
+        for block in blocks:
+            fp.write(block)
+        fp.write(footer_bytes)
+        fp.write(_TRAILER.pack(len(footer_bytes), MAGIC))
+    os.replace(tmp_path, path)
+
+
+class ColumnFile:
+    """以 mmap 方式打开的 .klb 文件，提供零拷贝的 KlineFrame 视图。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        magic, version, _, header_len = _PREFIX.unpack_from(mm, 0)
+        footer_len, tail_magic = _TRAILER.unpack_from(mm, len(mm) - _TRAILER.size)
+        if magic != MAGIC or tail_magic != MAGIC:
+            raise ValueError(f"不是有效的 .klb 文件：{self.path}")
+        if version != VERSION:
+            raise ValueError(f"不支持的 .klb 版本：{version}")
+
+        header = json.loads(bytes(mm[_PREFIX.size : _PREFIX.size + header_len]))
+        footer_start = len(mm) - _TRAILER.size - footer_len
+        footer = json.loads(bytes(mm[footer_start : footer_start + footer_len]))
+
+        self.rows: int = footer["rows"]
+        self.meta: Dict[str, Any] = header["meta"]
+        self._time_index: List[int] = footer["time_index"]
+        self._index_stride: int = footer["index_stride"]
+
+        view = memoryview(mm)
+        offset = footer["data_offset"]
+        columns: Dict[str, Any] = {}
+        for spec in header["columns"]:
+            size = self.rows * 8
+            columns[spec["name"]] = view[offset : offset + size].cast(spec["type"])
+            offset += size
+        columns.update(header["object_columns"])
+        self._frame = KlineFrame(columns, header["order"], header["constants"])
+
+    def frame(self) -> KlineFrame:
+        """整个文件的 KlineFrame 视图（不复制数据）。"""
+        return self._frame
+
+    def tail(self, n: int) -> KlineFrame:
+        return self._frame.tail(n)
+
+    def between(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> KlineFrame:
+        """open_time 落在 [start_ms, end_ms] 内的 K 线视图，借助尾部稀疏索引二分定位。"""
+        open_times = self._frame.column("open_time")
+        lo, hi = 0, self.rows
+        if start_ms is not None:
+            lo = self._bisect(open_times, start_ms, bisect.bisect_left)
+        if end_ms is not None:
+            hi = self._bisect(open_times, end_ms, bisect.bisect_right)
+        return self._frame[lo:max(lo, hi)]
+
+    def _bisect(self, open_times, value: int, search) -> int:
+        # 先在稀疏索引上定位到块，再在映射列的该块内二分，只触及少量页面
+        block = max(0, bisect.bisect_right(self._time_index, value) - 1)
+        lo = block * self._index_stride
+        hi = min(self.rows, lo + self._index_stride + 1)
+        return search(open_times, value, lo, hi)
+
+    def payload(self, tail: Optional[int] = None) -> Dict[str, Any]:
+        """还原为与 JSON 文件相同结构的 payload，klines 为 KlineFrame 视图。"""
+        klines = self.tail(tail) if tail is not None else self._frame
+        return {**self.meta, "klines": klines}
+
+
+def save_payload_binary(payload: Dict[str, Any], path: Path) -> None:
+    """保存 fetch_klines 的 payload：K 线（KlineFrame）写入数据区，其余字段写入头部。"""
+    meta = {key: value for key, value in payload.items() if key != "klines"}
+    write_column_file(path, KlineFrame.coerce(payload["klines"]), meta)
+
+
+def load_payload_binary(path: Path, tail: Optional[int] = None) -> Dict[str, Any]:
+    return ColumnFile(path).payload(tail)
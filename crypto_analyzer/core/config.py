@@ -9,7 +9,26 @@ OKX_BASE_URL = "https://www.okx.com"
 
 BINANCE_MAX_CONCURRENT_REQUESTS = 10
 OKX_MAX_CONCURRENT_REQUESTS = 10
-BINANCE_MIN_REQUEST_INTERVAL = 0.1
-OKX_MIN_REQUEST_INTERVAL = 0.1
+# 请求节奏由权重限速器（rate_limiter.WeightedRateLimiter）按交易所预算控制，
+# 这里的最小间隔只作为未挂载权重钩子时的兜底
+BINANCE_MIN_REQUEST_INTERVAL = 0.0
+OKX_MIN_REQUEST_INTERVAL = 0.0
 
+# Binance U 本位合约 IP 权重上限（每分钟），以 X-MBX-USED-WEIGHT-1M 响应头为准
+BINANCE_REQUEST_WEIGHT_PER_MINUTE = 2400
+# 只使用官方额度的这一比例，给其他进程/手动请求留余量
+RATE_LIMIT_SAFETY_RATIO = 0.9
 
+
+# 限速预算是否跨进程共享（文件锁令牌桶，状态文件放在 RATE_LIMIT_STATE_DIR）
+RATE_LIMIT_SHARED = True
+RATE_LIMIT_STATE_DIR = OUTPUT_DIR / "_ratelimit"
+
+# 交易所 REST 响应缓存（内存 LRU + 磁盘），同一台机器上连续运行的脚本复用短时间内的相同请求
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_DIR = OUTPUT_DIR / "_cache"
+RESPONSE_CACHE_MEMORY_ENTRIES = 256
+
+# 交易对目录（合约列表、tick size 等）的本地缓存，过期后先用旧目录并在后台刷新
+SYMBOL_CATALOG_DIR = OUTPUT_DIR / "_catalog"
+SYMBOL_CATALOG_TTL = 6 * 3600
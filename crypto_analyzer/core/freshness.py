@@ -0,0 +1,107 @@
+"""
+按 K 线收盘时间判断数据是否需要刷新。
+
+每次写出某个 (exchange, symbol, interval) 的数据文件后，在同目录记录一份
+_freshness.json（拉取时间、输出文件、limit、格式）。下次运行时据此决定：
+
+- skip ：上次拉取之后还没有任何 K 线收盘，且距上次拉取不超过 max_stale 秒，
+          直接沿用上次的输出文件，不访问网络
+- patch：自上次拉取以来最多收盘了一根 K 线，只需补最后一两根
+          （增量拉取会自动只请求这部分）
+- full ：没有记录、参数变化或间隔了多根 K 线，按常规增量流程拉取
+
+K 线边界按交易所对齐（OKX 6H 及以上的非 utc 周期为 UTC+8），见 resample.bucket_start。
+"""
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import OUTPUT_DIR
+from .resample import bucket_start, interval_tz_offset, next_bucket_start
+from .storage import write_json_atomic
+
+FRESHNESS_FILENAME = "_freshness.json"
+
+
+def freshness_path(exchange: str, symbol: str, interval: str, root: Path = OUTPUT_DIR) -> Path:
+    return root / exchange.lower() / symbol.upper() / interval.replace("/", "-") / FRESHNESS_FILENAME
+
+
+def next_candle_close(exchange: str, interval: str, now_ms: Optional[int] = None) -> int:
+    """当前这根（尚未收盘的）K 线的收盘时刻（毫秒，即下一根的开盘时间）。"""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    offset = interval_tz_offset(exchange, interval)
+    return next_bucket_start(bucket_start(now_ms, interval, offset), interval, offset)
+
+
+class RefreshPlan:
+    """单个 (symbol, interval) 的刷新决策。"""
+
+    def __init__(
+        self, action: str, next_close_ms: int, output_path: Optional[Path] = None, reason: str = ""
+    ) -> None:
+        self.action = action
+        self.next_close_ms = next_close_ms
+        self.output_path = output_path
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"RefreshPlan({self.action!r}, next_close_ms={self.next_close_ms}, reason={self.reason!r})"
+
+
+def plan_refresh(
+    exchange: str,
+    symbol: str,
+    interval: str,
+    limit: int,
+    output_format: str = "json",
+    max_stale: float = 60.0,
+    now_ms: Optional[int] = None,
+) -> RefreshPlan:
+    """根据上次拉取记录与 K 线收盘时间给出 skip / patch / full。"""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    next_close = next_candle_close(exchange, interval, now_ms)
+    path = freshness_path(exchange, symbol, interval)
+    try:
+        record: Dict[str, Any] = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return RefreshPlan("full", next_close, reason="无拉取记录")
+
+    output_path = Path(record.get("output", ""))
+    if record.get("limit", 0) < limit or record.get("format") != output_format:
+        return RefreshPlan("full", next_close, reason="参数变化")
+    if not output_path.is_file():
+        return RefreshPlan("full", next_close, reason="输出文件不存在")
+
+    fetched_at = int(record.get("fetched_at", 0))
+    offset = interval_tz_offset(exchange, interval)
+    current_open = bucket_start(now_ms, interval, offset)
+    if fetched_at >= current_open:
+        if (now_ms - fetched_at) / 1000 <= max_stale:
+            return RefreshPlan("skip", next_close, output_path, "当前 K 线尚未收盘")
+        return RefreshPlan("patch", next_close, output_path, "刷新未收盘的最新 K 线")
+    if fetched_at >= bucket_start(current_open - 1, interval, offset):
+        return RefreshPlan("patch", next_close, output_path, "收盘了一根 K 线")
+    return RefreshPlan("full", next_close, output_path, "已错过多根 K 线")
+
+
+def record_fetch(
+    exchange: str,
+    symbol: str,
+    interval: str,
+    output_path: Path,
+    limit: int,
+    output_format: str = "json",
+    fetched_at: Optional[int] = None,
+) -> None:
+    """写出数据文件后记录本次拉取，供下次 plan_refresh 使用。"""
+    write_json_atomic(
+        {
+            "fetched_at": int(time.time() * 1000) if fetched_at is None else fetched_at,
+            "output": str(output_path),
+            "limit": limit,
+            "format": output_format,
+        },
+        freshness_path(exchange, symbol, interval),
+    )
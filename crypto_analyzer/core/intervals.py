@@ -0,0 +1,33 @@
+"""
+K 线周期解析工具。
+
+同时兼容 Binance（1m/1h/4h/1d/1w/1M）与 OKX（1m/1H/4H/1D/1W/1M 及 *utc 变体）的写法。
+注意分钟为小写 m，月为大写 M；小时/天/周不区分大小写。
+"""
+import re
+from typing import Optional
+
+MINUTE_MS = 60_000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+WEEK_MS = 7 * DAY_MS
+
+_INTERVAL_RE = re.compile(r"^(\d+)([smhHdDwWM])(utc)?$")
+_UNIT_MS = {
+    "s": 1_000,
+    "m": MINUTE_MS,
+    "h": HOUR_MS,
+    "d": DAY_MS,
+    "w": WEEK_MS,
+}
+
+
+def interval_to_ms(interval: str) -> Optional[int]:
+    """返回周期的毫秒长度；月线等非固定长度周期返回 None。"""
+    match = _INTERVAL_RE.match(interval.strip())
+    if not match:
+        raise ValueError(f"无法识别的K线周期：{interval}")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "M":
+        return None
+    return count * _UNIT_MS[unit.lower()]
@@ -0,0 +1,228 @@
+"""
+紧凑的列式 K 线容器。
+
+KlineFrame 以 array 列存储 K 线（时间列为 int64，其余数值列为 float64，
+缺失值用 NaN 表示），固定按 open_time 正序排列。切片/tail() 返回共享底层
+缓冲区的视图，不复制数据；只有在写 JSON 等边界处才通过 to_records()
+转换回旧的 list-of-dicts 格式（默认最新在前，与 fetcher 输出一致）。
+"""
+import math
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+NAN = float("nan")
+
+
+class KlineFrame:
+    """按时间正序排列的只读 K 线列存储，支持零拷贝视图。"""
+
+    __slots__ = ("_columns", "_order", "_start", "_stop", "constants")
+
+    def __init__(
+        self,
+        columns: Mapping[str, Sequence],
+        order: Optional[Sequence[str]] = None,
+        constants: Optional[Dict[str, Any]] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> None:
+        lengths = {len(col) for col in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"KlineFrame 各列长度不一致：{sorted(lengths)}")
+        total = lengths.pop() if lengths else 0
+        self._columns: Dict[str, Sequence] = dict(columns)
+        self.constants: Dict[str, Any] = dict(constants or {})
+        # 字段顺序（含常量字段），用于还原字典时保持原始键顺序
+        self._order: List[str] = list(order) if order is not None else [*columns, *self.constants]
+        self._start = start
+        self._stop = total if stop is None else stop
+
+    # ---------- 构建 ----------
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "KlineFrame":
+        """由 list-of-dicts 构建（输入可为正序或倒序，统一转为正序）。"""
+        if isinstance(records, KlineFrame):
+            return records
+        rows = list(records)
+        if len(rows) >= 2 and rows[0].get("open_time", 0) > rows[-1].get("open_time", 0):
+            rows.reverse()
+        if any(
+            rows[i].get("open_time", 0) > rows[i + 1].get("open_time", 0)
+            for i in range(len(rows) - 1)
+        ):
+            rows.sort(key=lambda r: r.get("open_time", 0))
+
+        order: List[str] = []
+        for row in rows:
+            for key in row:
+                if key not in order:
+                    order.append(key)
+
+        columns: Dict[str, Sequence] = {}
+        constants: Dict[str, Any] = {}
+        for key in order:
+            values = [row.get(key) for row in rows]
+            if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                columns[key] = array("q", values)
+            elif all(
+                v is None or (isinstance(v, (int, float)) and not isinstance(v, bool))
+                for v in values
+            ):
+                columns[key] = array("d", [NAN if v is None else v for v in values])
+            elif all(v == values[0] for v in values):
+                constants[key] = values[0]
+            else:
+                columns[key] = values
+        return cls(columns, order, constants)
+
+    @classmethod
+    def coerce(cls, klines: Union["KlineFrame", Iterable[Mapping[str, Any]]]) -> "KlineFrame":
+        """KlineFrame 原样返回，list-of-dicts 转换为 KlineFrame。"""
+        if isinstance(klines, KlineFrame):
+            return klines
+        return cls.from_records(klines or [])
+
+    def with_columns(self, columns: Mapping[str, Sequence]) -> "KlineFrame":
+        """返回追加（或替换）若干列后的新 frame，新列长度须与当前视图一致。"""
+        base = self.materialize()
+        merged = dict(base._columns)
+        order = list(base._order)
+        for name, values in columns.items():
+            if len(values) != len(base):
+                raise ValueError(f"列 {name} 长度 {len(values)} 与 frame 长度 {len(base)} 不一致")
+            merged[name] = values
+            if name not in order:
+                order.append(name)
+        return KlineFrame(merged, order, base.constants)
+
+    def with_indicators(self) -> "KlineFrame":
+        """调用列式指标引擎，返回附带全部指标列的新 frame。"""
+        from crypto_analyzer.analysis.indicators import compute_indicator_columns
+
+        if not len(self):
+            return self
+        closes = self.column("close").tolist()
+        computed = compute_indicator_columns(
+            open_times=self.column("open_time").tolist(),
+            highs=self.column("high").tolist() if "high" in self else closes,
+            lows=self.column("low").tolist() if "low" in self else closes,
+            closes=closes,
+            volumes=self.column("volume").tolist() if "volume" in self else [0.0] * len(self),
+        )
+        return self.with_columns(
+            {
+                name: array("d", [NAN if v is None else v for v in values])
+                for name, values in computed.items()
+            }
+        )
+
+    def materialize(self) -> "KlineFrame":
+        """视图转为独立的紧凑 frame（整表时直接返回自身）。"""
+        if self._start == 0 and self._stop == self._total():
+            return self
+        columns = {name: col[self._start : self._stop] for name, col in self._columns.items()}
+        return KlineFrame(columns, self._order, self.constants)
+
+    # ---------- 访问 ----------
+
+    def _total(self) -> int:
+        for col in self._columns.values():
+            return len(col)
+        return 0
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._columns
+
+    @property
+    def columns(self) -> List[str]:
+        return [name for name in self._order if name in self._columns]
+
+    @property
+    def field_order(self) -> List[str]:
+        """还原字典时的字段顺序（含常量字段）。"""
+        return list(self._order)
+
+    def column(self, name: str) -> Sequence:
+        """返回列的零拷贝视图（数值列为 memoryview）。"""
+        col = self._columns[name]
+        if isinstance(col, array):
+            return memoryview(col)[self._start : self._stop]
+        return col[self._start : self._stop]
+
+    def value(self, name: str, index: int = -1) -> Optional[Any]:
+        """读取单个值，列不存在或为 NaN 时返回 None。"""
+        col = self._columns.get(name)
+        if col is None:
+            return self.constants.get(name)
+        position = self._position(index)
+        value = col[position]
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    def _position(self, index: int) -> int:
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("KlineFrame 下标越界")
+        return self._start + index
+
+    def tail(self, n: int) -> "KlineFrame":
+        """最后 n 根 K 线的零拷贝视图。"""
+        n = max(0, min(n, len(self)))
+        return self._view(self._stop - n, self._stop)
+
+    def _view(self, start: int, stop: int) -> "KlineFrame":
+        frame = KlineFrame.__new__(KlineFrame)
+        frame._columns = self._columns
+        frame._order = self._order
+        frame.constants = self.constants
+        frame._start = start
+        frame._stop = stop
+        return frame
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Dict[str, Any], "KlineFrame"]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("KlineFrame 仅支持步长为 1 的切片")
+            stop = max(start, stop)
+            return self._view(self._start + start, self._start + stop)
+        return self._row(self._position(key))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for position in range(self._start, self._stop):
+            yield self._row(position)
+
+    def _row(self, position: int) -> Dict[str, Any]:
+        row: Dict[str, Any] = {}
+        columns = self._columns
+        for name in self._order:
+            col = columns.get(name)
+            if col is None:
+                row[name] = self.constants[name]
+                continue
+            value = col[position]
+            if value != value:  # NaN 表示该行缺少此字段
+                continue
+            row[name] = value
+        return row
+
+    def last(self) -> Dict[str, Any]:
+        if not len(self):
+            raise ValueError("No kline data found in JSON")
+        return self._row(self._stop - 1)
+
+    # ---------- 边界转换 ----------
+
+    def to_records(self, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """转换回 list-of-dicts（默认最新在前，与 fetcher/JSON 文件格式一致）。"""
+        records = list(self)
+        if newest_first:
+            records.reverse()
+        return records
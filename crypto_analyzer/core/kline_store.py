@@ -0,0 +1,203 @@
+"""
+本地 K 线仓库（append-only）。
+
+每个 (exchange, symbol, interval) 对应一个 NDJSON 文件：
+data/{exchange}/{symbol}/{interval}/_store.ndjson
+
+- 每行一根原始 K 线（不含指标），按 open_time 严格递增
+- 新 K 线直接追加；与最后一行 open_time 相同的 K 线（仍在形成中）会覆盖最后一行
+- 只有写入早于最后一行的历史 K 线时才整体重写（去重 + 排序）
+
+拉取时先读取仓库尾部，只向交易所请求高水位之后的 K 线（见 delta_fetch_limit）。
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import OUTPUT_DIR
+from .intervals import interval_to_ms
+from .storage import file_lock
+
+STORE_FILENAME = "_store.ndjson"
+_READ_CHUNK = 64 * 1024
+
+
+class KlineStore:
+    """单个 (exchange, symbol, interval) 的 append-only K 线仓库。"""
+
+    def __init__(self, exchange: str, symbol: str, interval: str, root: Path = OUTPUT_DIR) -> None:
+        folder = root / exchange.lower() / symbol.upper() / interval.replace("/", "-")
+        self.interval = interval
+        self.path = folder / STORE_FILENAME
+        self.lock_path = folder / "_store.lock"
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        """读取最后 n 根 K 线（正序），只读取文件尾部。"""
+        if n <= 0 or not self.path.exists():
+            return []
+        _, lines = _tail_lines(self.path, n)
+        return [json.loads(line) for line in lines]
+
+    def last_open_time(self) -> Optional[int]:
+        last = self.tail(1)
+        return int(last[0]["open_time"]) if last else None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """读取全部 K 线（正序）。"""
+        if not self.path.exists():
+            return []
+        records = []
+        with self.path.open("rb") as fp:
+            for line in fp:
+                if line.endswith(b"\n"):
+                    records.append(json.loads(line))
+        return records
+
+    def merge(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        合并一批 K 线（任意顺序），返回新增的 K 线数量。
+
+        新数据都不早于最后一行时走追加路径；否则整体重写。
+        """
+        incoming: Dict[int, Dict[str, Any]] = {}
+        for record in records:
+            incoming[int(record["open_time"])] = record
+        if not incoming:
+            return 0
+        ordered = [incoming[t] for t in sorted(incoming)]
+
+        with file_lock(self.lock_path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            offset, last_lines = _tail_lines(self.path, 1) if self.path.exists() else (0, [])
+            last_time = int(json.loads(last_lines[0])["open_time"]) if last_lines else None
+
+            if last_time is None or int(ordered[0]["open_time"]) >= last_time:
+                if last_time is not None and int(ordered[0]["open_time"]) > last_time:
+                    # 跳过最后一行，只截掉可能存在的半行残留
+                    offset += len(last_lines[0]) + 1
+                added = sum(1 for t in incoming if last_time is None or t > last_time)
+                with self.path.open("r+b" if self.path.exists() else "wb") as fp:
+                    fp.truncate(offset)
+                    fp.seek(offset)
+                    fp.write(_encode_lines(ordered))
+                return added
+
+            existing = {int(r["open_time"]): r for r in self.load()}
+            added = sum(1 for t in incoming if t not in existing)
+            existing.update(incoming)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_bytes(_encode_lines(existing[t] for t in sorted(existing)))
+            os.replace(tmp_path, self.path)
+            return added
+
+
+def delta_fetch_limit(
+    cached: List[Dict[str, Any]], interval: str, limit: int, now_ms: Optional[int] = None
+) -> int:
+    """
+    根据仓库尾部计算本次需要向交易所请求的 K 线数量。
+
+    cached 为仓库最后 limit 根 K 线（正序）。仓库不足 limit 根、尾部有缺口或周期长度不固定（月线）时
+    返回完整的 limit；否则只请求从最后一根（可能未收盘，需要覆盖）到当前时间的 K 线，
+    并多取 1 根容忍时钟偏差。
+
+    停止拉取的时间超过 limit 根时，本次只能补上最近 limit 根，仓库中会留下缺口；
+    之后的尾部一旦跨过缺口就不再连续，会按完整的 limit 重新拉取。limit 超过单次请求上限时
+    这样仍补不到缺口，调用方需要按时间范围补齐（见 missing_ranges）。
+    """
+    interval_ms = interval_to_ms(interval)
+    if len(cached) < limit or not interval_ms:
+        return limit
+    if not is_contiguous(cached, interval_ms):
+        return limit
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    last_open = int(cached[-1]["open_time"])
+    pending = max(0, now_ms - last_open) // interval_ms + 1
+    return max(1, min(limit, pending + 1))
+
+
+def is_contiguous(records: List[Dict[str, Any]], interval_ms: int) -> bool:
+    """正序 K 线之间没有缺口（open_time 严格按 interval_ms 递增）。"""
+    if len(records) < 2:
+        return True
+    span = int(records[-1]["open_time"]) - int(records[0]["open_time"])
+    return span == (len(records) - 1) * interval_ms
+
+
+def missing_ranges(
+    records: List[Dict[str, Any]], interval_ms: int, limit: int
+) -> List[Tuple[int, int]]:
+    """
+    最近 limit 个周期（以最后一根为终点）内、第一根之后缺失的 K 线，
+    合并为 [(起始 open_time, 结束 open_time)]。records 为正序 K 线；
+    第一根之前的历史不算缺口（由 --start 回填）。
+    """
+    if not records:
+        return []
+    newest = int(records[-1]["open_time"])
+    start = max(newest - (limit - 1) * interval_ms, int(records[0]["open_time"]))
+    present = {int(r["open_time"]) for r in records if int(r["open_time"]) >= start}
+    ranges: List[Tuple[int, int]] = []
+    for open_time in range(start, newest + 1, interval_ms):
+        if open_time in present:
+            continue
+        if ranges and ranges[-1][1] == open_time - interval_ms:
+            ranges[-1] = (ranges[-1][0], open_time)
+        else:
+            ranges.append((open_time, open_time))
+    return ranges
+
+
+def contiguous_suffix(records: List[Dict[str, Any]], interval_ms: int) -> List[Dict[str, Any]]:
+    """正序 K 线中最后一个缺口之后的连续部分。"""
+    for i in range(len(records) - 1, 0, -1):
+        if int(records[i]["open_time"]) - int(records[i - 1]["open_time"]) != interval_ms:
+            return records[i:]
+    return records
+
+
+def merge_klines(
+    cached: List[Dict[str, Any]], fresh: Iterable[Dict[str, Any]], limit: int
+) -> List[Dict[str, Any]]:
+    """内存中合并仓库尾部与新拉取的 K 线（新数据覆盖旧数据），返回最近 limit 根（正序）。"""
+    by_time = {int(r["open_time"]): r for r in cached}
+    for record in fresh:
+        by_time[int(record["open_time"])] = record
+    return [by_time[t] for t in sorted(by_time)[-limit:]]
+
+
+def _encode_lines(records: Iterable[Dict[str, Any]]) -> bytes:
+    return b"".join(
+        json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        for r in records
+    )
+
+
+def _tail_lines(path: Path, n: int) -> Tuple[int, List[bytes]]:
+    """
+    返回文件最后 n 个完整行及其中第一行的起始偏移。
+
+    末尾不以换行结束的半行（写入中断残留）会被忽略，偏移量指向它的起点，
+    追加写入时从该偏移截断即可修复。
+    """
+    with path.open("rb") as fp:
+        fp.seek(0, os.SEEK_END)
+        end = fp.tell()
+        pos = end
+        buf = b""
+        while pos > 0 and buf.count(b"\n") <= n:
+            step = min(_READ_CHUNK, pos)
+            pos -= step
+            fp.seek(pos)
+            buf = fp.read(step) + buf
+
+    complete_end = buf.rfind(b"\n") + 1
+    lines = buf[:complete_end].split(b"\n")[:-1]
+    if pos > 0:
+        lines = lines[1:]  # 第一段可能是被截断的行
+    lines = lines[-n:] if lines else []
+    offset = pos + complete_end - sum(len(line) + 1 for line in lines)
+    return offset, lines
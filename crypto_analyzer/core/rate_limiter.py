@@ -1,11 +1,40 @@
+"""
+API 请求频率限制。
+
+- AsyncConcurrencyLimiter：并发上限 + 最小请求间隔（fetcher 中 `async with` 使用）
+- TokenBucket / WeightedRateLimiter：按交易所权重预算限速。
+  Binance 按接口与参数计算请求权重（如 limit=1500 的 K 线为 10），并根据响应头
+  X-MBX-USED-WEIGHT-1M 与服务端对齐；OKX 按接口分别限速（如 K 线 40 次/2 秒）。
+  收到 429/418 时按 Retry-After 暂停。通过 httpx 的 event_hooks 挂到客户端上，
+  所有经由该客户端的请求都会被计入，见 rate_limit_event_hooks()。
+- SharedTokenBucket：令牌桶状态存放在数据目录下、由文件锁保护，
+  同一台机器上并行运行的多个脚本进程共享同一份交易所预算（交易所按 IP 计数）。
+  文件锁与状态读写在线程中执行（asyncio.to_thread），不阻塞事件循环上的其他请求。
+
+预约与等待分离：计算需要等待的时间时不 await，等待本身不持有任何锁，
+并发请求各自排队，不会互相阻塞。
+"""
 import asyncio
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+from urllib.parse import urlparse
 
 from crypto_analyzer.core.config import (
+    BINANCE_BASE_URL,
     BINANCE_MAX_CONCURRENT_REQUESTS,
+    BINANCE_REQUEST_WEIGHT_PER_MINUTE,
+    OKX_BASE_URL,
     OKX_MAX_CONCURRENT_REQUESTS,
     BINANCE_MIN_REQUEST_INTERVAL,
     OKX_MIN_REQUEST_INTERVAL,
+    RATE_LIMIT_SAFETY_RATIO,
+    RATE_LIMIT_SHARED,
+    RATE_LIMIT_STATE_DIR,
 )
+from crypto_analyzer.core.storage import file_lock
 
 
 class AsyncConcurrencyLimiter:
@@ -16,23 +45,23 @@ class AsyncConcurrencyLimiter:
             raise ValueError("min_interval must be >= 0")
         self._sem = asyncio.Semaphore(max_concurrent)
         self._min_interval = min_interval
-        self._lock = asyncio.Lock()
-        self._last_acquire = 0.0
+        self._next_slot = 0.0
 
     async def __aenter__(self):
         await self._sem.acquire()
         if self._min_interval <= 0:
             return self
 
-        async with self._lock:
-            loop = asyncio.get_event_loop()
-            now = loop.time()
-            elapsed = now - self._last_acquire
-            wait_for = self._min_interval - elapsed
-            if wait_for > 0:
-                await asyncio.sleep(wait_for)
-                now = loop.time()
-            self._last_acquire = now
+        # 先预约发送时刻再睡眠，等待期间不阻塞其他请求的预约
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._min_interval
+        if slot > now:
+            try:
+                await asyncio.sleep(slot - now)
+            except BaseException:
+                self._sem.release()
+                raise
 
         return self
 
@@ -41,6 +70,247 @@ class AsyncConcurrencyLimiter:
         return False
 
 
+class TokenBucket:
+    """容量为 capacity、每 window 秒匀速回满的令牌桶，余额可为负（表示已预约的等待）。"""
+
+    def __init__(self, capacity: float, window: float) -> None:
+        if capacity <= 0 or window <= 0:
+            raise ValueError("capacity and window must be > 0")
+        self.capacity = float(capacity)
+        self.window = float(window)
+        self.rate = self.capacity / self.window
+        self.tokens = self.capacity
+        self.updated = self._clock()
+
+    def _clock(self) -> float:
+        return time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost: float, now: Optional[float] = None) -> float:
+        """扣除 cost 个令牌，返回需要等待的秒数（余额足够时为 0）。"""
+        now = self._clock() if now is None else now
+        self._refill(now)
+        self.tokens -= cost
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def sync(self, remaining: float, pause: float = 0.0, now: Optional[float] = None) -> None:
+        """
+        按服务端反馈收紧余额：余额不高于 remaining；
+        pause > 0 时（额度耗尽/429）保证至少 pause 秒后才有可用令牌。
+        """
+        now = self._clock() if now is None else now
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+        if pause > 0:
+            self.tokens = min(self.tokens, -pause * self.rate)
+
+    def headroom(self, now: Optional[float] = None) -> float:
+        """当前可立即使用的令牌数。"""
+        self._refill(self._clock() if now is None else now)
+        return max(0.0, self.tokens)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    跨进程共享的令牌桶：余额与更新时间保存在 JSON 文件中，每次操作在文件锁内
+    读-改-写。时间使用墙上时钟，各进程可以直接比较。
+    """
+
+    def __init__(self, path: Path, capacity: float, window: float) -> None:
+        self.path = Path(path)
+        self.lock_path = self.path.with_suffix(".lock")
+        super().__init__(capacity, window)
+
+    def _clock(self) -> float:
+        return time.time()
+
+    @contextmanager
+    def _shared(self) -> Iterator[None]:
+        with file_lock(self.lock_path):
+            try:
+                state = json.loads(self.path.read_text(encoding="utf-8"))
+                self.tokens = min(self.capacity, float(state["tokens"]))
+                self.updated = float(state["updated"])
+            except (OSError, ValueError, KeyError, TypeError):
+                # 首次使用或文件损坏：按满额度重新开始
+                self.tokens = self.capacity
+                self.updated = self._clock()
+            yield
+            self.path.write_text(
+                json.dumps({"tokens": self.tokens, "updated": self.updated}), encoding="utf-8"
+            )
+
+    def reserve(self, cost: float, now: Optional[float] = None) -> float:
+        with self._shared():
+            return super().reserve(cost, now)
+
+    def sync(self, remaining: float, pause: float = 0.0, now: Optional[float] = None) -> None:
+        with self._shared():
+            super().sync(remaining, pause, now)
+
+    def headroom(self, now: Optional[float] = None) -> float:
+        with self._shared():
+            return super().headroom(now)
+
+
+class WeightedRateLimiter:
+    """
+    单个交易所的权重限速器。
+
+    - 全局桶：交易所的总权重预算（OKX 不设全局预算时为 None）
+    - 接口桶：按 path 单独限速的接口（capacity 次 / window 秒）
+    weigh(path, params) 给出一次请求消耗的全局权重。
+    指定 state_dir 时各个桶使用 SharedTokenBucket，与其他进程共享预算。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        weigh: Callable[[str, Mapping[str, Any]], float],
+        capacity: Optional[float] = None,
+        window: float = 60.0,
+        endpoint_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        default_endpoint_limit: Optional[Tuple[float, float]] = None,
+        used_weight_header: Optional[str] = None,
+        safety_ratio: float = RATE_LIMIT_SAFETY_RATIO,
+        state_dir: Optional[Path] = None,
+    ) -> None:
+        self.name = name
+        self.weigh = weigh
+        self.safety_ratio = safety_ratio
+        self.state_dir = state_dir
+        self.bucket = self._make_bucket("weight", capacity, window) if capacity else None
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.default_endpoint_limit = default_endpoint_limit
+        self.used_weight_header = used_weight_header
+        self.used_weight: Optional[int] = None
+        self._endpoint_buckets: Dict[str, TokenBucket] = {}
+        self.waited = 0.0
+
+    def _endpoint_bucket(self, path: str) -> Optional[TokenBucket]:
+        bucket = self._endpoint_buckets.get(path)
+        if bucket is None:
+            limit = self.endpoint_limits.get(path, self.default_endpoint_limit)
+            if limit is None:
+                return None
+            capacity, window = limit
+            bucket = self._make_bucket(path.strip("/").replace("/", "_"), capacity, window)
+            self._endpoint_buckets[path] = bucket
+        return bucket
+
+    def _make_bucket(self, key: str, capacity: float, window: float) -> TokenBucket:
+        if self.state_dir is None:
+            return TokenBucket(capacity * self.safety_ratio, window)
+        path = self.state_dir / f"{self.name}_{key}.json"
+        return SharedTokenBucket(path, capacity * self.safety_ratio, window)
+
+    @property
+    def shared(self) -> bool:
+        """各个桶是否为跨进程共享（每次操作都要加文件锁并读写状态文件）。"""
+        return self.state_dir is not None
+
+    def _reserve(self, weight: float, endpoint: Optional[TokenBucket]) -> float:
+        wait = 0.0
+        if self.bucket is not None:
+            wait = self.bucket.reserve(weight)
+        if endpoint is not None:
+            wait = max(wait, endpoint.reserve(1))
+        return wait
+
+    async def acquire(self, path: str, params: Optional[Mapping[str, Any]] = None) -> float:
+        """为一次请求预约额度并等待到可发送，返回实际等待秒数。"""
+        weight = self.weigh(path, params or {})
+        endpoint = self._endpoint_bucket(path)
+        if self.shared:
+            wait = await asyncio.to_thread(self._reserve, weight, endpoint)
+        else:
+            wait = self._reserve(weight, endpoint)
+        if wait > 0:
+            self.waited += wait
+            await asyncio.sleep(wait)
+        return wait
+
+    def observe(self, path: str, status_code: int, headers: Mapping[str, str]) -> None:
+        """根据响应状态码与用量响应头校准预算。"""
+        if self.bucket is not None and self.used_weight_header:
+            used = headers.get(self.used_weight_header)
+            if used is not None and used.isdigit():
+                self.used_weight = int(used)
+                remaining = self.bucket.capacity - self.used_weight
+                # 服务端按自然分钟窗口计数，额度耗尽时要等到窗口结束
+                pause = 60.0 - time.time() % 60.0 if remaining <= 0 else 0.0
+                self.bucket.sync(remaining, pause)
+
+        if status_code in (418, 429):
+            retry_after = headers.get("Retry-After")
+            pause = float(retry_after) if retry_after and retry_after.isdigit() else None
+            if self.bucket is not None:
+                self.bucket.sync(0.0, pause or self.bucket.window)
+            endpoint = self._endpoint_bucket(path)
+            if endpoint is not None:
+                endpoint.sync(0.0, pause or endpoint.window)
+
+    def headroom(self) -> Dict[str, Any]:
+        """剩余额度：全局权重与各接口的可用次数。"""
+        return {
+            "exchange": self.name,
+            "weight": round(self.bucket.headroom(), 2) if self.bucket is not None else None,
+            "used_weight_1m": self.used_weight,
+            "shared": self.shared,
+            "endpoints": {
+                path: round(bucket.headroom(), 2)
+                for path, bucket in sorted(self._endpoint_buckets.items())
+            },
+            "waited_seconds": round(self.waited, 3),
+        }
+
+
+def binance_request_weight(path: str, params: Mapping[str, Any]) -> int:
+    """Binance U 本位合约公共接口的请求权重（与官方文档一致）。"""
+    has_symbol = bool(params.get("symbol"))
+    if path.endswith("klines"):
+        limit = int(params.get("limit", 500))
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+    if path == "/fapi/v1/depth":
+        limit = int(params.get("limit", 500))
+        if limit <= 50:
+            return 2
+        if limit <= 100:
+            return 5
+        if limit <= 500:
+            return 10
+        return 20
+    if path == "/fapi/v1/ticker/24hr":
+        return 1 if has_symbol else 40
+    if path in ("/fapi/v1/ticker/price", "/fapi/v1/ticker/bookTicker"):
+        return 1 if has_symbol else 2
+    if path == "/fapi/v1/premiumIndex":
+        return 1 if has_symbol else 10
+    return 1
+
+
+# OKX 各公共接口的限速（次数, 秒），未列出的接口按 20 次/2 秒
+OKX_ENDPOINT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "/api/v5/market/candles": (40, 2),
+    "/api/v5/market/history-candles": (20, 2),
+    "/api/v5/market/books": (40, 2),
+    "/api/v5/market/ticker": (20, 2),
+    "/api/v5/market/tickers": (20, 2),
+    "/api/v5/public/funding-rate": (20, 2),
+    "/api/v5/public/open-interest": (20, 2),
+    "/api/v5/public/instruments": (20, 2),
+}
+
+
 binance_public_limiter = AsyncConcurrencyLimiter(
     BINANCE_MAX_CONCURRENT_REQUESTS,
     BINANCE_MIN_REQUEST_INTERVAL,
@@ -49,3 +319,73 @@ okx_public_limiter = AsyncConcurrencyLimiter(
     OKX_MAX_CONCURRENT_REQUESTS,
     OKX_MIN_REQUEST_INTERVAL,
 )
+
+# 交易所按 IP 限速，默认让本机所有进程共享同一份预算
+_STATE_DIR = RATE_LIMIT_STATE_DIR if RATE_LIMIT_SHARED else None
+
+binance_weight_limiter = WeightedRateLimiter(
+    "binance",
+    weigh=binance_request_weight,
+    capacity=BINANCE_REQUEST_WEIGHT_PER_MINUTE,
+    window=60.0,
+    used_weight_header="X-MBX-USED-WEIGHT-1M",
+    state_dir=_STATE_DIR,
+)
+okx_weight_limiter = WeightedRateLimiter(
+    "okx",
+    weigh=lambda path, params: 1,
+    endpoint_limits=OKX_ENDPOINT_LIMITS,
+    default_endpoint_limit=(20, 2),
+    state_dir=_STATE_DIR,
+)
+
+_LIMITERS_BY_HOST = {
+    urlparse(BINANCE_BASE_URL).hostname: binance_weight_limiter,
+    urlparse(OKX_BASE_URL).hostname: okx_weight_limiter,
+}
+
+
+def limiter_for_host(host: str) -> Optional[WeightedRateLimiter]:
+    return _LIMITERS_BY_HOST.get(host)
+
+
+# 命中响应缓存的请求由 response_cache 在 request.extensions 中打上该标记，
+# 不会发往交易所，因此既不预约额度，也不用（缓存中的）响应头校准
+CACHE_HIT_EXTENSION = "response_cache_hit"
+
+
+async def _on_request(request) -> None:
+    if request.extensions.get(CACHE_HIT_EXTENSION):
+        return
+    limiter = limiter_for_host(request.url.host)
+    if limiter is not None:
+        await limiter.acquire(request.url.path, dict(request.url.params))
+
+
+async def _on_response(response) -> None:
+    if response.request.extensions.get(CACHE_HIT_EXTENSION):
+        return
+    limiter = limiter_for_host(response.request.url.host)
+    if limiter is None:
+        return
+    args = (response.request.url.path, response.status_code, response.headers)
+    if limiter.shared:
+        await asyncio.to_thread(limiter.observe, *args)
+    else:
+        limiter.observe(*args)
+
+
+def rate_limit_event_hooks() -> Dict[str, list]:
+    """
+    供 httpx.AsyncClient(event_hooks=...) 使用的钩子：
+    请求发出前按权重预约额度，收到响应后用响应头校准。
+    """
+    return {"request": [_on_request], "response": [_on_response]}
+
+
+def rate_limit_headroom() -> Dict[str, Dict[str, Any]]:
+    """各交易所当前的剩余额度。"""
+    return {
+        limiter.name: limiter.headroom()
+        for limiter in (binance_weight_limiter, okx_weight_limiter)
+    }
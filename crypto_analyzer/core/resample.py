@@ -0,0 +1,139 @@
+"""
+K 线重采样：由细粒度 K 线（如 1m/5m/15m）聚合出任意更粗的周期。
+
+- open_time 对齐到交易所的周期边界：分钟/小时/日按 UTC 对齐，周线从周一 00:00 开始，
+  月线按自然月；OKX 的非 utc 周期（6H 及以上）按香港时间（UTC+8）对齐，见 interval_tz_offset
+- open 取首根、close 取末根、high/low 取极值，volume/quote_volume/成交笔数等求和
+- 每个桶的基础 K 线根数与应有根数（目标周期 / 基础周期）比较：缺根的桶
+  （基础序列从周期中途开始、上线首日、仓库缺口）会被丢弃，并只保留最后一个
+  缺根桶之后的连续部分，不会把残缺的 OHLCV 当作完整 K 线输出；
+  最后一个桶只要求到最新一根为止连续，与交易所返回的“尚未收盘”的最新 K 线一致
+
+重采样结果只含原始行情字段，指标需重新计算（KlineFrame.with_indicators）。
+"""
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+from .intervals import DAY_MS, HOUR_MS, interval_to_ms
+from .kline_frame import KlineFrame
+
+# Unix 纪元是周四，时间加 3 天后按整周取模即对齐到周一 00:00
+_WEEK_OFFSET_MS = 3 * DAY_MS
+
+SUM_FIELDS = (
+    "volume",
+    "quote_volume",
+    "trades",
+    "taker_buy_volume",
+    "taker_buy_quote_volume",
+)
+
+
+def interval_tz_offset(exchange: str, interval: str) -> int:
+    """周期边界相对 UTC 的偏移（毫秒）。OKX 6H 及以上的非 utc 周期按 UTC+8 对齐。"""
+    if exchange != "okx" or interval.endswith("utc"):
+        return 0
+    interval_ms = interval_to_ms(interval)
+    if interval_ms is None or interval_ms >= 6 * HOUR_MS:
+        return 8 * HOUR_MS
+    return 0
+
+
+def bucket_start(open_time: int, interval: str, tz_offset_ms: int = 0) -> int:
+    """open_time 所在的目标周期的起始时间。"""
+    interval_ms = interval_to_ms(interval)
+    if interval_ms is None:
+        # 月线：按（偏移后的）自然月对齐
+        local = datetime.fromtimestamp((open_time + tz_offset_ms) / 1000, tz=timezone.utc)
+        first = local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return int(first.timestamp() * 1000) - tz_offset_ms
+    offset = tz_offset_ms + (_WEEK_OFFSET_MS if interval_ms % (7 * DAY_MS) == 0 else 0)
+    return open_time - (open_time + offset) % interval_ms
+
+
+def next_bucket_start(start: int, interval: str, tz_offset_ms: int) -> int:
+    interval_ms = interval_to_ms(interval)
+    if interval_ms is not None:
+        return start + interval_ms
+    local = datetime.fromtimestamp((start + tz_offset_ms) / 1000, tz=timezone.utc)
+    following = (local + timedelta(days=32)).replace(day=1)
+    return int(following.timestamp() * 1000) - tz_offset_ms
+
+
+def resample_frame(
+    frame: KlineFrame, base_interval: str, interval: str, tz_offset_ms: int = 0
+) -> KlineFrame:
+    """把 base_interval 的 KlineFrame 聚合为 interval 周期（base 须整除目标周期）。"""
+    base_ms = interval_to_ms(base_interval)
+    target_ms = interval_to_ms(interval)
+    if base_ms is None:
+        raise ValueError(f"基础周期必须是固定长度：{base_interval}")
+    if target_ms is not None and (target_ms < base_ms or target_ms % base_ms):
+        raise ValueError(f"无法由 {base_interval} 聚合出 {interval}")
+    if target_ms == base_ms or not len(frame):
+        return frame
+
+    open_times = frame.column("open_time").tolist()
+    keys = [bucket_start(t, interval, tz_offset_ms) for t in open_times]
+    bounds: List[int] = [i for i in range(len(keys)) if i == 0 or keys[i] != keys[i - 1]]
+    ends = bounds[1:] + [len(keys)]
+    # 从最后一个缺根的桶之后开始输出
+    first = 0
+    for position, (s, e) in enumerate(zip(bounds, ends)):
+        start = keys[s]
+        if e == len(keys):
+            expected = (open_times[-1] - start) // base_ms + 1
+        else:
+            expected = (next_bucket_start(start, interval, tz_offset_ms) - start) // base_ms
+        if e - s != expected:
+            first = position + 1
+    bounds, ends = bounds[first:], ends[first:]
+    if not bounds:
+        return frame[0:0]
+
+    starts_ms = [keys[i] for i in bounds]
+    columns: Dict[str, Sequence] = {"open_time": array("q", starts_ms)}
+    opens = frame.column("open").tolist() if "open" in frame else None
+    highs = frame.column("high").tolist() if "high" in frame else None
+    lows = frame.column("low").tolist() if "low" in frame else None
+    closes = frame.column("close").tolist()
+    if opens is not None:
+        columns["open"] = array("d", [opens[i] for i in bounds])
+    if highs is not None:
+        columns["high"] = array("d", [max(highs[s:e]) for s, e in zip(bounds, ends)])
+    if lows is not None:
+        columns["low"] = array("d", [min(lows[s:e]) for s, e in zip(bounds, ends)])
+    columns["close"] = array("d", [closes[e - 1] for e in ends])
+    for name in SUM_FIELDS:
+        if name not in frame:
+            continue
+        values = frame.column(name).tolist()
+        typecode = "q" if isinstance(values[0], int) else "d"
+        columns[name] = array(typecode, [sum(values[s:e]) for s, e in zip(bounds, ends)])
+    if "close_time" in frame:
+        columns["close_time"] = array(
+            "q", [next_bucket_start(start, interval, tz_offset_ms) - 1 for start in starts_ms]
+        )
+
+    # 保持原始字段顺序，丢弃无法聚合的列（指标等）
+    order = [name for name in frame.field_order if name in columns or name in frame.constants]
+    return KlineFrame(columns, order, frame.constants)
+
+
+def resample_records(
+    records: Sequence[Dict], base_interval: str, interval: str, tz_offset_ms: int = 0
+) -> List[Dict]:
+    """list-of-dicts 版本，返回按时间正序的记录。"""
+    frame = resample_frame(KlineFrame.coerce(records), base_interval, interval, tz_offset_ms)
+    return frame.to_records(newest_first=False)
+
+
+def base_bars_needed(base_interval: str, interval: str, limit: int) -> Optional[int]:
+    """得到 limit 根目标周期 K 线所需的基础 K 线数量（月线按 31 天估算）。"""
+    base_ms = interval_to_ms(base_interval)
+    target_ms = interval_to_ms(interval) or 31 * DAY_MS
+    if not base_ms:
+        return None
+    # 多取一个桶，用于丢弃开头不完整的部分
+    return (limit + 1) * (target_ms // base_ms)
@@ -0,0 +1,287 @@
+"""
+交易所 REST 响应缓存：进程内 LRU + 磁盘，按接口类别设置有效期。
+
+一次对话中 AI 会在几秒内多次运行脚本，反复请求同一份 ticker、订单簿或合约列表。
+GET 响应按（主机、路径、排序后的参数）缓存：
+
+- order_book：订单簿，2 秒，过期后不再使用
+- ticker：24h 行情 / 最新价格 / 资金费率 / 持仓量，30 秒，过期 30 秒内先返回旧值
+- symbols：合约列表，1 小时，过期 1 天内先返回旧值
+
+过期但仍在宽限期内的响应会立即返回，同时在后台重新请求并更新缓存
+（stale-while-revalidate）。K 线不经过这里，由 KlineStore 与 freshness 负责。
+
+磁盘缓存放在 data/_cache/，多个进程共享；命中、未命中等计数见 ResponseCache.stats()。
+CachedTransport 的缓存读写在线程中执行（asyncio.to_thread），磁盘 I/O 不阻塞事件循环。
+通过 httpx 使用时，缓存命中的请求不计入限速额度，见 cached_client_options()。
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+import httpx
+
+from crypto_analyzer.core.config import (
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MEMORY_ENTRIES,
+)
+from crypto_analyzer.core.rate_limiter import (
+    CACHE_HIT_EXTENSION,
+    limiter_for_host,
+    rate_limit_event_hooks,
+)
+from crypto_analyzer.core.storage import write_json_atomic
+
+# 类别 -> (有效期秒数, 过期后仍可先返回旧值的秒数)
+CACHE_POLICIES: Dict[str, Tuple[float, float]] = {
+    "order_book": (2.0, 0.0),
+    "ticker": (30.0, 30.0),
+    "symbols": (3600.0, 86400.0),
+}
+
+ENDPOINT_CLASSES: Dict[str, str] = {
+    "/fapi/v1/depth": "order_book",
+    "/fapi/v1/ticker/bookTicker": "order_book",
+    "/api/v5/market/books": "order_book",
+    "/fapi/v1/ticker/24hr": "ticker",
+    "/fapi/v1/ticker/price": "ticker",
+    "/fapi/v1/premiumIndex": "ticker",
+    "/fapi/v1/openInterest": "ticker",
+    "/api/v5/market/ticker": "ticker",
+    "/api/v5/market/tickers": "ticker",
+    "/api/v5/public/funding-rate": "ticker",
+    "/api/v5/public/open-interest": "ticker",
+    "/fapi/v1/exchangeInfo": "symbols",
+    "/api/v5/public/instruments": "symbols",
+}
+
+Entry = Dict[str, Any]
+
+
+def cache_policy(path: str) -> Optional[Tuple[float, float]]:
+    """路径对应的 (有效期, 宽限期)；不缓存的接口返回 None。"""
+    endpoint_class = ENDPOINT_CLASSES.get(path)
+    return CACHE_POLICIES[endpoint_class] if endpoint_class else None
+
+
+def cache_key(host: str, path: str, params: Iterable[Tuple[str, Any]]) -> str:
+    return f"GET {host}{path}?{urlencode(sorted((str(k), str(v)) for k, v in params))}"
+
+
+class ResponseCache:
+    """两级响应缓存。内存层按 LRU 淘汰，磁盘层每个请求一个 JSON 文件。"""
+
+    def __init__(
+        self, root: Path = RESPONSE_CACHE_DIR, memory_entries: int = RESPONSE_CACHE_MEMORY_ENTRIES
+    ) -> None:
+        self.root = root
+        self.memory_entries = memory_entries
+        self.counts: Counter = Counter()
+        self._memory: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._revalidating: Set[str] = set()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.root / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(
+        self, key: str, ttl: float, stale: float = 0.0, now: Optional[float] = None
+    ) -> Tuple[Optional[Entry], str]:
+        """返回 (条目, 状态)，状态为 fresh / stale / miss。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        layer = "memory"
+        if entry is None:
+            layer = "disk"
+            try:
+                entry = json.loads(self._disk_path(key).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                entry = None
+            if entry is not None and entry.get("key") == key:
+                self._remember(key, entry)
+            else:
+                entry = None
+
+        age = now - entry["stored_at"] if entry is not None else None
+        with self._lock:  # get/put 可能在多个线程中执行
+            if age is not None and age <= ttl:
+                self.counts["hits"] += 1
+                self.counts[f"{layer}_hits"] += 1
+                return entry, "fresh"
+            if age is not None and age <= ttl + stale:
+                self.counts["stale_hits"] += 1
+                return entry, "stale"
+            self.counts["misses"] += 1
+        return None, "miss"
+
+    def put(self, key: str, body: str, content_type: str = "application/json") -> Entry:
+        entry = {"key": key, "stored_at": time.time(), "content_type": content_type, "body": body}
+        self._remember(key, entry)
+        try:
+            write_json_atomic(entry, self._disk_path(key))
+        except OSError:
+            pass  # 磁盘缓存只是加速手段，写失败不影响本次结果
+        return entry
+
+    def begin_revalidate(self, key: str) -> bool:
+        """同一个 key 同时只允许一个后台刷新。"""
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            return True
+
+    def end_revalidate(self, key: str, ok: bool) -> None:
+        with self._lock:
+            self._revalidating.discard(key)
+            self.counts["revalidated" if ok else "revalidate_errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counts["hits"] + self.counts["stale_hits"]
+        lookups = hits + self.counts["misses"]
+        return {
+            "hits": self.counts["hits"],
+            "memory_hits": self.counts["memory_hits"],
+            "disk_hits": self.counts["disk_hits"],
+            "stale_hits": self.counts["stale_hits"],
+            "misses": self.counts["misses"],
+            "revalidated": self.counts["revalidated"],
+            "revalidate_errors": self.counts["revalidate_errors"],
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def _request_key(request: httpx.Request) -> Optional[Tuple[str, Tuple[float, float]]]:
+    if request.method != "GET":
+        return None
+    policy = cache_policy(request.url.path)
+    if policy is None:
+        return None
+    return cache_key(request.url.host, request.url.path, request.url.params.multi_items()), policy
+
+
+def _content_type(response: httpx.Response) -> str:
+    return response.headers.get("content-type", "application/json")
+
+
+class CachedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx 传输层：命中缓存时直接构造响应，未命中时转发给真实传输层并写入缓存。
+
+    缓存查找在请求钩子中完成（早于限速钩子），结果放在 request.extensions 里，
+    这样命中的请求不会预约限速额度。
+    """
+
+    def __init__(
+        self, cache: ResponseCache, transport: Optional[httpx.AsyncBaseTransport] = None
+    ) -> None:
+        self.cache = cache
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self._background: Set[asyncio.Task] = set()
+
+    async def lookup(self, request: httpx.Request) -> None:
+        keyed = _request_key(request)
+        if keyed is None:
+            return
+        key, policy = keyed
+        entry, state = await asyncio.to_thread(self.cache.get, key, *policy)
+        if entry is not None:
+            request.extensions[CACHE_HIT_EXTENSION] = (key, entry, state)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        hit = request.extensions.get(CACHE_HIT_EXTENSION)
+        if hit:
+            key, entry, state = hit
+            if state == "stale" and self.cache.begin_revalidate(key):
+                task = asyncio.create_task(self._revalidate(request, key))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return httpx.Response(
+                200,
+                headers={"content-type": entry["content_type"]},
+                content=entry["body"].encode("utf-8"),
+                extensions={"response_cache": state},
+            )
+
+        response = await self._transport.handle_async_request(request)
+        keyed = _request_key(request)
+        if keyed is not None and response.status_code == 200:
+            body = await response.aread()
+            await asyncio.to_thread(
+                self.cache.put, keyed[0], body.decode("utf-8"), _content_type(response)
+            )
+        return response
+
+    async def _revalidate(self, request: httpx.Request, key: str) -> None:
+        ok = False
+        limiter = limiter_for_host(request.url.host)
+        try:
+            if limiter is not None:
+                await limiter.acquire(request.url.path, dict(request.url.params))
+            response = await self._transport.handle_async_request(request)
+            try:
+                body = await response.aread()
+            finally:
+                await response.aclose()
+            if limiter is not None:
+                args = (request.url.path, response.status_code, response.headers)
+                if limiter.shared:
+                    await asyncio.to_thread(limiter.observe, *args)
+                else:
+                    limiter.observe(*args)
+            if response.status_code == 200:
+                await asyncio.to_thread(
+                    self.cache.put, key, body.decode("utf-8"), _content_type(response)
+                )
+                ok = True
+        except httpx.HTTPError:
+            pass  # 后台刷新失败时保留旧值
+        finally:
+            self.cache.end_revalidate(key, ok)
+
+    async def aclose(self) -> None:
+        # 退出前等后台刷新写完缓存
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self._transport.aclose()
+
+
+def cached_client_options(
+    cache: Optional[ResponseCache] = None, enabled: bool = RESPONSE_CACHE_ENABLED
+) -> Dict[str, Any]:
+    """
+    httpx.AsyncClient(**cached_client_options()) 的参数：响应缓存 + 权重限速钩子。
+
+    enabled 为 False 时只挂限速钩子。
+    """
+    hooks = rate_limit_event_hooks()
+    if not enabled:
+        return {"event_hooks": hooks}
+    transport = CachedTransport(cache or response_cache)
+    return {
+        "transport": transport,
+        "event_hooks": {
+            "request": [transport.lookup, *hooks["request"]],
+            "response": hooks["response"],
+        },
+    }
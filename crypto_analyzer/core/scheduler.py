@@ -0,0 +1,158 @@
+"""
+有界并发的批量任务调度。
+
+run_worker_pool 用固定数量的 worker 从有界队列中取任务执行，任务由生产者按需
+从可迭代对象中取出，因此同时存在的协程与结果数量只与 worker 数有关，
+与交易对总数无关。每个任务完成后立即回调（写盘、打印进度），不在内存中累积结果。
+
+BatchProgress 记录完成数与每个任务的耗时，给出进度、预计剩余时间和耗时分位数。
+
+ExecutorStage 把同步函数交给线程池/进程池执行，事件循环只负责网络 I/O；
+每个阶段用信号量限制在途任务数，下游阶段饱和时上游 worker 会在提交处等待（背压）。
+"""
+import asyncio
+import math
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法分位数，sorted_values 须已升序排列。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BatchProgress:
+    """批量任务的进度、ETA 与耗时统计。"""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+        self.started = time.monotonic()
+
+    def record(self, latency: float, ok: bool = True) -> None:
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        self.latencies.append(latency)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def eta(self) -> Optional[float]:
+        """按已完成任务的平均吞吐估算剩余秒数。"""
+        if not self.done:
+            return None
+        return self.elapsed / self.done * (self.total - self.done)
+
+    def render(self) -> str:
+        pct = self.done / self.total * 100 if self.total else 100.0
+        eta = self.eta()
+        eta_text = "--" if eta is None else _format_seconds(eta)
+        return (
+            f"[{self.done}/{self.total} {pct:.1f}%] "
+            f"已用 {_format_seconds(self.elapsed)}，预计剩余 {eta_text}"
+        )
+
+    def summary(self) -> Dict[str, float]:
+        """耗时分位数（秒）与整体吞吐。"""
+        ordered = sorted(self.latencies)
+        elapsed = self.elapsed
+        return {
+            "tasks": self.done,
+            "failed": self.failed,
+            "elapsed": round(elapsed, 3),
+            "throughput": round(self.done / elapsed, 3) if elapsed > 0 else 0.0,
+            "p50": round(percentile(ordered, 50), 3),
+            "p90": round(percentile(ordered, 90), 3),
+            "p99": round(percentile(ordered, 99), 3),
+            "max": round(ordered[-1], 3) if ordered else 0.0,
+        }
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
+
+
+async def run_worker_pool(
+    items: Iterable[T],
+    handler: Callable[[T], Awaitable[R]],
+    workers: int,
+    on_result: Optional[Callable[[T, R, float], None]] = None,
+) -> None:
+    """
+    用 workers 个协程并发处理 items，每完成一个任务调用 on_result(item, result, 耗时秒数)。
+
+    handler 抛出的异常会取消其余 worker 并原样抛出；需要按任务容错的调用方
+    应在 handler 内部捕获。
+    """
+    if workers < 1:
+        raise ValueError("workers must be >= 1")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    stop = object()
+
+    async def produce() -> None:
+        for item in items:
+            await queue.put(item)
+        for _ in range(workers):
+            await queue.put(stop)
+
+    async def work() -> None:
+        while True:
+            item = await queue.get()
+            if item is stop:
+                return
+            started = time.monotonic()
+            result = await handler(item)
+            if on_result is not None:
+                on_result(item, result, time.monotonic() - started)
+
+    tasks = [asyncio.create_task(produce())]
+    tasks.extend(asyncio.create_task(work()) for _ in range(workers))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class ExecutorStage:
+    """在执行器中运行同步函数的流水线阶段，最多 max_pending 个任务在途。"""
+
+    def __init__(self, executor: Executor, max_pending: int) -> None:
+        if max_pending < 1:
+            raise ValueError("max_pending must be >= 1")
+        self.executor = executor
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def run(self, fn: Callable[..., R], *args: Any) -> R:
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(fn, *args))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+async def run_in_stage(stage: Optional[ExecutorStage], fn: Callable[..., R], *args: Any) -> R:
+    """stage 为 None 时直接在当前线程调用（单次调用/测试场景）。"""
+    if stage is None:
+        return fn(*args)
+    return await stage.run(fn, *args)
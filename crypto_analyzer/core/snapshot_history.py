@@ -0,0 +1,327 @@
+"""
+市场快照历史：按交易所保存每次快照中各交易对的价格、24h 成交额、持仓量与资金费率。
+
+文件布局（data/{exchange}/_snapshot_history/history.bin，小端，按采集时间追加）：
+
+    block : i64 采集时间(ms) | u32 交易对数 n | 4 字节填充
+            i32[n] 交易对编号（补齐到 8 字节）
+            f64[n] × len(FIELDS)，按列连续存放，NaN 表示缺失
+
+交易对编号与代码的对应关系保存在同目录的 symbols.json，编号只增不改。
+每次采集只在文件末尾追加一个块；按 RETENTION 降采样：最近 1 小时全部保留，
+1 天内每 5 分钟、7 天内每小时各保留一次，更早的丢弃。可丢弃的块积累到一定数量后
+才整体重写一次，追加本身保持 O(本次交易对数)。
+
+查询（涨跌榜、24h 成交额变化、持仓变化）把两次采集按交易对编号对齐成等长数组后逐项求差，
+只读本地文件，不发网络请求。
+"""
+import bisect
+import json
+import math
+import os
+import struct
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import OUTPUT_DIR
+from .intervals import DAY_MS, HOUR_MS, MINUTE_MS
+from .storage import file_lock, write_json_atomic
+
+FIELDS = ("price", "quote_volume", "open_interest", "funding_rate")
+
+# (最大保留时长, 采样间隔)；间隔为 0 表示全部保留
+RETENTION: Tuple[Tuple[int, int], ...] = (
+    (HOUR_MS, 0),
+    (DAY_MS, 5 * MINUTE_MS),
+    (7 * DAY_MS, HOUR_MS),
+)
+# 可丢弃的块达到该数量（且不少于总数的 1/4）时才重写文件
+COMPACT_MIN_BLOCKS = 12
+
+_BLOCK = struct.Struct("<qI4x")
+_NAN = float("nan")
+
+
+class Capture:
+    """一次采集：交易对编号数组与各字段的列。"""
+
+    def __init__(self, ts: int, symbol_ids: array, columns: Dict[str, array]) -> None:
+        self.ts = ts
+        self.symbol_ids = symbol_ids
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.symbol_ids)
+
+    def aligned(self, field: str, size: int) -> array:
+        """按交易对编号展开为长度 size 的数组，本次未出现的交易对为 NaN。"""
+        out = array("d", [_NAN]) * size
+        values = self.columns[field]
+        for position, symbol_id in enumerate(self.symbol_ids):
+            out[symbol_id] = values[position]
+        return out
+
+    def to_bytes(self) -> bytes:
+        ids = self.symbol_ids.tobytes()
+        parts = [_BLOCK.pack(self.ts, len(self.symbol_ids)), ids, b"\0" * (-len(ids) % 8)]
+        parts.extend(self.columns[field].tobytes() for field in FIELDS)
+        return b"".join(parts)
+
+
+def _block_size(n: int) -> int:
+    return _BLOCK.size + n * 4 + (-(n * 4) % 8) + len(FIELDS) * n * 8
+
+
+def parse_capture(data: bytes, offset: int = 0) -> Capture:
+    """解析 offset 处的一个块。"""
+    ts, n = _BLOCK.unpack_from(data, offset)
+    view = memoryview(data)
+    offset += _BLOCK.size
+    symbol_ids = array("i")
+    symbol_ids.frombytes(view[offset : offset + n * 4])
+    offset += n * 4 + (-(n * 4) % 8)
+    columns: Dict[str, array] = {}
+    for field in FIELDS:
+        columns[field] = array("d")
+        columns[field].frombytes(view[offset : offset + n * 8])
+        offset += n * 8
+    return Capture(ts, symbol_ids, columns)
+
+
+def scan_blocks(path: Path) -> List[Tuple[int, int, int]]:
+    """只读各块的头部，返回 [(采集时间, 偏移, 交易对数)]；末尾写到一半的块会被忽略。"""
+    blocks: List[Tuple[int, int, int]] = []
+    try:
+        fp = path.open("rb")
+    except OSError:
+        return blocks
+    with fp:
+        size = os.fstat(fp.fileno()).st_size
+        offset = 0
+        while offset + _BLOCK.size <= size:
+            fp.seek(offset)
+            ts, n = _BLOCK.unpack(fp.read(_BLOCK.size))
+            if offset + _block_size(n) > size:
+                break
+            blocks.append((ts, offset, n))
+            offset += _block_size(n)
+    return blocks
+
+
+def retained(timestamps: List[int], now_ms: int) -> List[bool]:
+    """按 RETENTION 判断每次采集是否保留（每个采样桶保留最早的一次）。"""
+    keep: List[bool] = []
+    seen = set()
+    for ts in timestamps:
+        age = now_ms - ts
+        tier = next((i for i, (max_age, _) in enumerate(RETENTION) if age <= max_age), None)
+        if tier is None:
+            keep.append(False)
+            continue
+        step = RETENTION[tier][1]
+        if not step:
+            keep.append(True)
+            continue
+        bucket = (tier, ts // step)
+        keep.append(bucket not in seen)
+        seen.add(bucket)
+    return keep
+
+
+def _same_values(a: Capture, b: Capture) -> bool:
+    return a.symbol_ids == b.symbol_ids and all(
+        a.columns[field].tobytes() == b.columns[field].tobytes() for field in FIELDS
+    )
+
+
+class SnapshotHistory:
+    """单个交易所的快照历史。"""
+
+    def __init__(self, exchange: str, root: Path = OUTPUT_DIR) -> None:
+        self.exchange = exchange.lower()
+        self.folder = root / self.exchange / "_snapshot_history"
+        self.path = self.folder / "history.bin"
+        self.symbols_path = self.folder / "symbols.json"
+        self.lock_path = self.folder / ".lock"
+        self._blocks: Optional[List[Tuple[int, int, int]]] = None
+        self._symbols: Optional[List[str]] = None
+
+    # ---------- 读取 ----------
+
+    @property
+    def symbols(self) -> List[str]:
+        if self._symbols is None:
+            try:
+                self._symbols = json.loads(self.symbols_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._symbols = []
+        return self._symbols
+
+    @property
+    def blocks(self) -> List[Tuple[int, int, int]]:
+        if self._blocks is None:
+            self._blocks = scan_blocks(self.path)
+        return self._blocks
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def capture(self, position: int) -> Capture:
+        """读取第 position 个块（支持负数下标），只读取该块的字节。"""
+        _, offset, n = self.blocks[position]
+        with self.path.open("rb") as fp:
+            fp.seek(offset)
+            return parse_capture(fp.read(_block_size(n)))
+
+    def _invalidate(self) -> None:
+        self._blocks = None
+        self._symbols = None
+
+    # ---------- 写入 ----------
+
+    def append(self, rows: Iterable[Dict[str, Any]], ts_ms: Optional[int] = None) -> Capture:
+        """
+        追加一次采集。rows 中每行含 symbol 与 FIELDS 中的字段（缺失或 None 记为 NaN）。
+        """
+        ts_ms = int(time.time() * 1000) if ts_ms is None else ts_ms
+        with file_lock(self.lock_path):
+            self._invalidate()
+            symbols = self.symbols
+            index = {symbol: i for i, symbol in enumerate(symbols)}
+            ids = array("i")
+            columns = {field: array("d") for field in FIELDS}
+            added = False
+            for row in rows:
+                symbol = row["symbol"]
+                if symbol not in index:
+                    index[symbol] = len(symbols)
+                    symbols.append(symbol)
+                    added = True
+                ids.append(index[symbol])
+                for field in FIELDS:
+                    value = row.get(field)
+                    columns[field].append(_NAN if value is None else float(value))
+            if added:
+                write_json_atomic(symbols, self.symbols_path)
+
+            capture = Capture(ts_ms, ids, columns)
+            if self.blocks:
+                last = self.capture(-1)
+                if _same_values(last, capture):
+                    # 数据没有变化（如命中响应缓存），不重复记录
+                    return last
+            self.folder.mkdir(parents=True, exist_ok=True)
+            # 截掉末尾写到一半的块（上次写入中断），否则新块会接在残缺数据之后，
+            # 之后的扫描从残缺块头开始解析，后续所有块都会错位
+            end = self.blocks[-1][1] + _block_size(self.blocks[-1][2]) if self.blocks else 0
+            with self.path.open("ab") as fp:
+                if fp.tell() != end:
+                    fp.truncate(end)
+                    fp.seek(end)
+                offset = fp.tell()
+                fp.write(capture.to_bytes())
+            self.blocks.append((ts_ms, offset, len(ids)))
+            self._compact(ts_ms)
+        return capture
+
+    def _compact(self, now_ms: int) -> None:
+        keep = retained([ts for ts, _, _ in self.blocks], now_ms)
+        dropped = keep.count(False)
+        if dropped < max(COMPACT_MIN_BLOCKS, len(keep) // 4):
+            return
+        data = self.path.read_bytes()
+        kept = [
+            data[offset : offset + _block_size(n)]
+            for (_, offset, n), ok in zip(self.blocks, keep)
+            if ok
+        ]
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(b"".join(kept))
+        os.replace(tmp, self.path)
+        self._blocks = None
+
+    # ---------- 查询 ----------
+
+    def reference(self, window_ms: Optional[int] = None) -> Optional[Capture]:
+        """
+        与最新一次采集比较的基准：window_ms 为 None 时取上一次采集，
+        否则取不晚于“最新时间 - window_ms”的最近一次。该次采集还须落在
+        window_ms / 2 的容差内（采集中断过或旧块已被降采样时，宁可不出榜单，
+        也不拿几小时前的数据冒充 5 分钟/1 小时的变化）；历史不足时返回 None。
+        """
+        blocks = self.blocks
+        if len(blocks) < 2:
+            return None
+        if window_ms is None:
+            return self.capture(-2)
+        target = blocks[-1][0] - window_ms
+        timestamps = [ts for ts, _, _ in blocks[:-1]]
+        position = bisect.bisect_right(timestamps, target) - 1
+        if position < 0 or timestamps[position] < target - window_ms // 2:
+            return None
+        return self.capture(position)
+
+    def changes(
+        self, field: str, window_ms: Optional[int] = None, symbols: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float, float, float]]:
+        """
+        最新一次采集相对基准的变化：[(symbol, 旧值, 新值, 变化百分比)]。
+        symbols 不为 None 时只保留其中的交易对。
+        """
+        base = self.reference(window_ms)
+        if base is None:
+            return []
+        latest = self.capture(-1)
+        size = len(self.symbols)
+        old = base.aligned(field, size)
+        new = latest.aligned(field, size)
+        names = self.symbols
+        return [
+            (names[i], old[i], new[i], (new[i] - old[i]) / old[i] * 100)
+            for i in latest.symbol_ids
+            if old[i] > 0 and not math.isnan(new[i]) and (symbols is None or names[i] in symbols)
+        ]
+
+    def leaderboard(
+        self,
+        field: str,
+        window_ms: Optional[int] = None,
+        top: int = 10,
+        symbols: Optional[Set[str]] = None,
+    ) -> Dict[str, Any]:
+        """变化百分比最大/最小的 top 个交易对，以及比较的两次采集时间。"""
+        rows = self.changes(field, window_ms, symbols)
+        base = self.reference(window_ms)
+        ordered = sorted(rows, key=lambda row: row[3])
+
+        def render(items: List[Tuple[str, float, float, float]]) -> List[Dict[str, Any]]:
+            return [
+                {"symbol": s, "from": old, "to": new, "change_pct": round(pct, 4)}
+                for s, old, new, pct in items
+            ]
+
+        return {
+            "from": base.ts if base is not None else None,
+            "to": self.blocks[-1][0] if base is not None else None,
+            "up": render(ordered[::-1][:top]),
+            "down": render(ordered[:top]),
+        }
+
+    def leaderboards(self, top: int = 10, symbols: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """LEADERBOARDS 中的全部榜单；历史不足的榜单为空列表。"""
+        return {
+            name: self.leaderboard(field, window_ms, top, symbols)
+            for name, (field, window_ms) in LEADERBOARDS.items()
+        }
+
+
+# 榜单名 -> (字段, 比较窗口)；窗口为 None 表示与上一次快照比较
+LEADERBOARDS: Dict[str, Tuple[str, Optional[int]]] = {
+    "movers_5m": ("price", 5 * MINUTE_MS),
+    "movers_1h": ("price", HOUR_MS),
+    # 滚动 24h 成交额在 1 小时内的变化（不是 1 小时成交额本身）
+    "quote_volume_24h_change_1h": ("quote_volume", HOUR_MS),
+    "open_interest_change": ("open_interest", None),
+}
@@ -1,25 +1,35 @@
 import json
+import os
 import sys
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, Optional, Sequence
 
+from .column_file import SUFFIX as COLUMN_FILE_SUFFIX
+from .column_file import load_payload_binary, save_payload_binary
 from .config import OUTPUT_DIR
 
+if os.name == "nt":  # pragma: no cover - 平台相关
+    import msvcrt
+else:
+    import fcntl
+
 
 def build_output_path(
-    exchange: str, symbol: str, interval: str, records: List[Dict[str, Any]]
+    exchange: str, symbol: str, interval: str, records: Sequence[Any], suffix: str = ".json"
 ) -> Path:
     """
-    构建输出文件路径，格式：data/{exchange}/{symbol}/{interval}/{timestamp}_{count}.json
+    构建输出文件路径，格式：data/{exchange}/{symbol}/{interval}/{timestamp}_{count}{suffix}
 
     使用当前时间作为文件名时间戳，更准确反映数据拉取时间。
+    suffix 为 .json（默认）或二进制列格式 .klb。
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     interval_token = interval.replace("/", "-")
     folder = OUTPUT_DIR / exchange.lower() / symbol.upper() / interval_token
     count = len(records) if records else 0
-    filename = f"{timestamp}_{count}.json"
+    filename = f"{timestamp}_{count}{suffix}"
     return folder / filename
 
 
@@ -30,13 +40,29 @@ def save_json(data: Any, output_path: Path) -> None:
     cleanup_old_files(output_path)
 
 
+def write_json_atomic(data: Any, output_path: Path) -> None:
+    """先写临时文件再替换，保证读方不会看到写了一半的 JSON（不做旧文件清理）。"""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, output_path)
+
+
+def save_binary(data: Dict[str, Any], output_path: Path) -> None:
+    """保存为 .klb 二进制列文件，并删除同目录下的旧 .klb 文件。"""
+    save_payload_binary(data, output_path)
+    cleanup_old_files(output_path)
+
+
 def cleanup_old_files(keep_file: Path) -> None:
-    """删除同目录下的其他 JSON 文件，只保留指定的文件。"""
+    """删除同目录下同类型的其他数据文件，只保留指定的文件（以 _ 开头的状态类文件不受影响）。"""
     directory = keep_file.parent
     if not directory.exists():
         return
 
-    json_files = list(directory.glob("*.json"))
+    json_files = [
+        p for p in directory.glob(f"*{keep_file.suffix}") if not p.name.startswith("_")
+    ]
     if len(json_files) <= 1:
         return
 
@@ -55,3 +81,35 @@ def load_json(path: Path) -> Dict[str, Any]:
         raise FileNotFoundError(f"File not found: {path}")
     with path.open("r", encoding="utf-8") as fp:
         return json.load(fp)
+
+
+def load_payload(path: Path, tail: Optional[int] = None) -> Dict[str, Any]:
+    """
+    按扩展名读取 fetch_klines 输出：.klb 通过 mmap 映射（klines 为 KlineFrame 视图），
+    其他按 JSON 解析。tail 仅对 .klb 生效，用于只取最后 N 根 K 线。
+    """
+    if path.suffix == COLUMN_FILE_SUFFIX:
+        if not path.exists():
+            raise FileNotFoundError(f"File not found: {path}")
+        return load_payload_binary(path, tail)
+    return load_json(path)
+
+
+@contextmanager
+def file_lock(lock_path: Path) -> Iterator[None]:
+    """跨进程互斥锁（基于锁文件），用于保护多个脚本进程同时写同一份数据。"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a+b") as fp:
+        if os.name == "nt":  # pragma: no cover - 平台相关
+            fp.seek(0)
+            msvcrt.locking(fp.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":  # pragma: no cover - 平台相关
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
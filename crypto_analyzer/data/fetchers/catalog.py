@@ -0,0 +1,249 @@
+"""
+交易对目录（symbol catalog）：合约列表的本地持久化索引。
+
+合约列表一周只变化几次，没必要每次 ALL 模式都下载完整的 exchangeInfo / instruments。
+目录保存在 data/_catalog/ 下，进程内按交易对索引，查询不访问网络：
+
+- 每个交易对的 base / quote / 结算币种、合约类型、tick size、下单步长、是否可交易
+- Binance ↔ OKX 映射：按（去掉 1000 等倍数前缀的）base 与 quote 配对，
+  如 BTCUSDT ↔ BTC-USDT-SWAP、1000PEPEUSDT ↔ PEPE-USDT-SWAP
+
+超过 TTL 的目录仍会立即返回，同时在后台刷新（调用方退出前用
+wait_for_catalog_refresh() 等待写盘）；本地没有目录时才同步拉取一次。
+"""
+import asyncio
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from crypto_analyzer.core.config import (
+    BINANCE_BASE_URL,
+    OKX_BASE_URL,
+    SYMBOL_CATALOG_DIR,
+    SYMBOL_CATALOG_TTL,
+)
+from crypto_analyzer.core.rate_limiter import binance_public_limiter, okx_public_limiter
+from crypto_analyzer.core.storage import write_json_atomic
+
+# Binance 对低价币使用 1000PEPE、1000000MOG、1MBABYDOGE 这类倍数前缀
+_MULTIPLIER_PREFIX = re.compile(r"^(?:1000000|10000|1000|1M)(?=[A-Z])")
+
+
+def canonical_base(base: str) -> str:
+    """去掉倍数前缀后的 base，用于跨交易所配对。"""
+    return _MULTIPLIER_PREFIX.sub("", base.upper())
+
+
+class SymbolCatalog:
+    """单个交易所（OKX 为单个 instType）的合约目录。"""
+
+    def __init__(
+        self, exchange: str, inst_type: str, symbols: Iterable[Dict[str, Any]], fetched_at: float
+    ) -> None:
+        self.exchange = exchange
+        self.inst_type = inst_type
+        self.fetched_at = fetched_at
+        self.by_symbol: Dict[str, Dict[str, Any]] = {item["symbol"]: item for item in symbols}
+        self._by_pair: Dict[Tuple[str, str], str] = {}
+        for item in self.by_symbol.values():
+            if item.get("tradable") and item.get("perpetual"):
+                self._by_pair.setdefault((canonical_base(item["base"]), item["quote"]), item["symbol"])
+
+    def __len__(self) -> int:
+        return len(self.by_symbol)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self.by_symbol
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        return self.by_symbol.get(symbol.upper())
+
+    def query(
+        self,
+        quote_assets: Optional[Iterable[str]] = None,
+        contract_type: Optional[str] = None,
+        tradable_only: bool = True,
+    ) -> List[str]:
+        """按报价资产、合约类型筛选交易对（按代码排序）。"""
+        quotes = {q.upper() for q in quote_assets} if quote_assets else None
+        return sorted(
+            symbol
+            for symbol, item in self.by_symbol.items()
+            if (not tradable_only or item.get("tradable"))
+            and (quotes is None or item.get("quote") in quotes)
+            and (contract_type is None or item.get("contract_type") == contract_type.upper())
+        )
+
+    def find(self, base: str, quote: str) -> Optional[str]:
+        """按 base/quote 查找可交易的永续合约。"""
+        return self._by_pair.get((canonical_base(base), quote.upper()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "exchange": self.exchange,
+            "inst_type": self.inst_type,
+            "fetched_at": self.fetched_at,
+            "symbols": list(self.by_symbol.values()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SymbolCatalog":
+        return cls(data["exchange"], data["inst_type"], data["symbols"], float(data["fetched_at"]))
+
+
+def map_symbol(symbol: str, source: SymbolCatalog, target: SymbolCatalog) -> Optional[str]:
+    """把 source 交易所的交易对映射到 target 交易所的对应永续合约，找不到时返回 None。"""
+    item = source.get(symbol)
+    if item is None:
+        return None
+    return target.find(item["base"], item["quote"])
+
+
+def catalog_path(exchange: str, inst_type: str = "SWAP", root: Path = SYMBOL_CATALOG_DIR) -> Path:
+    if exchange == "binance":
+        return root / "binance.json"
+    return root / f"okx_{inst_type.upper()}.json"
+
+
+# ---------- 拉取 ----------
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def fetch_binance_catalog_async(client: httpx.AsyncClient) -> SymbolCatalog:
+    async with binance_public_limiter:
+        response = await client.get(f"{BINANCE_BASE_URL}/fapi/v1/exchangeInfo", timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    if not isinstance(data, dict) or not isinstance(data.get("symbols"), list):
+        raise ValueError("Binance exchangeInfo 接口返回格式异常")
+
+    symbols = []
+    for entry in data["symbols"]:
+        filters = {item.get("filterType"): item for item in entry.get("filters", [])}
+        symbols.append(
+            {
+                "symbol": entry["symbol"].upper(),
+                "base": entry.get("baseAsset", "").upper(),
+                "quote": entry.get("quoteAsset", "").upper(),
+                "settle": entry.get("marginAsset", "").upper(),
+                "contract_type": entry.get("contractType", ""),
+                "perpetual": entry.get("contractType") == "PERPETUAL",
+                "tradable": entry.get("status") == "TRADING",
+                "tick_size": _to_float(filters.get("PRICE_FILTER", {}).get("tickSize")),
+                "step_size": _to_float(filters.get("LOT_SIZE", {}).get("stepSize")),
+                "contract_size": 1.0,
+                "listed_at": entry.get("onboardDate"),
+            }
+        )
+    return SymbolCatalog("binance", "", symbols, time.time())
+
+
+async def fetch_okx_catalog_async(client: httpx.AsyncClient, inst_type: str = "SWAP") -> SymbolCatalog:
+    inst_type = inst_type.upper()
+    async with okx_public_limiter:
+        response = await client.get(
+            f"{OKX_BASE_URL}/api/v5/public/instruments", params={"instType": inst_type}, timeout=30
+        )
+    response.raise_for_status()
+    result = response.json()
+    if result.get("code") != "0":
+        raise ValueError(f"OKX instruments 接口错误：{result.get('msg', '未知错误')}")
+
+    symbols = []
+    for entry in result.get("data", []):
+        inst_id = entry.get("instId", "").upper()
+        # 合约的 baseCcy/quoteCcy 为空，从 uly（如 BTC-USDT）解析
+        parts = (entry.get("uly") or inst_id).upper().split("-")
+        base = entry.get("baseCcy") or parts[0]
+        quote = entry.get("quoteCcy") or (parts[1] if len(parts) > 1 else "")
+        symbols.append(
+            {
+                "symbol": inst_id,
+                "base": base.upper(),
+                "quote": quote.upper(),
+                "settle": entry.get("settleCcy", "").upper(),
+                "contract_type": inst_type,
+                "perpetual": inst_type == "SWAP",
+                "tradable": entry.get("state") == "live",
+                "tick_size": _to_float(entry.get("tickSz")),
+                "step_size": _to_float(entry.get("lotSz")),
+                "contract_size": _to_float(entry.get("ctVal")),
+                "listed_at": int(entry["listTime"]) if entry.get("listTime") else None,
+            }
+        )
+    return SymbolCatalog("okx", inst_type, symbols, time.time())
+
+
+async def fetch_symbol_catalog_async(
+    client: httpx.AsyncClient, exchange: str, inst_type: str = "SWAP"
+) -> SymbolCatalog:
+    if exchange == "binance":
+        return await fetch_binance_catalog_async(client)
+    return await fetch_okx_catalog_async(client, inst_type)
+
+
+# ---------- 加载与后台刷新 ----------
+
+_CATALOGS: Dict[Tuple[str, str], SymbolCatalog] = {}
+_REFRESHING: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def _read_catalog(path: Path) -> Optional[SymbolCatalog]:
+    try:
+        return SymbolCatalog.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+async def _refresh(client: httpx.AsyncClient, exchange: str, inst_type: str) -> SymbolCatalog:
+    catalog = await fetch_symbol_catalog_async(client, exchange, inst_type)
+    await asyncio.to_thread(write_json_atomic, catalog.to_dict(), catalog_path(exchange, inst_type))
+    _CATALOGS[(exchange, inst_type)] = catalog
+    return catalog
+
+
+async def load_symbol_catalog_async(
+    client: httpx.AsyncClient,
+    exchange: str,
+    inst_type: str = "SWAP",
+    ttl: float = SYMBOL_CATALOG_TTL,
+) -> SymbolCatalog:
+    """
+    读取交易对目录：优先用进程内/本地缓存，过期时先返回旧目录并在后台刷新，
+    本地没有目录时同步拉取。
+    """
+    inst_type = "" if exchange == "binance" else inst_type.upper()
+    key = (exchange, inst_type)
+    catalog = _CATALOGS.get(key)
+    if catalog is None:
+        catalog = await asyncio.to_thread(_read_catalog, catalog_path(exchange, inst_type))
+    if catalog is None:
+        return await _refresh(client, exchange, inst_type)
+
+    _CATALOGS[key] = catalog
+    if catalog.age > ttl and key not in _REFRESHING:
+        task = asyncio.create_task(_refresh(client, exchange, inst_type))
+        _REFRESHING[key] = task
+        task.add_done_callback(lambda _: _REFRESHING.pop(key, None))
+    return catalog
+
+
+async def wait_for_catalog_refresh() -> None:
+    """等待后台刷新完成（关闭 httpx 客户端前调用）；刷新失败时保留旧目录。"""
+    pending: Set[asyncio.Task] = set(_REFRESHING.values())
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,108 @@
+"""
+按时间窗口拉取历史 K 线（回填用）。
+
+常规的 K 线接口只接受 limit，只能拿到最近一页；回填需要指定时间范围：
+- Binance：/fapi/v1/klines 的 startTime/endTime，每页最多 1500 根
+- OKX：/api/v5/market/history-candles 的 after/before（开区间），每页最多 100 根
+
+返回的记录为按 open_time 正序的字典列表，字段与 K 线记录保持一致
+（open_time/open/high/low/close/volume/quote_volume 等）。
+"""
+from typing import Any, Dict, List
+
+import httpx
+
+from crypto_analyzer.core.config import BINANCE_BASE_URL, OKX_BASE_URL
+from crypto_analyzer.core.rate_limiter import binance_public_limiter, okx_public_limiter
+
+# 每次请求的 K 线数量。Binance limit 在 (500, 1000] 时权重为 5、超过 1000 为 10，
+# 1000 根一页的单位权重产出最高
+BINANCE_PAGE_SIZE = 1000
+OKX_PAGE_SIZE = 100
+
+PAGE_SIZES = {"binance": BINANCE_PAGE_SIZE, "okx": OKX_PAGE_SIZE}
+
+
+async def fetch_binance_klines_range_async(
+    client: httpx.AsyncClient, symbol: str, interval: str, start_ms: int, end_ms: int
+) -> List[Dict[str, Any]]:
+    """获取 open_time 在 [start_ms, end_ms] 内的 Binance K 线（单页）。"""
+    params = {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "startTime": start_ms,
+        "endTime": end_ms,
+        "limit": BINANCE_PAGE_SIZE,
+    }
+    async with binance_public_limiter:
+        response = await client.get(f"{BINANCE_BASE_URL}/fapi/v1/klines", params=params, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    if not isinstance(data, list):
+        raise ValueError("Binance K线接口返回格式异常（应为列表）")
+
+    symbol = symbol.upper()
+    return [
+        {
+            "symbol": symbol,
+            "open_time": int(row[0]),
+            "open": float(row[1]),
+            "high": float(row[2]),
+            "low": float(row[3]),
+            "close": float(row[4]),
+            "volume": float(row[5]),
+            "close_time": int(row[6]),
+            "quote_volume": float(row[7]),
+            "trades": int(row[8]),
+            "taker_buy_volume": float(row[9]),
+            "taker_buy_quote_volume": float(row[10]),
+        }
+        for row in data
+    ]
+
+
+async def fetch_okx_klines_range_async(
+    client: httpx.AsyncClient, symbol: str, interval: str, start_ms: int, end_ms: int
+) -> List[Dict[str, Any]]:
+    """获取 open_time 在 [start_ms, end_ms] 内的 OKX K 线（单页，最多 100 根）。"""
+    params = {
+        "instId": symbol.upper(),
+        "bar": interval,
+        # after/before 均为开区间：after 返回早于该时间的数据，before 返回晚于该时间的数据
+        "after": str(end_ms + 1),
+        "before": str(start_ms - 1),
+        "limit": str(OKX_PAGE_SIZE),
+    }
+    async with okx_public_limiter:
+        response = await client.get(
+            f"{OKX_BASE_URL}/api/v5/market/history-candles", params=params, timeout=30
+        )
+    response.raise_for_status()
+    result = response.json()
+    if result.get("code") != "0":
+        raise ValueError(f"OKX K线接口错误：{result.get('msg', '未知错误')}")
+
+    symbol = symbol.upper()
+    records = [
+        {
+            "symbol": symbol,
+            "open_time": int(row[0]),
+            "open": float(row[1]),
+            "high": float(row[2]),
+            "low": float(row[3]),
+            "close": float(row[4]),
+            "volume": float(row[5]),
+            "quote_volume": float(row[7]) if len(row) > 7 else float(row[6]),
+        }
+        for row in result.get("data", [])
+    ]
+    records.reverse()  # OKX 返回最新在前
+    return records
+
+
+async def fetch_klines_range_async(
+    client: httpx.AsyncClient, exchange: str, symbol: str, interval: str, start_ms: int, end_ms: int
+) -> List[Dict[str, Any]]:
+    if exchange == "binance":
+        return await fetch_binance_klines_range_async(client, symbol, interval, start_ms, end_ms)
+    return await fetch_okx_klines_range_async(client, symbol, interval, start_ms, end_ms)
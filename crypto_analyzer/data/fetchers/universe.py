@@ -0,0 +1,193 @@
+"""
+全市场批量接口（universe endpoints）。
+
+批量模式（--symbols ALL）下，24h 行情、资金费率、最新价格（OKX 还有持仓量）
+都可以用一次请求拿到全部合约的数据，按交易对索引后直接拼进每个交易对的 payload，
+把 O(N) 次请求降为 O(1)。
+
+返回结构统一为 {symbol: {"ticker_24hr": ..., "funding_rate": ..., ...}}，
+各字段的键名与单交易对接口保持一致（ticker 使用 Binance 风格的键名，
+资金费率带 fundingRate/lastFundingRate，持仓量带 openInterest），summary 可直接读取。
+
+- Binance：/fapi/v1/ticker/24hr、/fapi/v1/premiumIndex、/fapi/v1/ticker/price 均支持不带 symbol；
+  持仓量没有批量接口，仍需逐个请求。
+- OKX：/api/v5/market/tickers、/api/v5/public/open-interest 按 instType 批量，
+  /api/v5/public/funding-rate 使用 instId=ANY 返回全部永续合约。
+
+只有 24h 行情接口是必需的；资金费率、最新价格、持仓量等附加接口失败时只打印警告，
+对应字段留空（下游按缺失处理，或回退到单交易对接口）。
+"""
+import asyncio
+import sys
+from typing import Any, Awaitable, Dict, List, Optional
+
+import httpx
+
+from crypto_analyzer.core.config import BINANCE_BASE_URL, OKX_BASE_URL
+from crypto_analyzer.core.rate_limiter import binance_public_limiter, okx_public_limiter
+
+MarketUniverse = Dict[str, Dict[str, Any]]
+
+
+# ---------- Binance ----------
+
+
+async def fetch_binance_universe_async(client: httpx.AsyncClient) -> MarketUniverse:
+    """一次性获取 Binance 全部合约的 24h 行情、资金费率与最新价格。"""
+    tickers, premium_index, prices = await _gather_optional(
+        _get_binance(client, "/fapi/v1/ticker/24hr"),
+        {
+            "/fapi/v1/premiumIndex": _get_binance(client, "/fapi/v1/premiumIndex"),
+            "/fapi/v1/ticker/price": _get_binance(client, "/fapi/v1/ticker/price"),
+        },
+    )
+
+    universe: MarketUniverse = {}
+    for entry in tickers:
+        _entry(universe, entry.get("symbol"))["ticker_24hr"] = entry
+    for entry in premium_index:
+        _entry(universe, entry.get("symbol"))["funding_rate"] = entry
+    for entry in prices:
+        _entry(universe, entry.get("symbol"))["current_price"] = entry
+    universe.pop("", None)
+    return universe
+
+
+async def _get_binance(client: httpx.AsyncClient, path: str) -> List[Dict[str, Any]]:
+    async with binance_public_limiter:
+        response = await client.get(f"{BINANCE_BASE_URL}{path}", timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    if not isinstance(data, list):
+        raise ValueError(f"Binance {path} 接口返回格式异常（应为列表）")
+    return data
+
+
+# ---------- OKX ----------
+
+
+async def fetch_okx_universe_async(
+    client: httpx.AsyncClient, inst_type: str = "SWAP"
+) -> MarketUniverse:
+    """一次性获取 OKX 指定合约类型的 24h 行情、最新价格、持仓量，永续合约另含资金费率。"""
+    inst_type = inst_type.upper()
+    optional = {
+        "/api/v5/public/open-interest": _get_okx(
+            client, "/api/v5/public/open-interest", {"instType": inst_type}
+        ),
+    }
+    if inst_type == "SWAP":
+        optional["/api/v5/public/funding-rate"] = _get_okx(
+            client, "/api/v5/public/funding-rate", {"instId": "ANY"}
+        )
+    tickers, open_interest, *funding = await _gather_optional(
+        _get_okx(client, "/api/v5/market/tickers", {"instType": inst_type}), optional
+    )
+
+    universe: MarketUniverse = {}
+    for entry in tickers:
+        inst_id = entry.get("instId", "").upper()
+        item = _entry(universe, inst_id)
+        item["ticker_24hr"] = _okx_ticker(inst_id, entry, inst_type)
+        item["current_price"] = {"symbol": inst_id, "price": entry.get("last"), "time": entry.get("ts")}
+    for entry in open_interest:
+        inst_id = entry.get("instId", "").upper()
+        _entry(universe, inst_id)["open_interest"] = {
+            "symbol": inst_id,
+            "openInterest": entry.get("oi"),
+            "openInterestCcy": entry.get("oiCcy"),
+            "time": entry.get("ts"),
+        }
+    for entry in funding[0] if funding else []:
+        inst_id = entry.get("instId", "").upper()
+        _entry(universe, inst_id)["funding_rate"] = {"symbol": inst_id, **entry}
+    universe.pop("", None)
+    return universe
+
+
+def _okx_ticker(inst_id: str, entry: Dict[str, Any], inst_type: str = "SWAP") -> Dict[str, Any]:
+    """
+    OKX ticker 转为 Binance 风格的 24h 统计字段。
+
+    OKX 的 volCcy24h 在现货中以报价币计，在合约（SWAP/FUTURES）中却以基础币计，
+    vol24h 则是合约张数。合约的 volume 取 volCcy24h（与 Binance 一样以基础币计），
+    quoteVolume 用 volCcy24h × 最新价折算，才能与 Binance 的 quoteVolume 一起筛选、排序。
+    """
+    try:
+        open_price = float(entry.get("open24h") or 0)
+        last_price = float(entry.get("last") or 0)
+    except (TypeError, ValueError):
+        open_price = last_price = 0.0
+    change_pct = (last_price - open_price) / open_price * 100 if open_price else 0.0
+    if inst_type == "SPOT":
+        volume, quote_volume = entry.get("vol24h"), entry.get("volCcy24h")
+    else:
+        volume = entry.get("volCcy24h")
+        try:
+            quote_volume = float(volume or 0) * last_price
+        except (TypeError, ValueError):
+            quote_volume = None
+    return {
+        "symbol": inst_id,
+        "lastPrice": entry.get("last"),
+        "openPrice": entry.get("open24h"),
+        "highPrice": entry.get("high24h"),
+        "lowPrice": entry.get("low24h"),
+        "volume": volume,
+        "quoteVolume": quote_volume,
+        "priceChange": last_price - open_price,
+        "priceChangePercent": round(change_pct, 4),
+        "closeTime": entry.get("ts"),
+    }
+
+
+async def _get_okx(
+    client: httpx.AsyncClient, path: str, params: Optional[Dict[str, str]] = None
+) -> List[Dict[str, Any]]:
+    async with okx_public_limiter:
+        response = await client.get(f"{OKX_BASE_URL}{path}", params=params, timeout=30)
+    response.raise_for_status()
+    result = response.json()
+    if result.get("code") != "0":
+        raise ValueError(f"OKX {path} 接口错误：{result.get('msg', '未知错误')}")
+    data = result.get("data", [])
+    if not isinstance(data, list):
+        raise ValueError(f"OKX {path} 接口返回格式异常（应为列表）")
+    return data
+
+
+# ---------- 通用 ----------
+
+
+async def _gather_optional(
+    required: Awaitable[List[Dict[str, Any]]],
+    optional: Dict[str, Awaitable[List[Dict[str, Any]]]],
+) -> List[List[Dict[str, Any]]]:
+    """
+    并发执行必需接口与附加接口，按 [必需, *附加] 的顺序返回。
+    必需接口的异常原样抛出；附加接口失败时打印警告并返回空列表。
+    """
+    results = await asyncio.gather(required, *optional.values(), return_exceptions=True)
+    if isinstance(results[0], BaseException):
+        raise results[0]
+    data = [results[0]]
+    for path, result in zip(optional, results[1:]):
+        if isinstance(result, BaseException):
+            if not isinstance(result, (httpx.HTTPError, ValueError)):
+                raise result
+            print(f"警告：{path} 获取失败，相关字段留空：{result}", file=sys.stderr)
+            result = []
+        data.append(result)
+    return data
+
+
+async def fetch_universe_async(
+    client: httpx.AsyncClient, exchange: str, inst_type: str = "SWAP"
+) -> MarketUniverse:
+    if exchange == "binance":
+        return await fetch_binance_universe_async(client)
+    return await fetch_okx_universe_async(client, inst_type)
+
+
+def _entry(universe: MarketUniverse, symbol: Optional[str]) -> Dict[str, Any]:
+    return universe.setdefault((symbol or "").upper(), {})
@@ -1,47 +1,77 @@
 import argparse
+import glob
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any, Dict, Iterable, List
 
 # 添加项目根目录到 sys.path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from crypto_analyzer.core.storage import load_json
-from crypto_analyzer.analysis.summary import summarize, format_summary
-from crypto_analyzer.analysis.volatility import (
-    detect_volatility_expansion_signals,
-    format_volatility_analysis,
-)
+from crypto_analyzer.core.column_file import SUFFIX as COLUMN_FILE_SUFFIX
+from crypto_analyzer.core.config import OUTPUT_DIR
+from crypto_analyzer.core.freshness import FRESHNESS_FILENAME
+from crypto_analyzer.analysis.sidecar import analyze_file_cached
+from crypto_analyzer.analysis.summary import format_summary
+from crypto_analyzer.analysis.volatility import format_volatility_analysis
+
+DATA_SUFFIXES = (".json", COLUMN_FILE_SUFFIX)
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Extract technical indicators from fetch_klines.py JSON output."
     )
-    parser.add_argument("--file", required=True, help="Path to the JSON file to summarize")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Path to the JSON (or .klb binary) file to summarize")
+    source.add_argument("--dir", help="Batch mode: analyze every data file under this directory (recursive)")
+    source.add_argument("--glob", help="Batch mode: analyze files matching this pattern (supports **)")
+    source.add_argument(
+        "--store",
+        action="store_true",
+        help="Batch mode: analyze the latest output of every series recorded under data/",
+    )
     parser.add_argument("--json", action="store_true", help="Output as JSON instead of formatted text")
     parser.add_argument("--volatility", action="store_true", help="Include volatility expansion analysis")
+    parser.add_argument(
+        "--recompute",
+        action="store_true",
+        help="Ignore the precomputed _summary.json sidecar and analyze the data file again",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Batch mode: number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--sort-by",
+        nargs="+",
+        metavar="FIELD[:asc]",
+        help="Batch mode: after streaming, print a merged table sorted by these summary/signal fields "
+        "(descending unless suffixed with :asc) to stderr",
+    )
     args = parser.parse_args()
     
+    if args.file is None:
+        run_batch(args)
+        return
+
     path = Path(args.file)
     try:
-        data = load_json(path)
-        summary = summarize(data)
+        # fetch_klines 写出数据时已算好摘要（_summary.json），数据未变化时直接读取
+        analysis = analyze_file_cached(path, refresh=args.recompute)
+        summary = analysis["summary"]
         
         if args.json:
             # JSON输出模式，方便程序化处理
             output = {"summary": summary}
             if args.volatility:
-                vol_result = detect_volatility_expansion_signals(
-                    klines=data.get("klines", []),
-                    ticker_24hr=data.get("ticker_24hr"),
-                    funding_rate=data.get("funding_rate"),
-                    open_interest=data.get("open_interest"),
-                    order_book=data.get("order_book")
-                )
-                output["volatility_analysis"] = vol_result
+                output["volatility_analysis"] = analysis["volatility_analysis"]
             print(json.dumps(output, ensure_ascii=False, indent=2))
         else:
             # 格式化文本输出
@@ -51,18 +81,152 @@ def main() -> None:
                 print("\n" + "=" * 60)
                 print("[VOLATILITY ANALYSIS]")
                 print("=" * 60)
-                vol_result = detect_volatility_expansion_signals(
-                    klines=data.get("klines", []),
-                    ticker_24hr=data.get("ticker_24hr"),
-                    funding_rate=data.get("funding_rate"),
-                    open_interest=data.get("open_interest"),
-                    order_book=data.get("order_book")
-                )
-                print(format_volatility_analysis(vol_result))
+                print(format_volatility_analysis(analysis["volatility_analysis"]))
     except Exception as e:
         print(f"Error processing file {path}: {e}", file=sys.stderr)
         sys.exit(1)
 
 
+# ---------- 批量模式 ----------
+
+
+def run_batch(args: argparse.Namespace) -> None:
+    """批量分析：每个文件完成后立即输出一行 NDJSON（完成顺序），可选输出合并排序表。"""
+    if args.dir:
+        paths = discover_files(Path(args.dir))
+    elif args.glob:
+        paths = dedupe_formats(Path(p) for p in glob.glob(args.glob, recursive=True))
+    else:
+        paths = store_files(OUTPUT_DIR)
+    if not paths:
+        print("No data files found.", file=sys.stderr)
+        sys.exit(1)
+
+    records: List[Dict[str, Any]] = []
+    for record in analyze_many(paths, args.volatility, args.workers, args.recompute):
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+        records.append(record)
+
+    failed = sum(1 for record in records if "error" in record)
+    if args.sort_by:
+        print(format_table(records, args.sort_by), file=sys.stderr)
+    print(f"Analyzed {len(records) - failed} file(s), {failed} failed.", file=sys.stderr)
+    if failed == len(records):
+        sys.exit(1)
+
+
+def analyze_path(path: str, volatility: bool = False, recompute: bool = False) -> Dict[str, Any]:
+    """分析单个数据文件（在工作进程中执行，优先读取 sidecar），失败时返回带 error 的记录。"""
+    # 输出路径为 data/{exchange}/{symbol}/{interval}/...，用于合并表中标识序列
+    folder = Path(path).parent
+    record: Dict[str, Any] = {"file": path, "symbol": folder.parent.name, "interval": folder.name}
+    try:
+        analysis = analyze_file_cached(Path(path), refresh=recompute)
+        record["summary"] = analysis["summary"]
+        if volatility:
+            record["volatility_analysis"] = analysis["volatility_analysis"]
+    except Exception as exc:
+        record["error"] = str(exc)
+    return record
+
+
+def analyze_many(
+    paths: List[Path], volatility: bool, workers: int, recompute: bool = False
+) -> Iterable[Dict[str, Any]]:
+    """按完成顺序产出各文件的分析结果；只有一个文件或一个 worker 时不启动进程池。"""
+    workers = max(1, min(workers, len(paths)))
+    if workers == 1:
+        for path in paths:
+            yield analyze_path(str(path), volatility, recompute)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(analyze_path, str(path), volatility, recompute) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def is_data_file(path: Path) -> bool:
+    """fetch_klines 的输出文件；以 _ 开头的状态类文件和目录（快照、缓存等）不算。"""
+    return path.suffix in DATA_SUFFIXES and not path.name.startswith("_")
+
+
+def dedupe_formats(paths: Iterable[Path]) -> List[Path]:
+    """--format both 时同一份数据有 .json 与 .klb 两个文件，只保留读取更快的 .klb。"""
+    chosen: Dict[Path, Path] = {}
+    for path in paths:
+        if not path.is_file() or not is_data_file(path):
+            continue
+        key = path.with_suffix("")
+        if key not in chosen or path.suffix == COLUMN_FILE_SUFFIX:
+            chosen[key] = path
+    return sorted(chosen.values())
+
+
+def discover_files(root: Path) -> List[Path]:
+    """递归查找 root 下的数据文件，跳过以 _ 开头的目录（_snapshot、_cache 等）。"""
+    paths = []
+    for folder, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith("_")]
+        paths.extend(Path(folder) / name for name in filenames)
+    return dedupe_formats(paths)
+
+
+def store_files(root: Path) -> List[Path]:
+    """按 data/{exchange}/{symbol}/{interval}/_freshness.json 中记录的最新输出文件列出全部序列。"""
+    paths = []
+    for record_path in sorted(root.glob(f"*/*/*/{FRESHNESS_FILENAME}")):
+        try:
+            output = json.loads(record_path.read_text(encoding="utf-8")).get("output")
+        except (OSError, ValueError):
+            continue
+        if output:
+            paths.append(Path(output))
+    return dedupe_formats(paths)
+
+
+def field_value(record: Dict[str, Any], field: str) -> Any:
+    """依次在 summary、summary.signals、volatility_analysis 中查找字段。"""
+    summary = record.get("summary") or {}
+    volatility = record.get("volatility_analysis") or {}
+    for source in (summary, summary.get("signals") or {}, volatility, volatility.get("volatility_analysis") or {}):
+        if field in source:
+            return source[field]
+    return None
+
+
+def sort_records(records: List[Dict[str, Any]], sort_by: List[str]) -> List[Dict[str, Any]]:
+    """按多个字段排序（稳定排序，从最后一个字段往前排）；缺失或非数值的排在最后。"""
+    ordered = [record for record in records if "error" not in record]
+    for spec in reversed(sort_by):
+        field, _, direction = spec.partition(":")
+        ascending = direction.lower() == "asc"
+
+        def key(record: Dict[str, Any], _field: str = field) -> tuple:
+            value = field_value(record, _field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return (1, 0.0)
+            return (0, value if ascending else -value)
+
+        ordered.sort(key=key)
+    return ordered
+
+
+def format_table(records: List[Dict[str, Any]], sort_by: List[str]) -> str:
+    fields = [spec.partition(":")[0] for spec in sort_by]
+    header = ["symbol", "interval", *fields]
+    rows = [
+        [
+            record["symbol"],
+            record["interval"],
+            *("" if field_value(record, field) is None else str(field_value(record, field)) for field in fields),
+        ]
+        for record in sort_records(records, sort_by)
+    ]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in [header, *rows]]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,90 @@
+"""
+在本地 K 线仓库上回测入场规则。
+
+读取 fetch_klines 维护的 data/{exchange}/{symbol}/{interval}/_store.ndjson 完整序列，
+计算指标与每根 K 线的信号列后，按 ATR 止损/止盈模拟成交（扣除手续费与资金费），
+输出胜率、期望、盈亏比、最大回撤等统计。多条 --rule 共用同一份指标与信号。
+
+    python scripts/backtest.py --symbol BTCUSDT --interval 15m --rule macd_cross squeeze_breakout
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from crypto_analyzer.analysis.backtest import ENTRY_RULES, BacktestConfig, backtest_store
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="在本地 K 线仓库上回测入场规则（ATR 止损/止盈）")
+    parser.add_argument("--exchange", choices=["binance", "okx"], default="binance", help="交易所，默认 binance")
+    parser.add_argument("--symbol", required=True, help="交易对，如 BTCUSDT")
+    parser.add_argument("--interval", default="15m", help="K 线周期，默认 15m")
+    parser.add_argument(
+        "--rule",
+        nargs="+",
+        choices=list(ENTRY_RULES),
+        default=["macd_cross"],
+        help="入场规则，可指定多个，默认 macd_cross",
+    )
+    parser.add_argument(
+        "--direction", choices=["both", "long", "short"], default="both", help="只做多 / 只做空，默认双向"
+    )
+    parser.add_argument("--stop-atr", type=float, default=1.5, help="止损距离（ATR 倍数），默认 1.5")
+    parser.add_argument("--target-atr", type=float, default=3.0, help="止盈距离（ATR 倍数），默认 3.0")
+    parser.add_argument("--max-bars", type=int, default=48, help="最长持仓 K 线数，默认 48")
+    parser.add_argument("--fee-bps", type=float, default=4.0, help="单边手续费（基点），默认 4")
+    parser.add_argument(
+        "--funding-rate", type=float, default=0.0001, help="每 8 小时资金费率（多头支付为正），默认 0.0001"
+    )
+    parser.add_argument("--lookback", type=int, default=20, help="波动率状态的回看窗口，默认 20")
+    parser.add_argument("--trades", action="store_true", help="输出逐笔成交明细")
+    parser.add_argument("--output", help="结果写入该文件，默认打印到标准输出")
+    parser.add_argument("--pretty", action="store_true", help="缩进输出 JSON（默认紧凑格式）")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    started = time.monotonic()
+    try:
+        config = BacktestConfig(
+            stop_atr=args.stop_atr,
+            target_atr=args.target_atr,
+            max_bars=args.max_bars,
+            fee_rate=args.fee_bps / 10000,
+            funding_rate=args.funding_rate,
+            direction=args.direction,
+        )
+        results = backtest_store(
+            args.exchange, args.symbol, args.interval, args.rule, config, args.lookback
+        )
+    except ValueError as exc:
+        print(f"执行失败：{exc}", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.trades:
+        for result in results:
+            result.pop("trades")
+    document = {"results": results, "elapsed_seconds": round(time.monotonic() - started, 3)}
+    text = json.dumps(
+        document,
+        ensure_ascii=False,
+        indent=2 if args.pretty else None,
+        separators=None if args.pretty else (",", ":"),
+    )
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+        print(f"回测结果已写入 {args.output}。", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
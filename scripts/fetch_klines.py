@@ -15,9 +15,12 @@ AI助手说明：如果你是AI助手，请查看 README.md 中的\"🤖 AI 助
 
 import argparse
 import asyncio
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import httpx
 
@@ -32,7 +35,6 @@ from crypto_analyzer.data.fetchers.binance import (
     fetch_binance_klines_async,
     fetch_binance_open_interest_async,
     fetch_binance_order_book_async,
-    list_binance_symbols,
 )
 from crypto_analyzer.data.fetchers.okx import (
     fetch_okx_24hr_ticker_async,
@@ -41,10 +43,37 @@ from crypto_analyzer.data.fetchers.okx import (
     fetch_okx_klines_async,
     fetch_okx_open_interest_async,
     fetch_okx_order_book_async,
-    list_okx_symbols,
 )
-from crypto_analyzer.analysis.indicators import calculate_indicators
-from crypto_analyzer.core.storage import build_output_path, save_json
+from crypto_analyzer.data.fetchers.catalog import load_symbol_catalog_async, wait_for_catalog_refresh
+from crypto_analyzer.data.fetchers.history import PAGE_SIZES, fetch_klines_range_async
+from crypto_analyzer.data.fetchers.universe import MarketUniverse, fetch_universe_async
+from crypto_analyzer.analysis.indicator_state import build_indicator_frame, sync_store_state
+from crypto_analyzer.analysis.sidecar import compute_analysis, write_sidecar
+from crypto_analyzer.core.backfill import BackfillCheckpoint, parse_time, plan_windows
+from crypto_analyzer.core.freshness import plan_refresh, record_fetch
+from crypto_analyzer.core.intervals import interval_to_ms
+from crypto_analyzer.core.kline_frame import KlineFrame
+from crypto_analyzer.core.kline_store import (
+    KlineStore,
+    contiguous_suffix,
+    delta_fetch_limit,
+    merge_klines,
+    missing_ranges,
+)
+from crypto_analyzer.core.rate_limiter import rate_limit_headroom
+from crypto_analyzer.core.response_cache import cached_client_options, response_cache
+from crypto_analyzer.core.resample import base_bars_needed, interval_tz_offset
+from crypto_analyzer.core.scheduler import (
+    BatchProgress,
+    ExecutorStage,
+    run_in_stage,
+    run_worker_pool,
+)
+from crypto_analyzer.core.storage import (
+    build_output_path,
+    save_binary,
+    save_json,
+)
 
 
 def parse_args() -> argparse.Namespace:
@@ -65,7 +94,12 @@ def parse_args() -> argparse.Namespace:
         help="交易对列表：单个如 BTCUSDT，多个用逗号或空格分隔，或使用 ALL 表示遍历所有合约",
     )
     parser.add_argument("--interval", nargs="+", default=["1h"], help="K线周期（如 1m, 5m, 1h, 1d），默认 1h，支持多周期")
-    parser.add_argument("--limit", type=int, default=100, help="拉取条数（最大 1500），默认 100")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=100,
+        help="拉取条数，默认 100；超过单次请求上限（Binance 1500 / OKX 300）的部分从本地仓库读取，需先用 --start 回填",
+    )
     parser.add_argument(
         "--max-symbols",
         type=int,
@@ -85,6 +119,60 @@ def parse_args() -> argparse.Namespace:
         default="SWAP",
         help="OKX 批量模式的合约类型，默认 SWAP",
     )
+    parser.add_argument(
+        "--format",
+        choices=["json", "binary", "both"],
+        default="json",
+        help="输出格式：json（默认）、binary（.klb 二进制列文件，可 mmap 按需读取尾部）或 both",
+    )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="忽略本地 K 线仓库，完整拉取 --limit 条（默认只增量拉取仓库高水位之后的 K 线）",
+    )
+    parser.add_argument(
+        "--max-stale",
+        type=float,
+        default=60.0,
+        help="距上次拉取不超过该秒数且期间没有 K 线收盘时直接沿用已有文件，默认 60；"
+        "0 表示总是刷新，设为很大的值则只在 K 线收盘后才重新拉取",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 data/_cache 中的响应缓存（订单簿 2 秒、行情 30 秒、合约列表 1 小时）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="批量模式下同时处理的交易对数量（worker 数），默认 8",
+    )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="计算指标的进程数，默认 CPU 核数",
+    )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=4,
+        help="读写文件（仓库、JSON/.klb 输出）的线程数，默认 4",
+    )
+    parser.add_argument(
+        "--base-interval",
+        help="只拉取该周期（如 15m）的 K 线，其余 --interval 周期由它在本地重采样得到；"
+        "较粗周期需要的历史超过单次请求时请先用 --start 回填该周期",
+    )
+    parser.add_argument(
+        "--start",
+        help="回填模式：从该时间起分页拉取历史 K 线写入本地仓库（如 2024-01-01、2024-01-01T08:00 或毫秒时间戳，UTC）",
+    )
+    parser.add_argument(
+        "--end",
+        help="回填结束时间，格式同 --start，默认当前时间",
+    )
     parser.add_argument(
         "--price-only",
         action="store_true",
@@ -111,48 +199,190 @@ def main() -> None:
 
 
 async def _async_main(args: argparse.Namespace) -> None:
-    async with httpx.AsyncClient() as client:
-        if args.price_only:
-            await _run_price_only(args, client)
-            return
-
-        symbols = resolve_symbols(args)
-        intervals = resolve_intervals(args)
-
-        tasks = []
-        for symbol in symbols:
-            for interval in intervals:
-                tasks.append(
-                    _run_full_task(
-                        client=client,
-                        exchange=args.exchange,
-                        symbol=symbol,
-                        interval=interval,
-                        limit=args.limit,
-                    )
-                )
+    async with httpx.AsyncClient(**cached_client_options(enabled=not args.no_cache)) as client:
+        try:
+            if args.price_only:
+                await _run_price_only(args, client)
+            elif args.start:
+                await _run_backfill(args, client)
+            else:
+                await _run_klines(args, client)
+        finally:
+            # 交易对目录过期时在后台刷新，退出前等它写盘
+            await wait_for_catalog_refresh()
+
+
+async def _run_klines(args: argparse.Namespace, client: httpx.AsyncClient) -> None:
+    symbols = await resolve_symbols(client, args)
+    intervals = resolve_intervals(args)
+    if args.base_interval and not interval_to_ms(args.base_interval):
+        raise ValueError(f"--base-interval 必须是固定长度的周期：{args.base_interval}")
+
+    # ALL 模式下 24h 行情/资金费率/最新价格（OKX 含持仓量）用全市场接口一次拉取
+    universe = None
+    if is_all_symbols(args):
+        try:
+            universe = await fetch_universe_async(client, args.exchange, args.inst_type or "SWAP")
+        except (httpx.HTTPError, ValueError) as exc:
+            print(f"全市场批量接口获取失败，改为逐个交易对请求：{exc}", file=sys.stderr)
+
+    # 按交易对分组：行情/资金费率/持仓量/订单簿每个交易对只拉一次，K 线按周期分别拉取。
+    # 固定数量的 worker 流式处理，每个交易对完成即写盘，内存只与 worker 数有关
+    progress = BatchProgress(len(symbols))
+    successes = 0
+    failures: List[str] = []
+
+    # 流水线：网络 I/O 在事件循环，指标计算在进程池，文件读写在线程池；
+    # 各阶段在途任务有上限，下游饱和时 worker 停止拉取新数据。单个任务时不值得启动进程池
+    cpu_stage = io_stage = None
+    if len(symbols) * len(intervals) > 1:
+        cpu_stage = ExecutorStage(
+            ProcessPoolExecutor(max_workers=args.cpu_workers), max_pending=args.cpu_workers * 2
+        )
+        io_stage = ExecutorStage(
+            ThreadPoolExecutor(max_workers=args.io_workers), max_pending=args.io_workers * 2
+        )
+
+    async def handle(symbol: str) -> List[Tuple[bool, str]]:
+        return await _run_symbol_task(
+            client=client,
+            exchange=args.exchange,
+            symbol=symbol,
+            intervals=intervals,
+            limit=args.limit,
+            full_refresh=args.full_refresh,
+            output_format=args.format,
+            universe=universe,
+            cpu_stage=cpu_stage,
+            io_stage=io_stage,
+            base_interval=args.base_interval,
+            max_stale=args.max_stale,
+        )
 
-        results: List[Tuple[bool, str]] = []
-        if tasks:
-            results = await asyncio.gather(*tasks)
+    def on_result(symbol: str, results: List[Tuple[bool, str]], latency: float) -> None:
+        nonlocal successes
+        successes += sum(1 for ok, _ in results if ok)
+        failures.extend(msg for ok, msg in results if not ok and msg)
+        progress.record(latency, ok=all(ok for ok, _ in results))
+        if len(symbols) > 1:
+            print(f"{progress.render()} {symbol} 用时 {latency:.2f}s")
 
-        successes = sum(1 for ok, _ in results if ok)
-        failures: List[str] = [msg for ok, msg in results if not ok and msg]
+    try:
+        await run_worker_pool(symbols, handle, workers=args.workers, on_result=on_result)
+    finally:
+        for stage in (cpu_stage, io_stage):
+            if stage is not None:
+                stage.shutdown()
+
+    if successes == 0:
+        print("所有任务处理失败，请检查参数或网络。", file=sys.stderr)
+        sys.exit(1)
 
-        if successes == 0:
-            print("所有任务处理失败，请检查参数或网络。", file=sys.stderr)
-            sys.exit(1)
+    if len(symbols) * len(intervals) > 1:
+        print(f"\n批量完成：成功 {successes} 个，失败 {len(failures)} 个。")
+        stats = progress.summary()
+        print(
+            f"耗时：共 {stats['elapsed']} 秒，{stats['throughput']} 个交易对/秒；"
+            f"单个交易对 p50 {stats['p50']}s / p90 {stats['p90']}s / "
+            f"p99 {stats['p99']}s / max {stats['max']}s（--workers {args.workers}）。"
+        )
+        headroom = (await asyncio.to_thread(rate_limit_headroom))[args.exchange]
+        print(
+            f"限速：剩余权重 {headroom['weight']}，服务端已用 {headroom['used_weight_1m']}，"
+            f"累计等待 {headroom['waited_seconds']} 秒。"
+        )
+        if not args.no_cache:
+            cache = response_cache.stats()
+            print(
+                f"响应缓存：命中 {cache['hits']}（内存 {cache['memory_hits']} / 磁盘 {cache['disk_hits']}），"
+                f"旧值 {cache['stale_hits']}，未命中 {cache['misses']}，命中率 {cache['hit_ratio']:.0%}。"
+            )
+        if failures:
+            print("失败详情：")
+            for item in failures:
+                print(f"  - {item}")
+
+
+async def _run_backfill(args: argparse.Namespace, client: httpx.AsyncClient) -> None:
+    symbols = await resolve_symbols(client, args)
+    intervals = resolve_intervals(args)
+    start_ms = parse_time(args.start)
+    end_ms = parse_time(args.end) if args.end else int(time.time() * 1000)
+
+    failures: List[str] = []
+    for symbol in symbols:
+        for interval in intervals:
+            try:
+                added = await backfill_klines(
+                    client, args.exchange, symbol, interval, start_ms, end_ms, args.workers
+                )
+            except _TASK_ERRORS as exc:
+                print(f"[{symbol} - {interval}] 回填失败：{exc}", file=sys.stderr)
+                failures.append(f"{symbol} ({interval}): {exc}")
+                continue
+            print(f"[{symbol} - {interval}] 回填完成，新增 {added} 根 K 线。")
+
+    if failures and len(failures) == len(symbols) * len(intervals):
+        print("所有回填任务失败，请检查参数或网络。", file=sys.stderr)
+        sys.exit(1)
+    if failures:
+        print("失败详情（重新运行相同命令会从断点继续）：")
+        for item in failures:
+            print(f"  - {item}")
 
-        if len(symbols) * len(intervals) > 1:
-            print(f"\n批量完成：成功 {successes} 个，失败 {len(failures)} 个。")
-            if failures:
-                print("失败详情：")
-                for item in failures:
-                    print(f"  - {item}")
+
+async def backfill_klines(
+    client: httpx.AsyncClient,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    start_ms: int,
+    end_ms: int,
+    concurrency: int = 8,
+) -> int:
+    """
+    把 [start_ms, end_ms] 的历史 K 线分页拉取并写入本地仓库，返回新增的 K 线数量。
+
+    每批并发拉取 concurrency 个窗口，按 open_time 去重后一次性合并入仓库，
+    再更新检查点；中断后以相同参数重新运行会跳过已提交的窗口。
+    """
+    store = KlineStore(exchange, symbol, interval)
+    checkpoint = BackfillCheckpoint(store.path.parent, interval, start_ms, end_ms)
+    resume = checkpoint.resume_from()
+    if resume is not None:
+        if resume > end_ms:
+            # 上次已提交到本次终点之后（如这次指定了更早的 --end）
+            checkpoint.clear()
+            return 0
+        print(f"[{symbol} - {interval}] 从断点 {resume} 继续回填。")
+    windows = plan_windows(
+        start_ms if resume is None else resume, end_ms, interval, PAGE_SIZES[exchange]
+    )
+
+    progress = BatchProgress(len(windows))
+    added = 0
+    for offset in range(0, len(windows), concurrency):
+        batch = windows[offset : offset + concurrency]
+        started = time.monotonic()
+        pages = await asyncio.gather(
+            *(
+                fetch_klines_range_async(client, exchange, symbol, interval, start, end)
+                for start, end in batch
+            )
+        )
+        records = {int(r["open_time"]): r for page in pages for r in page}
+        added += await asyncio.to_thread(store.merge, records.values())
+        checkpoint.commit(batch[-1][1] + 1, added)
+        latency = (time.monotonic() - started) / len(batch)
+        for _ in batch:
+            progress.record(latency)
+        print(f"[{symbol} - {interval}] 回填 {progress.render()}，新增 {added} 根")
+    checkpoint.clear()
+    return added
 
 
 async def _run_price_only(args: argparse.Namespace, client: httpx.AsyncClient) -> None:
-    symbols = resolve_symbols(args)
+    symbols = await resolve_symbols(client, args)
 
     async def _worker(symbol: str) -> None:
         try:
@@ -175,82 +405,302 @@ async def _run_price_only(args: argparse.Namespace, client: httpx.AsyncClient) -
     await asyncio.gather(*(_worker(symbol) for symbol in symbols))
 
 
-async def _run_full_task(
+_TASK_ERRORS = (httpx.HTTPError, ValueError, KeyError)
+
+
+async def _run_symbol_task(
     client: httpx.AsyncClient,
     exchange: str,
     symbol: str,
-    interval: str,
+    intervals: List[str],
     limit: int,
-) -> Tuple[bool, str]:
-    try:
-        output_data = await collect_snapshot_async(client, exchange, symbol, interval, limit)
-        output_path = build_output_path(exchange, symbol, interval, output_data["klines"])
-        save_json(output_data, output_path)
+    full_refresh: bool = False,
+    output_format: str = "json",
+    universe: Optional[MarketUniverse] = None,
+    cpu_stage: Optional[ExecutorStage] = None,
+    io_stage: Optional[ExecutorStage] = None,
+    base_interval: Optional[str] = None,
+    max_stale: Optional[float] = None,
+) -> List[Tuple[bool, str]]:
+    """
+    处理单个交易对的全部周期：交易对级数据拉取一次，分发到每个周期的输出文件。
+
+    网络请求留在事件循环上；指标计算交给 cpu_stage（进程池），
+    仓库读写与文件序列化交给 io_stage（线程池）。
+    指定 base_interval 时只拉取这一个周期的 K 线，其余周期在本地重采样得到。
+    max_stale 不为 None 时按 K 线收盘时间判断新鲜度，上次拉取后尚未收盘的周期
+    直接沿用已有文件；全部周期都无需刷新时不发出任何请求。
+    """
+    results: List[Tuple[bool, str]] = []
+    if max_stale is not None and not full_refresh:
+        pending: List[str] = []
+        for interval in intervals:
+            plan = plan_refresh(exchange, symbol, interval, limit, output_format, max_stale)
+            if plan.action != "skip":
+                pending.append(interval)
+                continue
+            next_close = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(plan.next_close_ms / 1000))
+            print(f"[{symbol} - {interval}] {plan.reason}（下次收盘 {next_close}），沿用 {plan.output_path}")
+            results.append((True, ""))
+        if not pending:
+            return results
+        intervals = pending
+
+    if base_interval:
+        klines_job = collect_resampled_klines_async(
+            client, exchange, symbol, base_interval, intervals, limit, full_refresh, cpu_stage, io_stage
+        )
+    else:
+        klines_job = asyncio.gather(
+            *(
+                collect_klines_async(
+                    client, exchange, symbol, interval, limit, full_refresh, cpu_stage, io_stage
+                )
+                for interval in intervals
+            ),
+            return_exceptions=True,
+        )
+    market_data, enriched = await asyncio.gather(
+        collect_market_data_async(client, exchange, symbol, universe),
+        klines_job,
+        return_exceptions=True,
+    )
+    if isinstance(enriched, BaseException):
+        enriched = [enriched] * len(intervals)
+
+    for interval, item in zip(intervals, enriched):
+        error = market_data if isinstance(market_data, BaseException) else item
+        if isinstance(error, BaseException):
+            if not isinstance(error, _TASK_ERRORS):
+                raise error
+            print(f"[{symbol} - {interval}] 处理失败：{error}", file=sys.stderr)
+            results.append((False, f"{symbol} ({interval}): {error}"))
+            continue
+        frame = item
+        try:
+            output_data = {"exchange": exchange, "klines": frame, **market_data}
+            output_path = await run_in_stage(
+                io_stage, write_snapshot, exchange, symbol, interval, output_data, output_format
+            )
+            await run_in_stage(
+                io_stage, record_fetch, exchange, symbol, interval, output_path, limit, output_format
+            )
+        except _TASK_ERRORS as exc:
+            print(f"[{symbol} - {interval}] 处理失败：{exc}", file=sys.stderr)
+            results.append((False, f"{symbol} ({interval}): {exc}"))
+            continue
         print(
-            f"[{symbol} - {interval}] 已写入 {output_path}，K线 {len(output_data['klines'])} 条。"
+            f"[{symbol} - {interval}] 已写入 {output_path}，K线 {len(frame)} 条。"
             " 24小时统计、资金费率、持仓量、最新价格和订单簿深度已包含。"
         )
-        return True, ""
-    except (httpx.HTTPError, ValueError, KeyError) as exc:
-        msg = f"{symbol} ({interval}): {exc}"
-        print(f"[{symbol} - {interval}] 处理失败：{exc}", file=sys.stderr)
-        return False, msg
+        results.append((True, ""))
+    return results
 
 
-async def collect_snapshot_async(
-    client: httpx.AsyncClient,
+def write_snapshot(
     exchange: str,
     symbol: str,
     interval: str,
-    limit: int,
+    output_data: dict,
+    output_format: str = "json",
+) -> Path:
+    """
+    按输出格式写入单个周期的数据文件，返回最后写入的数据文件路径。
+
+    摘要与波动率分析在这里算一次，写入同目录的 _summary.json（见 analysis.sidecar），
+    analyze_file 直接读取，不再重复解析数据文件。
+    """
+    frame: KlineFrame = output_data["klines"]
+    written: List[Path] = []
+    if output_format in ("binary", "both"):
+        output_path = build_output_path(exchange, symbol, interval, frame, suffix=".klb")
+        save_binary(output_data, output_path)
+        written.append(output_path)
+    if output_format in ("json", "both"):
+        output_path = build_output_path(exchange, symbol, interval, frame)
+        # 仅在写 JSON 时转换回 list-of-dicts（最新在前）
+        save_json({**output_data, "klines": frame.to_records()}, output_path)
+        written.append(output_path)
+    analysis = compute_analysis(output_data)
+    for path in written:
+        write_sidecar(path, analysis)
+    return output_path
+
+
+MARKET_FIELDS = ("ticker_24hr", "funding_rate", "open_interest", "current_price", "order_book")
+
+
+async def collect_market_data_async(
+    client: httpx.AsyncClient,
+    exchange: str,
+    symbol: str,
+    universe: Optional[MarketUniverse] = None,
 ) -> dict:
+    """
+    拉取与周期无关的交易对级数据（24h 统计、资金费率、持仓量、最新价格、订单簿）。
+
+    传入 universe（全市场批量接口的结果）时，其中已有的字段直接复用，
+    只为缺失的字段（订单簿、Binance 持仓量等）发起单交易对请求。
+    """
     if exchange == "binance":
-        (
-            records,
-            ticker_24hr,
-            funding_rate,
-            open_interest,
-            current_price,
-            order_book,
-        ) = await asyncio.gather(
-            fetch_binance_klines_async(client, symbol, interval, limit),
-            fetch_binance_24hr_ticker_async(client, symbol),
-            fetch_binance_funding_rate_async(client, symbol),
-            fetch_binance_open_interest_async(client, symbol),
-            fetch_binance_current_price_async(client, symbol),
-            fetch_binance_order_book_async(client, symbol),
-        )
+        fetchers = {
+            "ticker_24hr": fetch_binance_24hr_ticker_async,
+            "funding_rate": fetch_binance_funding_rate_async,
+            "open_interest": fetch_binance_open_interest_async,
+            "current_price": fetch_binance_current_price_async,
+            "order_book": fetch_binance_order_book_async,
+        }
     else:
-        (
-            records,
-            ticker_24hr,
-            funding_rate,
-            open_interest,
-            current_price,
-            order_book,
-        ) = await asyncio.gather(
-            fetch_okx_klines_async(client, symbol, interval, limit),
-            fetch_okx_24hr_ticker_async(client, symbol),
-            fetch_okx_funding_rate_async(client, symbol),
-            fetch_okx_open_interest_async(client, symbol),
-            fetch_okx_current_price_async(client, symbol),
-            fetch_okx_order_book_async(client, symbol),
-        )
-
+        fetchers = {
+            "ticker_24hr": fetch_okx_24hr_ticker_async,
+            "funding_rate": fetch_okx_funding_rate_async,
+            "open_interest": fetch_okx_open_interest_async,
+            "current_price": fetch_okx_current_price_async,
+            "order_book": fetch_okx_order_book_async,
+        }
+
+    known = (universe or {}).get(symbol, {})
+    missing = [field for field in MARKET_FIELDS if field not in known]
+    fetched = await asyncio.gather(*(fetchers[field](client, symbol) for field in missing))
+    data = {**known, **dict(zip(missing, fetched))}
+    return {field: data[field] for field in MARKET_FIELDS}
+
+
+async def collect_klines_async(
+    client: httpx.AsyncClient,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    limit: int,
+    full_refresh: bool = False,
+    cpu_stage: Optional[ExecutorStage] = None,
+    io_stage: Optional[ExecutorStage] = None,
+) -> KlineFrame:
+    """增量拉取单个周期的 K 线，返回带指标的 KlineFrame。"""
+    records = await fetch_klines_incremental(
+        client, exchange, symbol, interval, limit, full_refresh, io_stage
+    )
     if not records:
         raise ValueError("未获取到任何数据，请检查交易对和参数。")
+    return await run_in_stage(cpu_stage, build_indicator_frame, records)
 
-    records_with_indicators = calculate_indicators(records)
 
-    return {
-        "exchange": exchange,
-        "klines": records_with_indicators,
-        "ticker_24hr": ticker_24hr,
-        "funding_rate": funding_rate,
-        "open_interest": open_interest,
-        "current_price": current_price,
-        "order_book": order_book,
-    }
+async def collect_resampled_klines_async(
+    client: httpx.AsyncClient,
+    exchange: str,
+    symbol: str,
+    base_interval: str,
+    intervals: List[str],
+    limit: int,
+    full_refresh: bool = False,
+    cpu_stage: Optional[ExecutorStage] = None,
+    io_stage: Optional[ExecutorStage] = None,
+) -> list:
+    """
+    只增量拉取一次 base_interval 的 K 线，重采样出每个周期最近 limit 根并计算指标。
+
+    返回与 intervals 一一对应的 KlineFrame 或异常（单个周期失败不影响其他周期）。
+    基础 K 线超过单次请求上限的部分只能来自本地仓库（见 --start 回填）；仓库覆盖不了
+    limit 根目标周期时（如 15m 重采样 1d），该周期改为直接拉取并在 stderr 提示，
+    不会截短输出，也不会为此每次都按上限重新下载基础 K 线。
+    """
+    needs = {interval: base_bars_needed(base_interval, interval, limit) or limit for interval in intervals}
+    store = KlineStore(exchange, symbol, base_interval)
+    stored = 0 if full_refresh else len(await run_in_stage(io_stage, store.tail, max(needs.values())))
+    coverable = max(stored, MAX_KLINES_PER_REQUEST[exchange])
+    resampled = [interval for interval in intervals if needs[interval] <= coverable]
+
+    records: List[dict] = []
+    if resampled:
+        records = await fetch_klines_incremental(
+            client, exchange, symbol, base_interval, max(needs[i] for i in resampled), full_refresh, io_stage
+        )
+        if not records:
+            raise ValueError("未获取到任何数据，请检查交易对和参数。")
+    # 只转换一次列存储，送往进程池时按数组序列化，比逐周期传 list-of-dicts 便宜得多
+    base_frame = KlineFrame.from_records(records)
+
+    def job(interval: str):
+        if len(records) >= needs[interval]:
+            return run_in_stage(
+                cpu_stage,
+                build_indicator_frame,
+                base_frame,
+                base_interval,
+                interval,
+                limit,
+                interval_tz_offset(exchange, interval),
+            )
+        print(
+            f"[{symbol} - {interval}] 本地 {base_interval} K 线不足 {needs[interval]} 根"
+            f"（现有 {len(records) or stored} 根），改为直接拉取 {interval}；可用 --start 回填基础周期",
+            file=sys.stderr,
+        )
+        return collect_klines_async(
+            client, exchange, symbol, interval, limit, full_refresh, cpu_stage, io_stage
+        )
+
+    return await asyncio.gather(*(job(interval) for interval in intervals), return_exceptions=True)
+
+
+# 常规 K 线接口单次请求的最大条数
+MAX_KLINES_PER_REQUEST = {"binance": 1500, "okx": 300}
+
+
+async def fetch_klines_incremental(
+    client: httpx.AsyncClient,
+    exchange: str,
+    symbol: str,
+    interval: str,
+    limit: int,
+    full_refresh: bool = False,
+    io_stage: Optional[ExecutorStage] = None,
+) -> List[dict]:
+    """
+    基于本地 K 线仓库增量拉取：只请求仓库高水位之后的 K 线，
+    合并入仓库后返回最近 limit 根（正序），并同步仓库旁的全量指标状态（sync_store_state）。
+
+    limit 超过单次请求上限时，一次请求补不到仓库中的缺口；此时按时间范围补齐
+    最近 limit 个周期内缺失的 K 线，交易所也没有的（如上线前、停盘）则只返回
+    最后一个缺口之后的连续部分并在 stderr 提示，不跨缺口计算指标。
+    """
+    store = KlineStore(exchange, symbol, interval)
+    cached = [] if full_refresh else await run_in_stage(io_stage, store.tail, limit)
+    # 单次请求有上限，超出的部分只能来自仓库（回填数据）
+    fetch_limit = min(delta_fetch_limit(cached, interval, limit), MAX_KLINES_PER_REQUEST[exchange])
+    if exchange == "binance":
+        fresh = await fetch_binance_klines_async(client, symbol, interval, fetch_limit)
+    else:
+        fresh = await fetch_okx_klines_async(client, symbol, interval, fetch_limit)
+    if not fresh:
+        return []
+    await run_in_stage(io_stage, store.merge, fresh)
+    records = merge_klines(cached, fresh, limit)
+    interval_ms = interval_to_ms(interval)
+    if not interval_ms:
+        await run_in_stage(io_stage, sync_store_state, store)
+        return records
+    gaps = missing_ranges(records, interval_ms, limit)
+    if gaps:
+        pages = await asyncio.gather(
+            *(
+                fetch_klines_range_async(client, exchange, symbol, interval, start, end)
+                for gap_start, gap_end in gaps
+                for start, end in plan_windows(gap_start, gap_end, interval, PAGE_SIZES[exchange])
+            )
+        )
+        filled = [record for page in pages for record in page]
+        if filled:
+            await run_in_stage(io_stage, store.merge, filled)
+            records = merge_klines(records, filled, limit)
+    await run_in_stage(io_stage, sync_store_state, store)
+    contiguous = contiguous_suffix(records, interval_ms)
+    if len(contiguous) < len(records):
+        print(
+            f"[{symbol} - {interval}] K 线存在交易所也无法补齐的缺口，只使用最近连续的 {len(contiguous)} 根",
+            file=sys.stderr,
+        )
+    return contiguous
 
 
 def resolve_intervals(args: argparse.Namespace) -> List[str]:
@@ -272,7 +722,7 @@ def resolve_intervals(args: argparse.Namespace) -> List[str]:
     return list(set(intervals))  # 去重
 
 
-def resolve_symbols(args: argparse.Namespace) -> List[str]:
+async def resolve_symbols(client: httpx.AsyncClient, args: argparse.Namespace) -> List[str]:
     """根据 CLI 参数确定需要处理的交易对列表。"""
     raw_list = args.symbols
     if not raw_list:
@@ -296,7 +746,7 @@ def resolve_symbols(args: argparse.Namespace) -> List[str]:
 
     # 检查是否有 ALL
     if any(s.upper() == "ALL" for s in symbols_candidates):
-        symbols = list_all_symbols(args)
+        symbols = await list_all_symbols(client, args)
     else:
         symbols = [normalize_symbol(s, args.exchange) for s in symbols_candidates]
 
@@ -306,21 +756,22 @@ def resolve_symbols(args: argparse.Namespace) -> List[str]:
     return symbols
 
 
-def list_all_symbols(args: argparse.Namespace) -> List[str]:
-    """列出指定交易所的全部交易对，供批量模式使用。"""
+def is_all_symbols(args: argparse.Namespace) -> bool:
+    """--symbols 中是否包含 ALL（全市场批量模式）。"""
+    raw_list = [args.symbols] if isinstance(args.symbols, str) else args.symbols or []
+    return any(part.upper() == "ALL" for item in raw_list for part in item.replace(",", " ").split())
+
+
+async def list_all_symbols(client: httpx.AsyncClient, args: argparse.Namespace) -> List[str]:
+    """列出指定交易所的全部可交易合约，供批量模式使用（查询本地交易对目录）。"""
     quote_assets = normalize_symbol_list(args.quote, args.exchange) if args.quote else None
+    inst_type = args.inst_type.upper() if args.inst_type else "SWAP"
+    catalog = await load_symbol_catalog_async(client, args.exchange, inst_type)
 
     if args.exchange == "binance":
-        symbols = list_binance_symbols(
-            contract_type=args.contract_type.upper() if args.contract_type else "PERPETUAL",
-            quote_assets=quote_assets,
-        )
-    else:
-        symbols = list_okx_symbols(
-            inst_type=args.inst_type.upper() if args.inst_type else "SWAP",
-            quote_assets=quote_assets,
-        )
-    return [normalize_symbol(sym, args.exchange) for sym in symbols]
+        contract_type = args.contract_type.upper() if args.contract_type else "PERPETUAL"
+        return catalog.query(quote_assets=quote_assets, contract_type=contract_type)
+    return catalog.query(quote_assets=quote_assets)
 
 
 def normalize_symbol_list(symbols_text: str, exchange: str) -> List[str]:
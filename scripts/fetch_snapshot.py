@@ -2,30 +2,37 @@
 市场概况快照脚本。
 
 用途：
-- 通过轻量级接口一次性获取 Binance / OKX 所有合约的 24h 行情概况
+- 通过全市场批量接口一次性获取 Binance / OKX 所有合约的 24h 行情、资金费率与持仓量
+  （--exchange all 时两家交易所并发拉取，耗时约等于一次往返）
 - 支持按报价资产过滤，只保留 USDT 等主流计价
-- 自动计算成交量 Top N、涨幅榜、跌幅榜，供 AI 快速筛选候选交易对
+- 自动计算成交量 Top N、涨幅榜、跌幅榜、资金费率与持仓价值榜单，供 AI 快速筛选候选交易对
 
-生成的 JSON 保存在 `data/{exchange}/_snapshot/` 下，
+生成的 JSON 保存在 `data/{exchange}/_snapshot/` 下（两家合并的快照在 `data/_snapshot/`），
 AI 可以先阅读该文件挑选符号，再使用 `scripts/fetch_klines.py --symbols ...` 获取细节。
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
+import heapq
 import json
 import sys
-from datetime import datetime, timezone
+import time
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Sequence
 
-import requests
+import httpx
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from crypto_analyzer.core.config import BINANCE_BASE_URL, OKX_BASE_URL, OUTPUT_DIR
+from crypto_analyzer.core.config import OUTPUT_DIR
+from crypto_analyzer.core.response_cache import cached_client_options, response_cache
+from crypto_analyzer.core.snapshot_history import SnapshotHistory
+from crypto_analyzer.data.fetchers.universe import MarketUniverse, fetch_universe_async
 
 
 def parse_args() -> argparse.Namespace:
@@ -34,9 +41,9 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--exchange",
-        choices=["binance", "okx"],
+        choices=["binance", "okx", "all"],
         default="binance",
-        help="交易所：binance 或 okx",
+        help="交易所：binance、okx 或 all（两家并发拉取，生成一份合并快照）",
     )
     parser.add_argument(
         "--inst-type",
@@ -65,25 +72,42 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="在快照中包含完整 tickers 数据，默认仅保存过滤后的列表",
     )
+    parser.add_argument(
+        "--history-only",
+        action="store_true",
+        help="不发请求，只根据本地快照历史输出 5 分钟/1 小时涨跌、24h 成交额 1 小时变化与持仓变化榜单",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 data/_cache 中的响应缓存（行情、资金费率、持仓量默认缓存 30 秒）",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    asyncio.run(_async_main(args))
 
-    quote_assets = build_quote_filter(args.quote)
 
-    if args.exchange == "binance":
-        tickers = fetch_binance_tickers()
-        filtered = filter_binance_tickers(tickers, quote_assets, args.min_quote_volume)
-        summary = summarize_binance(filtered, args.top)
-    else:
-        tickers = fetch_okx_tickers(args.inst_type)
-        filtered = filter_okx_tickers(tickers, quote_assets, args.min_quote_volume)
-        summary = summarize_okx(filtered, args.top)
+async def _async_main(args: argparse.Namespace) -> None:
+    quote_assets = build_quote_filter(args.quote)
+    exchanges = EXCHANGES if args.exchange == "all" else (args.exchange,)
+    started = time.monotonic()
+    if args.history_only:
+        print_history_leaderboards(exchanges, quote_assets, args.top)
+        return
 
-    if args.include_raw:
-        summary["tickers"] = filtered
+    async with httpx.AsyncClient(**cached_client_options(enabled=not args.no_cache)) as client:
+        summary = await build_market_snapshot_async(
+            client,
+            exchanges,
+            inst_type=args.inst_type,
+            quote_assets=quote_assets,
+            min_quote_volume=args.min_quote_volume,
+            top=args.top,
+            include_raw=args.include_raw,
+        )
 
     summary["filters"] = {
         "quote_assets": sorted(quote_assets) if quote_assets else None,
@@ -92,180 +116,228 @@ def main() -> None:
     }
 
     output_path = save_snapshot(summary, args.exchange)
-    print(f"概况快照已写入 {output_path}，包含 {summary['total_symbols']} 个交易对。")
-
+    print(
+        f"概况快照已写入 {output_path}，包含 {summary['total_symbols']} 个交易对，"
+        f"用时 {time.monotonic() - started:.2f} 秒。"
+    )
+    if not args.no_cache:
+        cache = response_cache.stats()
+        print(f"响应缓存：命中 {cache['hits']}，旧值 {cache['stale_hits']}，未命中 {cache['misses']}。")
 
-# ---------- Binance ----------
 
+EXCHANGES = ("binance", "okx")
 
-def fetch_binance_tickers() -> List[Dict]:
-    response = requests.get(f"{BINANCE_BASE_URL}/fapi/v1/ticker/24hr", timeout=30)
-    response.raise_for_status()
-    data = response.json()
-    if not isinstance(data, list):
-        raise ValueError("Binance ticker 接口返回格式异常（应为列表）")
-    return data
 
+def print_history_leaderboards(
+    exchanges: Sequence[str], quote_assets: set[str] | None, top: int
+) -> None:
+    """只读本地快照历史，打印各交易所的变化榜单（JSON）。"""
+    boards = {}
+    for exchange in exchanges:
+        history = SnapshotHistory(exchange)
+        symbols = None
+        if quote_assets:
+            symbols = {s for s in history.symbols if quote_of(exchange, s, quote_assets) is not None}
+        boards[exchange] = history.leaderboards(top, symbols)
+    print(json.dumps(boards, indent=2, ensure_ascii=False))
+
+
+async def build_market_snapshot_async(
+    client: httpx.AsyncClient,
+    exchanges: Sequence[str],
+    inst_type: str = "SWAP",
+    quote_assets: set[str] | None = None,
+    min_quote_volume: float = 0.0,
+    top: int = 10,
+    include_raw: bool = False,
+) -> Dict:
+    """
+    并发拉取各交易所的全市场行情/资金费率/持仓量，过滤并排序后生成快照。
+
+    每个交易所的数据同时追加到快照历史，摘要中的 "history" 为相对历史快照的
+    涨跌、24h 成交额变化与持仓变化榜单。
+    单个交易所时返回该交易所的摘要；多个交易所时返回合并榜单，
+    各交易所的摘要放在 "exchanges" 下。多交易所时某一家失败只打印警告。
+    """
+    results = await asyncio.gather(
+        *(fetch_universe_async(client, exchange, inst_type) for exchange in exchanges),
+        return_exceptions=True,
+    )
 
-def filter_binance_tickers(
-    tickers: Sequence[Dict],
+    per_exchange: Dict[str, Dict] = {}
+    all_rows: List[Dict] = []
+    for exchange, universe in zip(exchanges, results):
+        if isinstance(universe, BaseException):
+            if len(exchanges) == 1 or not isinstance(universe, (httpx.HTTPError, ValueError)):
+                raise universe
+            print(f"[{exchange}] 全市场数据获取失败，已跳过：{universe}", file=sys.stderr)
+            continue
+        rows = build_rows(exchange, universe)
+        # 历史记录全部交易对（不受过滤参数影响），榜单只展示过滤后的部分
+        history = SnapshotHistory(exchange)
+        await asyncio.to_thread(history.append, history_rows(rows))
+        rows = filter_rows(exchange, rows, quote_assets, min_quote_volume)
+        summary = build_summary(exchange, rows, top)
+        summary["history"] = history.leaderboards(top, {row["symbol"] for row in rows})
+        if include_raw:
+            summary["tickers"] = rows
+        per_exchange[exchange] = summary
+        all_rows.extend(rows)
+
+    if len(exchanges) == 1:
+        return per_exchange[exchanges[0]]
+    if not per_exchange:
+        raise ValueError("所有交易所的全市场数据均获取失败")
+    combined = build_summary("all", all_rows, top)
+    combined["exchanges"] = per_exchange
+    return combined
+
+
+# ---------- 过滤 ----------
+
+
+def quote_of(exchange: str, symbol: str, quote_assets: set[str]) -> str | None:
+    """交易对的报价资产（仅在 quote_assets 中查找），不匹配时返回 None。"""
+    symbol = symbol.upper()
+    if exchange == "okx":
+        parts = symbol.split("-")
+        quote = parts[1] if len(parts) >= 2 else ""
+        return quote if quote in quote_assets else None
+    return next((q for q in quote_assets if symbol.endswith(q)), None)
+
+
+def filter_rows(
+    exchange: str,
+    rows: List[Dict],
     quote_assets: set[str] | None,
     min_quote_volume: float,
 ) -> List[Dict]:
-    filtered: List[Dict] = []
-    for entry in tickers:
-        symbol = entry.get("symbol", "")
-        if not symbol:
-            continue
-        if quote_assets and not any(symbol.upper().endswith(q) for q in quote_assets):
+    """按报价资产与 24h 成交额过滤。"""
+    return [
+        row
+        for row in rows
+        if (not quote_assets or quote_of(exchange, row["symbol"], quote_assets) is not None)
+        # 成交额硬过滤
+        and (not min_quote_volume or row["quoteVolume"] >= min_quote_volume)
+    ]
+
+
+def history_rows(rows: List[Dict]) -> List[Dict]:
+    """快照行转为 SnapshotHistory 的字段（持仓量优先用名义价值）。"""
+    return [
+        {
+            "symbol": row["symbol"],
+            "price": row["lastPrice"],
+            "quote_volume": row["quoteVolume"],
+            "open_interest": row["openInterestValue"]
+            if row["openInterestValue"] is not None
+            else row["openInterest"],
+            "funding_rate": row["fundingRate"],
+        }
+        for row in rows
+    ]
+
+
+def build_rows(exchange: str, universe: MarketUniverse) -> List[Dict]:
+    """
+    把全市场数据整理为每个交易对一行：24h 行情、振幅、资金费率与持仓量。
+
+    行情键名统一为 Binance 风格（OKX 已在 universe 中转换）。
+    Binance 没有全市场持仓量接口，openInterest 为 None。
+    """
+    rows: List[Dict] = []
+    for symbol, item in universe.items():
+        ticker = item.get("ticker_24hr")
+        if not symbol or not ticker:
             continue
         try:
-            open_price = float(entry.get("openPrice", 0))
-            high_price = float(entry.get("highPrice", 0))
-            low_price = float(entry.get("lowPrice", 0))
-            quote_volume = float(entry.get("quoteVolume", 0))
-
-            # 成交额硬过滤
-            if min_quote_volume and quote_volume < min_quote_volume:
-                continue
+            open_price = float(ticker.get("openPrice") or 0)
+            high_price = float(ticker.get("highPrice") or 0)
+            low_price = float(ticker.get("lowPrice") or 0)
+            last_price = float(ticker.get("lastPrice") or 0)
+            quote_volume = float(ticker.get("quoteVolume") or 0)
 
             range_pct = 0.0
             if open_price > 0:
                 range_pct = (high_price - low_price) / open_price * 100
 
-            filtered.append(
-                {
-                    "symbol": symbol.upper(),
-                    "priceChangePercent": float(entry.get("priceChangePercent", 0)),
-                    "lastPrice": float(entry.get("lastPrice", 0)),
-                    "highPrice": high_price,
-                    "lowPrice": low_price,
-                    "volume": float(entry.get("volume", 0)),
-                    "quoteVolume": quote_volume,
-                    "openPrice": open_price,
-                    "count": int(entry.get("count", 0)),
-                    "range24hPct": range_pct,
-                }
-            )
+            row = {
+                "symbol": symbol.upper(),
+                "exchange": exchange,
+                "priceChangePercent": float(ticker.get("priceChangePercent") or 0),
+                "lastPrice": last_price,
+                "highPrice": high_price,
+                "lowPrice": low_price,
+                "volume": float(ticker.get("volume") or 0),
+                "quoteVolume": quote_volume,
+                "openPrice": open_price,
+                "range24hPct": range_pct,
+                "fundingRate": _funding_rate(item.get("funding_rate")),
+                "openInterest": None,
+                "openInterestValue": None,
+            }
+            if "count" in ticker:
+                row["count"] = int(ticker["count"])
+            open_interest = item.get("open_interest")
+            if open_interest and open_interest.get("openInterest") is not None:
+                row["openInterest"] = float(open_interest["openInterest"])
+                # OKX 的 oiCcy 以币计，乘以最新价得到名义价值
+                amount = open_interest.get("openInterestCcy")
+                if amount not in (None, ""):
+                    row["openInterestValue"] = float(amount) * last_price
         except (TypeError, ValueError):
             continue
-    return filtered
-
-
-def summarize_binance(tickers: List[Dict], top: int) -> Dict:
-    return build_summary(
-        exchange="binance",
-        tickers=tickers,
-        volume_key="quoteVolume",
-        change_key="priceChangePercent",
-        top=top,
-    )
-
+        rows.append(row)
+    return rows
 
-# ---------- OKX ----------
 
-
-def fetch_okx_tickers(inst_type: str) -> List[Dict]:
-    response = requests.get(
-        f"{OKX_BASE_URL}/api/v5/market/tickers",
-        params={"instType": inst_type.upper()},
-        timeout=30,
-    )
-    response.raise_for_status()
-    result = response.json()
-    if result.get("code") != "0":
-        raise ValueError(f"OKX ticker 接口错误：{result.get('msg', '未知错误')}")
-    data = result.get("data", [])
-    if not isinstance(data, list):
-        raise ValueError("OKX ticker 接口返回格式异常（应为列表）")
-    return data
-
-
-def filter_okx_tickers(
-    tickers: Sequence[Dict],
-    quote_assets: set[str] | None,
-    min_quote_volume: float,
-) -> List[Dict]:
-    filtered: List[Dict] = []
-    for entry in tickers:
-        inst_id = entry.get("instId", "")
-        if not inst_id:
-            continue
-        if quote_assets:
-            parts = inst_id.upper().split("-")
-            quote = parts[1] if len(parts) >= 2 else ""
-            if quote not in quote_assets:
-                continue
-        try:
-            open_price = float(entry.get("open24h", 0))
-            last_price = float(entry.get("last", 0))
-            high_price = float(entry.get("high24h", 0))
-            low_price = float(entry.get("low24h", 0))
-            quote_volume = float(entry.get("volCcy24h", 0))
-
-            # 成交额硬过滤
-            if min_quote_volume and quote_volume < min_quote_volume:
-                continue
-
-            change_pct = (last_price - open_price) / open_price * 100 if open_price != 0 else 0
-            range_pct = 0.0
-            if open_price > 0:
-                range_pct = (high_price - low_price) / open_price * 100
-
-            filtered.append(
-                {
-                    "symbol": inst_id.upper(),
-                    "priceChangePercent": change_pct,
-                    "lastPrice": last_price,
-                    "highPrice": high_price,
-                    "lowPrice": low_price,
-                    "volume": float(entry.get("vol24h", 0)),
-                    "quoteVolume": quote_volume,
-                    "openPrice": open_price,
-                    "range24hPct": range_pct,
-                }
-            )
-        except (TypeError, ValueError):
-            continue
-    return filtered
+def _funding_rate(entry: Dict | None) -> float | None:
+    if not entry:
+        return None
+    value = entry.get("lastFundingRate", entry.get("fundingRate"))
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
 
 
-def summarize_okx(tickers: List[Dict], top: int) -> Dict:
-    return build_summary(
-        exchange="okx",
-        tickers=tickers,
-        volume_key="quoteVolume",
-        change_key="priceChangePercent",
-        top=top,
-    )
+# ---------- 汇总 ----------
 
 
-# ---------- 通用 ----------
+def build_summary(exchange: str, tickers: List[Dict], top: int) -> Dict:
+    """成交额、涨跌幅、资金费率、持仓价值的 Top N 榜单（只取前 N，不做全量排序）。"""
+    with_funding = [row for row in tickers if row.get("fundingRate") is not None]
+    with_oi = [row for row in tickers if row.get("openInterestValue") is not None]
 
+    def change(row: Dict) -> float:
+        return row.get("priceChangePercent", 0)
 
-def build_summary(
-    exchange: str,
-    tickers: List[Dict],
-    volume_key: str,
-    change_key: str,
-    top: int,
-) -> Dict:
-    sorted_volume = sorted(tickers, key=lambda x: x.get(volume_key, 0), reverse=True)
-    sorted_change = sorted(tickers, key=lambda x: x.get(change_key, 0), reverse=True)
+    def funding(row: Dict) -> float:
+        return row["fundingRate"]
 
     summary = {
         "exchange": exchange,
         "generated_at": datetime.now().isoformat(),
         "total_symbols": len(tickers),
-        "top_volume": sorted_volume[:top],
-        "top_gainers": sorted_change[:top],
-        "top_losers": sorted_change[-top:][::-1],
+        "top_volume": heapq.nlargest(top, tickers, key=lambda row: row.get("quoteVolume", 0)),
+        "top_gainers": heapq.nlargest(top, tickers, key=change),
+        "top_losers": heapq.nsmallest(top, tickers, key=change),
+        "top_funding": heapq.nlargest(top, with_funding, key=funding),
+        "bottom_funding": heapq.nsmallest(top, with_funding, key=funding),
     }
+    if with_oi:
+        summary["top_open_interest"] = heapq.nlargest(
+            top, with_oi, key=lambda row: row["openInterestValue"]
+        )
     return summary
 
 
 def save_snapshot(summary: Dict, exchange: str) -> Path:
-    folder = OUTPUT_DIR / exchange.lower() / "_snapshot"
+    """单个交易所写入 data/{exchange}/_snapshot/，两家合并的快照写入 data/_snapshot/。"""
+    if exchange == "all":
+        folder = OUTPUT_DIR / "_snapshot"
+    else:
+        folder = OUTPUT_DIR / exchange.lower() / "_snapshot"
     folder.mkdir(parents=True, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     path = folder / f"{timestamp}_snapshot.json"
@@ -0,0 +1,328 @@
+"""
+一次性市场扫描：快照 → 候选筛选 → 多周期 K 线 → 指标摘要，全部在同一个进程内完成。
+
+相当于依次运行 fetch_snapshot.py、fetch_klines.py 与 analyze_file.py，
+但中间结果不落地为 JSON、不需要多次启动解释器：
+
+1. 全市场批量接口拉取 24h 行情/资金费率/持仓量（同时追加到快照历史）
+2. 按报价资产、24h 成交额、振幅、涨跌幅筛选候选交易对，按成交额取前 N 个
+3. 并发增量拉取候选交易对的多周期 K 线（本地 K 线仓库照常更新）
+4. 在内存中计算指标摘要（可选波动率扩张分析），输出一份紧凑的结果文档
+
+结果打印到标准输出，或用 --output 写入文件。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from crypto_analyzer.analysis.sidecar import compute_analysis
+from crypto_analyzer.core.response_cache import cached_client_options, response_cache
+from crypto_analyzer.core.scheduler import ExecutorStage, run_in_stage, run_worker_pool
+from crypto_analyzer.core.snapshot_history import SnapshotHistory
+from crypto_analyzer.data.fetchers.universe import MarketUniverse, fetch_universe_async
+
+# 与其他脚本同目录，直接复用它们的拉取与整理逻辑
+from fetch_klines import (
+    _TASK_ERRORS,
+    collect_klines_async,
+    collect_market_data_async,
+    resolve_intervals,
+)
+from fetch_snapshot import EXCHANGES, build_quote_filter, build_rows, filter_rows, history_rows
+
+SORT_KEYS = {
+    "volume": lambda row: row["quoteVolume"],
+    "range": lambda row: row["range24hPct"],
+    "change": lambda row: abs(row["priceChangePercent"]),
+}
+
+# 候选行中保留到结果文档的快照字段
+ROW_FIELDS = (
+    "lastPrice",
+    "priceChangePercent",
+    "range24hPct",
+    "quoteVolume",
+    "fundingRate",
+    "openInterest",
+    "openInterestValue",
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="一次性扫描合约市场：快照、候选筛选、多周期 K 线与指标摘要（单进程）"
+    )
+    parser.add_argument(
+        "--exchange",
+        choices=["binance", "okx", "all"],
+        default="binance",
+        help="交易所：binance、okx 或 all（两家一起扫描），默认 binance",
+    )
+    parser.add_argument("--inst-type", default="SWAP", help="OKX 合约类型，默认 SWAP")
+    parser.add_argument(
+        "--quote",
+        default="USDT",
+        help="仅保留指定报价资产（如 USDT 或 USDT,USDC），传 ALL 表示不过滤，默认 USDT",
+    )
+    parser.add_argument(
+        "--min-quote-volume",
+        type=float,
+        default=50_000_000,
+        help="候选交易对的 24h 最小成交额（计价货币，OKX 合约按币量 × 最新价折算），默认 5000 万",
+    )
+    parser.add_argument(
+        "--min-range",
+        type=float,
+        default=0.0,
+        help="候选交易对的 24h 最小振幅（%%，(最高-最低)/开盘），默认 0",
+    )
+    parser.add_argument(
+        "--min-change",
+        type=float,
+        default=0.0,
+        help="候选交易对的 24h 最小涨跌幅绝对值（%%），默认 0",
+    )
+    parser.add_argument(
+        "--sort",
+        choices=sorted(SORT_KEYS),
+        default="volume",
+        help="候选排序：volume（成交额）、range（振幅）或 change（涨跌幅绝对值），默认 volume",
+    )
+    parser.add_argument(
+        "--max-candidates",
+        type=int,
+        default=10,
+        help="最多分析多少个候选交易对（所有交易所合计），默认 10",
+    )
+    parser.add_argument(
+        "--interval",
+        nargs="+",
+        default=["1d", "4h", "1h", "15m"],
+        help="候选交易对拉取的 K 线周期，默认 1d 4h 1h 15m",
+    )
+    parser.add_argument("--limit", type=int, default=200, help="每个周期的 K 线条数，默认 200")
+    parser.add_argument(
+        "--volatility",
+        action="store_true",
+        help="每个周期附带波动率扩张分析",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="同时处理的候选交易对数量，默认 8",
+    )
+    parser.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="计算指标的进程数，默认 CPU 核数",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 data/_cache 中的响应缓存",
+    )
+    parser.add_argument("--output", help="结果写入该文件，默认打印到标准输出")
+    parser.add_argument("--pretty", action="store_true", help="缩进输出 JSON（默认紧凑格式）")
+    return parser.parse_args()
+
+
+def main() -> None:
+    try:
+        args = parse_args()
+        result = asyncio.run(_async_main(args))
+    except Exception as exc:  # pragma: no cover - 顶层兜底
+        print(f"执行失败：{exc}", file=sys.stderr)
+        sys.exit(1)
+
+    text = json.dumps(
+        result,
+        ensure_ascii=False,
+        indent=2 if args.pretty else None,
+        separators=None if args.pretty else (",", ":"),
+    )
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+        print(f"扫描结果已写入 {args.output}，候选 {len(result['candidates'])} 个。", file=sys.stderr)
+    else:
+        print(text)
+
+
+async def _async_main(args: argparse.Namespace) -> Dict[str, Any]:
+    started = time.monotonic()
+    exchanges = EXCHANGES if args.exchange == "all" else (args.exchange,)
+    quote_assets = build_quote_filter(args.quote)
+    intervals = resolve_intervals(args)
+
+    async with httpx.AsyncClient(**cached_client_options(enabled=not args.no_cache)) as client:
+        universes = await fetch_universes(client, exchanges, args.inst_type)
+        rows: List[Dict] = []
+        for exchange, universe in universes.items():
+            exchange_rows = build_rows(exchange, universe)
+            await asyncio.to_thread(SnapshotHistory(exchange).append, history_rows(exchange_rows))
+            rows.extend(filter_rows(exchange, exchange_rows, quote_assets, args.min_quote_volume))
+
+        candidates = select_candidates(
+            rows, args.min_range, args.min_change, args.sort, args.max_candidates
+        )
+        snapshot_seconds = time.monotonic() - started
+        print(
+            f"快照 {sum(len(u) for u in universes.values())} 个交易对，"
+            f"筛出 {len(candidates)} 个候选，用时 {snapshot_seconds:.2f} 秒。",
+            file=sys.stderr,
+        )
+
+        cpu_stage = None
+        if len(candidates) * len(intervals) > 1:
+            cpu_stage = ExecutorStage(
+                ProcessPoolExecutor(max_workers=args.cpu_workers), max_pending=args.cpu_workers * 2
+            )
+        results: Dict[int, Dict[str, Any]] = {}
+
+        async def handle(position: int) -> Dict[str, Any]:
+            row = candidates[position]
+            return await analyze_candidate(
+                client,
+                row,
+                universes[row["exchange"]],
+                intervals,
+                args.limit,
+                args.volatility,
+                cpu_stage,
+            )
+
+        def on_result(position: int, result: Dict[str, Any], latency: float) -> None:
+            results[position] = result
+            print(f"[{len(results)}/{len(candidates)}] {result['symbol']} 用时 {latency:.2f}s", file=sys.stderr)
+
+        try:
+            await run_worker_pool(range(len(candidates)), handle, workers=args.workers, on_result=on_result)
+        finally:
+            if cpu_stage is not None:
+                cpu_stage.shutdown()
+
+    document = {
+        "generated_at": datetime.now().isoformat(),
+        "exchanges": list(universes),
+        "filters": {
+            "quote_assets": sorted(quote_assets) if quote_assets else None,
+            "min_quote_volume": args.min_quote_volume,
+            "min_range": args.min_range,
+            "min_change": args.min_change,
+            "sort": args.sort,
+            "max_candidates": args.max_candidates,
+        },
+        "intervals": intervals,
+        "limit": args.limit,
+        "candidates": [results[position] for position in range(len(candidates))],
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+    if not args.no_cache:
+        document["response_cache"] = response_cache.stats()
+    return document
+
+
+async def fetch_universes(
+    client: httpx.AsyncClient, exchanges: Sequence[str], inst_type: str
+) -> Dict[str, MarketUniverse]:
+    """并发拉取各交易所的全市场数据；多交易所时某一家失败只打印警告。"""
+    results = await asyncio.gather(
+        *(fetch_universe_async(client, exchange, inst_type) for exchange in exchanges),
+        return_exceptions=True,
+    )
+    universes: Dict[str, MarketUniverse] = {}
+    for exchange, universe in zip(exchanges, results):
+        if isinstance(universe, BaseException):
+            if len(exchanges) == 1 or not isinstance(universe, (httpx.HTTPError, ValueError)):
+                raise universe
+            print(f"[{exchange}] 全市场数据获取失败，已跳过：{universe}", file=sys.stderr)
+            continue
+        universes[exchange] = universe
+    if not universes:
+        raise ValueError("所有交易所的全市场数据均获取失败")
+    return universes
+
+
+def select_candidates(
+    rows: List[Dict],
+    min_range: float = 0.0,
+    min_change: float = 0.0,
+    sort: str = "volume",
+    max_candidates: int = 10,
+) -> List[Dict]:
+    """按振幅与涨跌幅绝对值过滤快照行，按 sort 降序取前 max_candidates 个。"""
+    selected = [
+        row
+        for row in rows
+        if row["range24hPct"] >= min_range and abs(row["priceChangePercent"]) >= min_change
+    ]
+    selected.sort(key=SORT_KEYS[sort], reverse=True)
+    return selected[:max_candidates]
+
+
+async def analyze_candidate(
+    client: httpx.AsyncClient,
+    row: Dict,
+    universe: MarketUniverse,
+    intervals: List[str],
+    limit: int,
+    volatility: bool = False,
+    cpu_stage: Optional[ExecutorStage] = None,
+) -> Dict[str, Any]:
+    """
+    单个候选交易对：交易对级数据（复用全市场数据）与各周期 K 线并发拉取，
+    在内存中生成每个周期的指标摘要（与指标计算一样在 cpu_stage 中执行）。
+    单个周期失败记为 error，不影响其他周期。
+    """
+    exchange, symbol = row["exchange"], row["symbol"]
+    result: Dict[str, Any] = {
+        "symbol": symbol,
+        "exchange": exchange,
+        **{field: row.get(field) for field in ROW_FIELDS},
+        "intervals": {},
+    }
+    market_data, *frames = await asyncio.gather(
+        collect_market_data_async(client, exchange, symbol, universe),
+        *(
+            collect_klines_async(client, exchange, symbol, interval, limit, cpu_stage=cpu_stage)
+            for interval in intervals
+        ),
+        return_exceptions=True,
+    )
+    if isinstance(market_data, BaseException):
+        if not isinstance(market_data, _TASK_ERRORS):
+            raise market_data
+        # 订单簿等单交易对请求失败时，仍用全市场数据中已有的字段
+        result["market_error"] = str(market_data)
+        market_data = dict(universe.get(symbol, {}))
+
+    for interval, item in zip(intervals, frames):
+        if isinstance(item, BaseException):
+            if not isinstance(item, _TASK_ERRORS):
+                raise item
+            result["intervals"][interval] = {"error": str(item)}
+            continue
+        frame = item
+        payload = {"exchange": exchange, "klines": frame, **market_data}
+        analysis = await run_in_stage(cpu_stage, compute_analysis, payload, volatility)
+        result["intervals"][interval] = {"bars": len(frame), **analysis}
+    return result
+
+
+if __name__ == "__main__":
+    main()
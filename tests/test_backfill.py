@@ -0,0 +1,49 @@
+"""plan_windows 的随机化对拍：与逐根枚举 K 线时间后按页切分的结果比较。"""
+import random
+import unittest
+
+from crypto_analyzer.core.backfill import plan_windows
+from crypto_analyzer.core.intervals import interval_to_ms
+
+INTERVALS = ["1m", "5m", "15m", "1h", "4h", "1d", "1w"]
+
+
+def _brute_windows(start_ms: int, end_ms: int, interval_ms: int, page_size: int) -> list:
+    """从 start_ms 起逐根枚举 K 线，每 page_size 根一页；最后一页截止到 end_ms。"""
+    bars = list(range(start_ms, end_ms + 1, interval_ms))
+    windows = []
+    for k in range(0, len(bars), page_size):
+        next_start = bars[k] + page_size * interval_ms
+        windows.append((bars[k], min(end_ms, next_start - 1)))
+    return windows
+
+
+class PlanWindowsTest(unittest.TestCase):
+    def test_matches_brute_force(self) -> None:
+        rng = random.Random(20240604)
+        for _ in range(500):
+            interval = rng.choice(INTERVALS)
+            interval_ms = interval_to_ms(interval)
+            page_size = rng.randint(1, 1500)
+            start = rng.randint(0, 10**12)
+            end = start + rng.randint(0, 3000) * interval_ms + rng.randint(0, interval_ms - 1)
+            windows = plan_windows(start, end, interval, page_size)
+            self.assertEqual(windows, _brute_windows(start, end, interval_ms, page_size))
+            # 窗口首尾相接、覆盖整个区间
+            self.assertEqual(windows[0][0], start)
+            self.assertEqual(windows[-1][1], end)
+            for (_, prev_end), (next_start, _) in zip(windows, windows[1:]):
+                self.assertEqual(next_start, prev_end + 1)
+
+    def test_single_point(self) -> None:
+        self.assertEqual(plan_windows(5, 5, "1m", 1000), [(5, 5)])
+
+    def test_rejects_invalid_ranges(self) -> None:
+        with self.assertRaises(ValueError):
+            plan_windows(10, 9, "1h", 100)
+        with self.assertRaises(ValueError):
+            plan_windows(0, 10, "1M", 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""merge_klines 的随机化对拍。"""
+import random
+import unittest
+
+from crypto_analyzer.core.kline_store import merge_klines
+
+INTERVAL_MS = 60_000
+
+
+def _brute_merge(cached: list, fresh: list, limit: int) -> list:
+    """逐个时间点取值：fresh 中最后出现的记录优先，其次是 cached。"""
+    times = sorted({r["open_time"] for r in cached} | {r["open_time"] for r in fresh})
+    merged = []
+    for t in times:
+        from_fresh = [r for r in fresh if r["open_time"] == t]
+        merged.append(from_fresh[-1] if from_fresh else next(r for r in cached if r["open_time"] == t))
+    return merged[-limit:] if limit > 0 else []
+
+
+class MergeKlinesTest(unittest.TestCase):
+    def test_matches_brute_force(self) -> None:
+        rng = random.Random(20240603)
+        for trial in range(500):
+            start = rng.randint(0, 50)
+            cached = [
+                {"open_time": (start + k) * INTERVAL_MS, "close": float(k), "src": "cached"}
+                for k in range(rng.randint(0, 60))
+                if rng.random() > 0.1  # 仓库尾部也可能有缺口
+            ]
+            fresh = [
+                {"open_time": rng.randint(0, 120) * INTERVAL_MS, "close": rng.random(), "src": f"fresh{i}"}
+                for i in range(rng.randint(0, 40))
+            ]
+            rng.shuffle(fresh)
+            limit = rng.randint(1, 150)
+            got = merge_klines(cached, fresh, limit)
+            self.assertEqual(got, _brute_merge(cached, fresh, limit), f"trial {trial}")
+            times = [r["open_time"] for r in got]
+            self.assertEqual(times, sorted(set(times)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""rolling 的随机化对拍：与逐窗口暴力计算比较（含重复值与 NaN）。"""
+import math
+import random
+import unittest
+
+from crypto_analyzer.analysis.rolling import (
+    SortedBlockList,
+    rank_of,
+    rolling_mean,
+    rolling_percentile,
+)
+
+NAN = float("nan")
+
+
+def _random_series(rng: random.Random, n: int) -> list:
+    """取值集合很小以制造大量重复值，约 15% 为 NaN。"""
+    pool = [rng.uniform(-5, 5) for _ in range(rng.randint(1, 8))]
+    return [NAN if rng.random() < 0.15 else rng.choice(pool) for _ in range(n)]
+
+
+def _windows(values: list, window: int):
+    for i in range(len(values)):
+        yield i, [v for v in values[max(0, i - window + 1) : i + 1] if v == v]
+
+
+def _same(a: float, b: float) -> bool:
+    return (a != a and b != b) or a == b
+
+
+class RollingPercentileTest(unittest.TestCase):
+    def test_matches_brute_force(self) -> None:
+        rng = random.Random(20240601)
+        for _ in range(300):
+            values = _random_series(rng, rng.randint(0, 400))
+            window = rng.randint(1, 150)
+            min_periods = rng.randint(1, window)
+            got = rolling_percentile(values, window, min_periods)
+            self.assertEqual(len(got), len(values))
+            for i, valid in _windows(values, window):
+                current = values[i]
+                if current != current or len(valid) < min_periods:
+                    expected = NAN
+                else:
+                    expected = sum(1 for v in valid if v <= current) / len(valid) * 100
+                self.assertTrue(
+                    _same(got[i], expected),
+                    f"i={i} window={window} min_periods={min_periods}: {got[i]} != {expected}",
+                )
+
+    def test_agrees_with_rank_of(self) -> None:
+        rng = random.Random(7)
+        values = _random_series(rng, 500)
+        got = rolling_percentile(values, 60)
+        for i, _ in _windows(values, 60):
+            if values[i] == values[i]:
+                expected = rank_of(values[max(0, i - 59) : i + 1], values[i])
+                self.assertEqual(got[i], expected)
+
+    def test_rejects_empty_window(self) -> None:
+        with self.assertRaises(ValueError):
+            rolling_percentile([1.0], 0)
+
+
+class RollingMeanTest(unittest.TestCase):
+    def test_matches_brute_force(self) -> None:
+        rng = random.Random(20240602)
+        for _ in range(300):
+            values = _random_series(rng, rng.randint(0, 400))
+            window = rng.randint(1, 150)
+            min_periods = rng.randint(1, window)
+            got = rolling_mean(values, window, min_periods)
+            self.assertEqual(len(got), len(values))
+            for i, valid in _windows(values, window):
+                if len(valid) < min_periods:
+                    self.assertTrue(got[i] != got[i], f"i={i}: 应为 NaN，实际 {got[i]}")
+                else:
+                    expected = math.fsum(valid) / len(valid)
+                    self.assertAlmostEqual(got[i], expected, delta=1e-9 * max(1.0, abs(expected)))
+
+    def test_long_series_does_not_drift(self) -> None:
+        rng = random.Random(3)
+        values = [60000 + rng.gauss(0, 50) for _ in range(20000)]
+        got = rolling_mean(values, 500)
+        expected = math.fsum(values[-500:]) / 500
+        self.assertAlmostEqual(got[-1], expected, delta=1e-9 * expected)
+
+
+class SortedBlockListTest(unittest.TestCase):
+    def test_random_operations(self) -> None:
+        rng = random.Random(11)
+        # 小块容量让分裂、合并频繁发生
+        ranks = SortedBlockList(load=4)
+        mirror: list = []
+        for _ in range(5000):
+            if mirror and rng.random() < 0.45:
+                value = rng.choice(mirror)
+                ranks.remove(value)
+                mirror.remove(value)
+            else:
+                value = float(rng.randint(0, 30))
+                ranks.add(value)
+                mirror.append(value)
+            mirror.sort()
+            self.assertEqual(len(ranks), len(mirror))
+            probe = float(rng.randint(-1, 31))
+            self.assertEqual(ranks.count_le(probe), sum(1 for v in mirror if v <= probe))
+            self.assertEqual(ranks.count_lt(probe), sum(1 for v in mirror if v < probe))
+            if mirror:
+                rank = rng.randrange(len(mirror))
+                self.assertEqual(ranks[rank], mirror[rank])
+        self.assertEqual(list(ranks), mirror)
+
+
+if __name__ == "__main__":
+    unittest.main()